@@ -40,23 +40,29 @@ CREATE TABLE IF NOT EXISTS products (
 );
 
 -- Table: Stock Levels (Niveaux de stock par entrepôt et produit)
+-- Partitionnée par snapshot_date : une partition par jour, créée et chargée
+-- par scripts/load_Output/load_stock_levels.py (COPY en masse)
+-- Base existante avec l'ancien schéma (stock_id SERIAL, UNIQUE) :
+-- appliquer database/migrations/001_partition_stock_levels.sql
 CREATE TABLE IF NOT EXISTS stock_levels (
-    stock_id SERIAL PRIMARY KEY,
-    warehouse_id INTEGER REFERENCES warehouses(warehouse_id),
-    product_id INTEGER REFERENCES products(product_id),
+    warehouse_id INTEGER NOT NULL REFERENCES warehouses(warehouse_id),
+    product_id INTEGER NOT NULL REFERENCES products(product_id),
     available_quantity INTEGER DEFAULT 0,
     reserved_quantity INTEGER DEFAULT 0,
     snapshot_date DATE NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    UNIQUE(warehouse_id, product_id, snapshot_date)
-);
+    PRIMARY KEY (snapshot_date, warehouse_id, product_id)
+) PARTITION BY RANGE (snapshot_date);
 
 -- Index pour améliorer les performances des requêtes
 CREATE INDEX idx_products_supplier ON products(supplier_id);
 CREATE INDEX idx_products_sku ON products(sku);
 CREATE INDEX idx_stock_warehouse ON stock_levels(warehouse_id);
 CREATE INDEX idx_stock_product ON stock_levels(product_id);
-CREATE INDEX idx_stock_date ON stock_levels(snapshot_date);
+
+-- Index couvrant : le stock agrégé par SKU d'une date est lu en index-only scan
+CREATE INDEX idx_stock_date_product ON stock_levels(snapshot_date, product_id)
+    INCLUDE (available_quantity, reserved_quantity);
 
 -- Commentaires pour documentation
 COMMENT ON TABLE suppliers IS 'Fournisseurs et leurs contraintes de livraison';
@@ -0,0 +1,48 @@
+-- ============================================
+-- Résultats du pipeline (net demand et commandes fournisseurs)
+-- Partitionnées par order_date : une partition par jour, remplacée en bloc par
+-- scripts/load_Output/load_results_to_postgres.py (COPY puis échange de partition)
+-- ============================================
+
+-- Table: Net Demand (une ligne par date et SKU à commander)
+CREATE TABLE IF NOT EXISTS net_demand (
+    order_date DATE NOT NULL,
+    sku VARCHAR(100) NOT NULL,
+    product_name VARCHAR(255),
+    supplier_id INTEGER,
+    total_quantity INTEGER,
+    horizon_demand INTEGER,
+    available_stock INTEGER,
+    reserved_stock INTEGER,
+    safety_stock INTEGER,
+    pack_size INTEGER,
+    case_size INTEGER,
+    moq INTEGER,
+    lead_time_days INTEGER,
+    net_demand INTEGER,
+    order_quantity INTEGER,
+    loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (order_date, sku)
+) PARTITION BY RANGE (order_date);
+
+-- Table: Supplier Order Lines (articles des commandes fournisseurs)
+CREATE TABLE IF NOT EXISTS supplier_order_lines (
+    order_date DATE NOT NULL,
+    supplier_id INTEGER NOT NULL,
+    order_reference VARCHAR(50) NOT NULL,
+    sku VARCHAR(100) NOT NULL,
+    product_name VARCHAR(255),
+    net_demand INTEGER,
+    order_quantity INTEGER,
+    loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (order_date, supplier_id, sku)
+) PARTITION BY RANGE (order_date);
+
+-- Recherches ponctuelles par fournisseur ou par SKU sur une période
+CREATE INDEX IF NOT EXISTS idx_net_demand_supplier_date ON net_demand(supplier_id, order_date);
+CREATE INDEX IF NOT EXISTS idx_net_demand_sku_date ON net_demand(sku, order_date);
+CREATE INDEX IF NOT EXISTS idx_order_lines_supplier_date ON supplier_order_lines(supplier_id, order_date);
+CREATE INDEX IF NOT EXISTS idx_order_lines_sku_date ON supplier_order_lines(sku, order_date);
+
+COMMENT ON TABLE net_demand IS 'Net demand quotidien par SKU (sortie de calculate_net_demand.py)';
+COMMENT ON TABLE supplier_order_lines IS 'Lignes des commandes fournisseurs (sortie de generate_supplier_orders.py)';
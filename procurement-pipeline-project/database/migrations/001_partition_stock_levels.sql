@@ -0,0 +1,62 @@
+-- Migration : stock_levels non partitionnée -> partitionnée par snapshot_date
+-- À exécuter une fois sur une base créée avant le partitionnement
+-- (les nouvelles bases sont créées directement par init_scripts/01_create_tables.sql)
+--
+--   psql -U postgres -d procurement_db -f database/migrations/001_partition_stock_levels.sql
+--
+-- Changements de schéma :
+--   - stock_id SERIAL supprimé : la clé primaire devient (snapshot_date, warehouse_id, product_id)
+--     (une table partitionnée exige la clé de partition dans la clé primaire)
+--   - la contrainte UNIQUE(warehouse_id, product_id, snapshot_date) est remplacée par cette clé
+--   - les lignes sans warehouse_id ou product_id sont écartées (colonnes NOT NULL)
+--   - en cas de doublon (warehouse_id, product_id, snapshot_date), la ligne la plus récente est gardée
+
+BEGIN;
+
+ALTER TABLE stock_levels RENAME TO stock_levels_legacy;
+DROP INDEX IF EXISTS idx_stock_warehouse;
+DROP INDEX IF EXISTS idx_stock_product;
+DROP INDEX IF EXISTS idx_stock_date;
+
+CREATE TABLE stock_levels (
+    warehouse_id INTEGER NOT NULL REFERENCES warehouses(warehouse_id),
+    product_id INTEGER NOT NULL REFERENCES products(product_id),
+    available_quantity INTEGER DEFAULT 0,
+    reserved_quantity INTEGER DEFAULT 0,
+    snapshot_date DATE NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (snapshot_date, warehouse_id, product_id)
+) PARTITION BY RANGE (snapshot_date);
+
+CREATE INDEX idx_stock_warehouse ON stock_levels(warehouse_id);
+CREATE INDEX idx_stock_product ON stock_levels(product_id);
+CREATE INDEX idx_stock_date_product ON stock_levels(snapshot_date, product_id)
+    INCLUDE (available_quantity, reserved_quantity);
+
+-- Une partition par date déjà présente (même nommage que load_stock_levels.partition_name)
+DO $$
+DECLARE
+    day DATE;
+BEGIN
+    FOR day IN SELECT DISTINCT snapshot_date FROM stock_levels_legacy LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF stock_levels FOR VALUES FROM (%L) TO (%L)',
+            'stock_levels_' || to_char(day, 'YYYYMMDD'), day, day + 1
+        );
+    END LOOP;
+END $$;
+
+INSERT INTO stock_levels (warehouse_id, product_id, available_quantity, reserved_quantity,
+                          snapshot_date, created_at)
+SELECT DISTINCT ON (snapshot_date, warehouse_id, product_id)
+       warehouse_id, product_id, available_quantity, reserved_quantity, snapshot_date, created_at
+FROM stock_levels_legacy
+WHERE warehouse_id IS NOT NULL AND product_id IS NOT NULL
+ORDER BY snapshot_date, warehouse_id, product_id, created_at DESC, stock_id DESC;
+
+DROP TABLE stock_levels_legacy;
+
+COMMIT;
+
+-- Statistiques et visibility map des nouvelles partitions (hors transaction)
+VACUUM (ANALYZE) stock_levels;
@@ -0,0 +1,80 @@
+"""
+Benchmark des codecs de compression sur les fichiers bruts
+Pour chaque codec : taille totale, ratio, débit d'écriture et de lecture (pandas)
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from file_codecs import CODECS, DEFAULT_LEVELS, data_files, pandas_compression, with_codec
+from pipeline_config import load_config
+
+
+def benchmark_codec(frames, codec, level, workdir):
+    """Écrit puis relit tous les DataFrames avec un codec, retourne (octets, s écriture, s lecture)"""
+    import pandas as pd
+
+    compression = pandas_compression(codec, level)
+    paths = []
+    start = time.perf_counter()
+    for i, df in enumerate(frames):
+        path = with_codec(Path(workdir) / f"bench_{i}.csv", codec)
+        df.to_csv(path, index=False, compression=compression)
+        paths.append(path)
+    write_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for path in paths:
+        pd.read_csv(path)
+    read_seconds = time.perf_counter() - start
+
+    size = sum(path.stat().st_size for path in paths)
+    for path in paths:
+        path.unlink()
+    return size, write_seconds, read_seconds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--path', help="Répertoire de fichiers CSV (paths.raw_orders par défaut)")
+    parser.add_argument('--levels', nargs='+', type=int,
+                        help="Niveaux à tester pour chaque codec (niveau par défaut sinon)")
+    args = parser.parse_args(argv)
+
+    import pandas as pd
+
+    config = load_config()
+    source = Path(args.path or config['paths']['raw_orders'])
+    files = [f for d in [source, *sorted(p for p in source.iterdir() if p.is_dir())] for f in data_files(d)]
+    if not files:
+        print(f"❌ Aucun fichier CSV dans {source}")
+        return 1
+
+    frames = [pd.read_csv(f) for f in files]
+    raw_bytes = sum(len(df.to_csv(index=False).encode('utf-8')) for df in frames)
+    raw_mb = raw_bytes / (1024 * 1024)
+
+    print("=== Benchmark des codecs de compression ===\n")
+    print(f"Fichiers: {len(files)} ({raw_mb:.2f} Mo non compressés)\n")
+    print(f"{'codec':<8}{'niveau':>7}{'taille Mo':>12}{'ratio':>8}{'écriture Mo/s':>16}{'lecture Mo/s':>15}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for codec in CODECS:
+            levels = args.levels if args.levels and codec != 'none' else [DEFAULT_LEVELS.get(codec)]
+            for level in levels:
+                try:
+                    size, write_seconds, read_seconds = benchmark_codec(frames, codec, level, workdir)
+                except ImportError as e:
+                    print(f"{codec:<8}{'-':>7}   ⚠ indisponible ({e})")
+                    break
+                print(f"{codec:<8}{level if level is not None else '-':>7}{size / (1024 * 1024):>12.2f}"
+                      f"{raw_bytes / size:>8.2f}{raw_mb / write_seconds:>16.1f}{raw_mb / read_seconds:>15.1f}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""
+Benchmark mémoire du modèle en mémoire (records.py) face aux dictionnaires
+Pour chaque type : octets par ligne (tracemalloc) en dict et en dataclass à __slots__,
+puis débit de sérialisation JSON, JSON Lines et Parquet des dataclasses
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from file_codecs import compression_settings
+from records import (OrderLine, PipelineException, StockSnapshotRow, SupplierOrder, SupplierOrderLine,
+                     supplier_order_columns, to_columns, write_parquet, write_records_json,
+                     write_records_jsonl)
+
+
+def order_line_values(i):
+    return (f"ORD-2026-01-08-S{i % 5 + 1:02d}-{i // 5:04d}", f"STORE{i % 5 + 1:02d}", '2026-01-08',
+            f"{8 + i % 14}:{i % 60:02d}:{i * 7 % 60:02d}", f"{i:032x}", f"SKU{i % 5000:05d}",
+            f"Produit {i % 5000}", i % 5 + 1)
+
+
+def stock_row_values(i):
+    return (f"WH{i % 3 + 1:02d}", f"SKU{i % 5000:05d}", f"Produit {i % 5000}", i % 500, i % 100,
+            '2026-01-08', '23:59:59')
+
+
+def supplier_line_values(i):
+    return (f"SKU{i % 5000:05d}", f"Produit {i % 5000}", i % 700, i % 700 + 6)
+
+
+def exception_values(i):
+    return ('ABNORMAL_DEMAND', f"Abnormal order quantity: {i} units (threshold: 500)", 'WARNING',
+            '2026-01-08', f"SKU{i % 5000:05d}", i)
+
+
+# Type -> (classe, fabrique des valeurs d'une ligne)
+KINDS = {
+    'OrderLine': (OrderLine, order_line_values),
+    'StockSnapshotRow': (StockSnapshotRow, stock_row_values),
+    'SupplierOrderLine': (SupplierOrderLine, supplier_line_values),
+    'PipelineException': (PipelineException, exception_values),
+}
+
+
+def measure(build, n):
+    """Octets alloués par ligne et durée de construction de n lignes"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    rows = [build(i) for i in range(n)]
+    seconds = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del rows
+    return size / n, seconds
+
+
+def supplier_orders(n, lines_per_order=50):
+    orders = []
+    for i in range(n):
+        if i % lines_per_order == 0:
+            orders.append(SupplierOrder(i // lines_per_order % 1000 + 1, '2026-01-08'))
+        orders[-1].lines.append(SupplierOrderLine(*supplier_line_values(i)))
+    return orders
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--lines', type=int, default=200000, help="Nombre de lignes par mesure")
+    args = parser.parse_args(argv)
+    n = args.lines
+
+    print("=== Benchmark mémoire : dict vs dataclass __slots__ ===\n")
+    print(f"Lignes par mesure: {n}\n")
+    print(f"{'type':<20}{'dict o/ligne':>14}{'slots o/ligne':>15}{'gain':>8}{'dict s':>9}{'slots s':>9}")
+    for name, (cls, values) in KINDS.items():
+        fields = cls.__slots__
+        dict_bytes, dict_seconds = measure(lambda i: dict(zip(fields, values(i))), n)
+        slots_bytes, slots_seconds = measure(lambda i: cls(*values(i)), n)
+        print(f"{name:<20}{dict_bytes:>14.0f}{slots_bytes:>15.0f}{1 - slots_bytes / dict_bytes:>8.0%}"
+              f"{dict_seconds:>9.2f}{slots_seconds:>9.2f}")
+
+    print(f"\n{'sérialisation':<20}{'Mo':>8}{'secondes':>10}{'lignes/s':>12}")
+    settings = dict(compression_settings(), codec='none', level=None)
+    rows = [OrderLine(*order_line_values(i)) for i in range(n)]
+    orders = supplier_orders(n)
+    with tempfile.TemporaryDirectory() as workdir:
+        outputs = [
+            ('OrderLine JSON', lambda: write_records_json(rows, Path(workdir) / 'lines.json', settings)),
+            ('OrderLine JSONL', lambda: write_records_jsonl(rows, Path(workdir) / 'lines.jsonl', settings)),
+            ('OrderLine Parquet', lambda: write_parquet(to_columns(rows), Path(workdir) / 'lines.parquet')),
+            ('SupplierOrder JSONL', lambda: write_records_jsonl(orders, Path(workdir) / 'orders.jsonl', settings)),
+            ('SupplierOrder Parq.', lambda: write_parquet(supplier_order_columns(orders),
+                                                          Path(workdir) / 'orders.parquet')),
+        ]
+        for label, write in outputs:
+            start = time.perf_counter()
+            try:
+                path = write()
+            except ImportError as e:
+                print(f"{label:<20}   ⚠ indisponible ({e})")
+                continue
+            seconds = time.perf_counter() - start
+            print(f"{label:<20}{Path(path).stat().st_size / (1024 * 1024):>8.1f}{seconds:>10.2f}{n / seconds:>12.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
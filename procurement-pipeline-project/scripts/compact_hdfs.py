@@ -0,0 +1,283 @@
+"""
+Compaction des petits fichiers HDFS par partition <date>/
+Fusionne les fichiers d'une partition (un par magasin, entrepôt ou fournisseur) en quelques
+fichiers part-NNNNN de la taille d'un bloc, puis remplace le répertoire par renommage :
+moins d'objets pour le NameNode et moins de splits à planifier pour Trino
+"""
+
+import argparse
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from file_codecs import CODECS, codec_from_path, open_text
+from hdfs_sync import COMPACTED_MARKER, load_upload_manifest, remote_dirs, remote_sizes
+from pipeline_config import load_config
+
+HDFS_COMMAND = ['hdfs', 'dfs']
+
+# Suffixes des répertoires de travail, à côté de la partition
+STAGING_SUFFIX = '.compacting'
+BACKUP_SUFFIX = '.old'
+
+
+def compaction_settings(config=None):
+    config = config or load_config()
+    settings = dict(config['hdfs'].get('compaction', {}))
+    base_path = config['hdfs']['base_path']
+    settings.setdefault('min_age_days', 7)
+    settings.setdefault('target_file_mb', 128)
+    settings.setdefault('directories', [f"{base_path}/raw/orders", f"{base_path}/raw/stock",
+                                        f"{base_path}/output/supplier_orders"])
+    return settings
+
+
+def hdfs(*args):
+    """Commande hdfs dfs ; lève RuntimeError en cas d'échec"""
+    result = subprocess.run([*HDFS_COMMAND, *args], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"hdfs dfs {' '.join(args)}: {result.stderr.strip()}")
+    return result.stdout
+
+
+def hdfs_exists(path):
+    return subprocess.run([*HDFS_COMMAND, '-test', '-e', path], capture_output=True).returncode == 0
+
+
+def format_key(path):
+    """Format d'un fichier (extension hors codec, codec) : seuls des fichiers de même format sont fusionnés"""
+    path = Path(path)
+    codec = codec_from_path(path)
+    stem = path.with_suffix('') if codec != 'none' else path
+    return stem.suffix, codec
+
+
+def plan_parts(files, target_bytes):
+    """Répartit les fichiers d'un même format en lots d'au plus target_bytes (ordre des noms)"""
+    parts, current, current_size = [], [], 0
+    for path, size in sorted(files.items()):
+        if current and current_size + size > target_bytes:
+            parts.append(current)
+            current, current_size = [], 0
+        current.append(path)
+        current_size += size
+    if current:
+        parts.append(current)
+    return parts
+
+
+def needs_compaction(files, target_bytes):
+    """Vrai si un format compte au moins deux fichiers plus petits que la cible"""
+    small = {}
+    for path, size in files.items():
+        if size < target_bytes:
+            small.setdefault(format_key(path), []).append(path)
+    return any(len(paths) > 1 for paths in small.values())
+
+
+def json_records(path):
+    """Enregistrements d'un fichier JSON : tableau, objet unique ou JSON Lines"""
+    with open_text(path) as f:
+        text = f.read()
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    return data if isinstance(data, list) else [data]
+
+
+def merge_files(sources, output, extension, codec):
+    """Fusionne des fichiers locaux de même format, retourne le nombre d'enregistrements
+
+    CSV : un seul en-tête (les fichiers d'en-têtes différents ne sont pas mélangés) ;
+    JSON : une ligne par enregistrement (JSON Lines, lu par la SerDe JSON de Hive).
+    """
+    records = 0
+    with open_text(output, 'w', codec) as out:
+        header = None
+        for source in sources:
+            if extension == '.json':
+                for record in json_records(source):
+                    out.write(json.dumps(record, ensure_ascii=False) + '\n')
+                    records += 1
+                continue
+            with open_text(source) as f:
+                first = f.readline()
+                if header is None:
+                    header = first
+                    out.write(header)
+                elif first != header:
+                    raise ValueError(f"En-tête différent dans {source.name}")
+                for line in f:
+                    out.write(line if line.endswith('\n') else line + '\n')
+                    records += 1
+    return records
+
+
+def count_records(path, extension):
+    if extension == '.json':
+        return len(json_records(path))
+    with open_text(path) as f:
+        return max(sum(1 for _ in f) - 1, 0)
+
+
+def recover_partition(partition):
+    """Termine ou annule un remplacement interrompu (répertoires .compacting / .old)"""
+    staging, backup = partition + STAGING_SUFFIX, partition + BACKUP_SUFFIX
+    if hdfs_exists(backup) and not hdfs_exists(partition):
+        # Interruption entre les deux renommages : la partition compactée est complète
+        hdfs('-mv', staging if hdfs_exists(staging) else backup, partition)
+        print(f"   ↺ {partition}: remplacement interrompu repris")
+    if hdfs_exists(backup):
+        hdfs('-rm', '-r', '-skipTrash', backup)
+    if hdfs_exists(staging):
+        hdfs('-rm', '-r', '-skipTrash', staging)
+
+
+def build_compacted(local_dir, output_dir, files, target_bytes):
+    """Construit localement le contenu compacté d'une partition ; retourne le nombre de fichiers"""
+    groups = {}
+    for name, size in files.items():
+        groups.setdefault(format_key(name), {})[name] = size
+
+    count = parts = 0
+    for (extension, codec), group in sorted(groups.items()):
+        if len(group) == 1:
+            name = next(iter(group))
+            shutil.copy2(local_dir / name, output_dir / name)
+            count += 1
+            continue
+        if extension == '.csv':
+            # Fichiers d'en-têtes différents dans des lots séparés
+            by_header = {}
+            for name in group:
+                with open_text(local_dir / name) as f:
+                    by_header.setdefault(f.readline(), {})[name] = group[name]
+            batches = [batch for sub in by_header.values() for batch in plan_parts(sub, target_bytes)]
+        else:
+            batches = plan_parts(group, target_bytes)
+
+        for batch in batches:
+            output = output_dir / f"part-{parts:05d}{extension}{CODECS[codec]}"
+            merged = merge_files([local_dir / name for name in batch], output, extension, codec)
+            expected = sum(count_records(local_dir / name, extension) for name in batch)
+            if merged != expected:
+                raise ValueError(f"{output.name}: {merged} enregistrements au lieu de {expected}")
+            parts += 1
+            count += 1
+    return count
+
+
+def compact_partition(partition, files, target_bytes, manifest=None):
+    """Compacte une partition HDFS puis remplace le répertoire ; retourne le nombre de fichiers obtenus
+
+    Le contenu compacté est écrit dans <partition>.compacting puis vérifié (tailles) ;
+    la partition est ensuite renommée en .old, le répertoire compacté prend sa place et
+    l'ancien est supprimé. Le chemin de la partition (location Hive) ne change pas.
+    Le marqueur COMPACTED_MARKER, publié avec les fichiers compactés, signale à
+    ingest_to_hdfs.py de remplacer la partition entière plutôt que d'y ajouter les originaux.
+    """
+    names = {Path(path).name: size for path, size in files.items() if Path(path).name != COMPACTED_MARKER}
+    staging, backup = partition + STAGING_SUFFIX, partition + BACKUP_SUFFIX
+
+    with tempfile.TemporaryDirectory() as workdir:
+        local_dir, output_dir = Path(workdir) / 'source', Path(workdir) / 'compacted'
+        local_dir.mkdir()
+        output_dir.mkdir()
+        hdfs('-get', *(path for path in files if Path(path).name != COMPACTED_MARKER), str(local_dir))
+        count = build_compacted(local_dir, output_dir, names, target_bytes)
+        (output_dir / COMPACTED_MARKER).touch()
+
+        outputs = sorted(output_dir.iterdir())
+        hdfs('-mkdir', '-p', staging)
+        hdfs('-put', '-f', *map(str, outputs), staging)
+        uploaded = remote_sizes(HDFS_COMMAND, staging)
+        for output in outputs:
+            if uploaded.get(f"{staging}/{output.name}") != output.stat().st_size:
+                hdfs('-rm', '-r', '-skipTrash', staging)
+                raise RuntimeError(f"{staging}/{output.name}: taille transférée incorrecte")
+
+    hdfs('-mv', partition, backup)
+    hdfs('-mv', staging, partition)
+    hdfs('-rm', '-r', '-skipTrash', backup)
+
+    if manifest is not None:
+        manifest.mark_compacted(partition)
+        manifest.save()
+    return count
+
+
+def list_partitions(directory):
+    """Partitions d'un répertoire, y compris celles dont seul un .compacting / .old subsiste"""
+    partitions = set()
+    for path in remote_dirs(HDFS_COMMAND, directory):
+        for suffix in (STAGING_SUFFIX, BACKUP_SUFFIX):
+            if path.endswith(suffix):
+                path = path[:-len(suffix)]
+        partitions.add(path)
+    return sorted(partitions)
+
+
+def partition_date(partition):
+    try:
+        return datetime.strptime(Path(partition).name, '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--min-age-days', type=int, help="Ne compacte que les partitions plus anciennes")
+    parser.add_argument('--target-mb', type=int, help="Taille cible des fichiers compactés (Mo)")
+    parser.add_argument('--dir', nargs='+', metavar='HDFS_DIR', help="Répertoires à parcourir")
+    parser.add_argument('--dry-run', action='store_true', help="Affiche les partitions sans les modifier")
+    args = parser.parse_args(argv)
+
+    config = load_config()
+    settings = compaction_settings(config)
+    min_age_days = args.min_age_days if args.min_age_days is not None else settings['min_age_days']
+    target_bytes = (args.target_mb or settings['target_file_mb']) * 1024 * 1024
+    cutoff = datetime.now().date() - timedelta(days=min_age_days)
+    manifest = load_upload_manifest(config)
+
+    print("=== Compaction des petits fichiers HDFS ===\n")
+    print(f"Partitions antérieures au {cutoff}, fichiers cibles de {target_bytes // (1024 * 1024)} Mo\n")
+
+    files_before = files_after = failures = 0
+    for directory in args.dir or settings['directories']:
+        print(f"📁 {directory}")
+        for partition in list_partitions(directory):
+            day = partition_date(partition)
+            if day is None or day >= cutoff:
+                continue
+            if not args.dry_run:
+                recover_partition(partition)
+            files = remote_sizes(HDFS_COMMAND, partition)
+            if not needs_compaction({p: s for p, s in files.items() if Path(p).name != COMPACTED_MARKER},
+                                    target_bytes):
+                continue
+            if args.dry_run:
+                print(f"   • {day}: {len(files)} fichiers à compacter")
+                continue
+            try:
+                count = compact_partition(partition, files, target_bytes, manifest)
+            except (RuntimeError, ValueError) as e:
+                failures += 1
+                print(f"   ✗ {day}: {e}")
+                continue
+            files_before += len(files)
+            files_after += count
+            print(f"   ✓ {day}: {len(files)} -> {count} fichiers")
+
+    if not args.dry_run:
+        print(f"\n✅ {files_before} fichiers remplacés par {files_after} "
+              f"({files_before - files_after} objets NameNode en moins)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
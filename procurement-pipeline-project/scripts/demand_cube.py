@@ -0,0 +1,204 @@
+"""
+Cube SKU × date des demandes et stocks, mappé en mémoire (numpy memmap)
+Une matrice .npy par mesure, indexée par (date, code SKU du dictionnaire d'identifiants)
+Alimenté au fil de l'eau par l'agrégation et le net demand ; --rebuild le reconstruit
+depuis les fichiers CSV existants
+"""
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+from file_codecs import data_files, file_date
+from stage_files import read_stage_file, stage_files
+from stock_snapshots import StockSnapshots, delta_enabled
+from pipeline_config import load_config, raw_input_path
+
+MEASURES = ('ordered_quantity', 'available_stock', 'reserved_stock', 'order_quantity')
+
+MIN_DATE_CAPACITY = 64
+MIN_SKU_CAPACITY = 256
+
+
+class DemandCube:
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.meta_file = self.path / 'cube.json'
+        if self.meta_file.exists():
+            with open(self.meta_file, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        else:
+            meta = {'dates': [], 'date_capacity': 0, 'sku_capacity': 0, 'sku_count': 0,
+                    'filled': {measure: [] for measure in MEASURES}}
+        self.dates = meta['dates']
+        self.date_capacity = meta['date_capacity']
+        self.sku_capacity = meta['sku_capacity']
+        self.sku_count = meta['sku_count']
+        self.filled = {measure: set(meta['filled'].get(measure, [])) for measure in MEASURES}
+        self.date_index = {date_str: i for i, date_str in enumerate(self.dates)}
+
+    def measure_file(self, measure):
+        return self.path / f"{measure}.npy"
+
+    def save_meta(self):
+        """Écriture atomique des métadonnées (fichier temporaire puis renommage)"""
+        meta = {
+            'dates': self.dates,
+            'date_capacity': self.date_capacity,
+            'sku_capacity': self.sku_capacity,
+            'sku_count': self.sku_count,
+            'filled': {measure: sorted(dates) for measure, dates in self.filled.items()},
+        }
+        tmp_file = self.meta_file.with_suffix('.json.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_file, self.meta_file)
+
+    def ensure_capacity(self, n_dates, n_skus):
+        """Agrandit les matrices (capacité doublée) quand une date ou un SKU dépasse la capacité"""
+        import numpy as np
+
+        if n_dates <= self.date_capacity and n_skus <= self.sku_capacity:
+            return
+        date_capacity = max(n_dates, self.date_capacity * 2, MIN_DATE_CAPACITY)
+        sku_capacity = max(n_skus, self.sku_capacity * 2, MIN_SKU_CAPACITY)
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        for measure in MEASURES:
+            tmp_file = self.path / f"{measure}.npy.tmp"
+            grown = np.lib.format.open_memmap(tmp_file, mode='w+', dtype=np.int64,
+                                              shape=(date_capacity, sku_capacity))
+            if self.measure_file(measure).exists():
+                old = np.load(self.measure_file(measure), mmap_mode='r')
+                grown[:old.shape[0], :old.shape[1]] = old
+                del old
+            grown.flush()
+            del grown
+            os.replace(tmp_file, self.measure_file(measure))
+
+        self.date_capacity = date_capacity
+        self.sku_capacity = sku_capacity
+
+    def update(self, date_str, measure, sku_codes, values):
+        """Remplace la ligne d'une date pour une mesure (ajoute la date si elle est nouvelle)"""
+        import numpy as np
+
+        sku_codes = np.asarray(sku_codes, dtype=np.int64)
+        if date_str not in self.date_index:
+            self.date_index[date_str] = len(self.dates)
+            self.dates.append(date_str)
+        n_skus = int(sku_codes.max()) + 1 if len(sku_codes) else 0
+        self.ensure_capacity(len(self.dates), n_skus)
+        self.sku_count = max(self.sku_count, n_skus)
+
+        matrix = np.load(self.measure_file(measure), mmap_mode='r+')
+        row = self.date_index[date_str]
+        matrix[row, :] = 0
+        matrix[row, sku_codes] = np.asarray(values, dtype=np.int64)
+        matrix.flush()
+        del matrix
+
+        self.filled[measure].add(date_str)
+        self.save_meta()
+
+    def view(self, measure):
+        """Matrice (dates × SKUs) en lecture seule, lignes dans l'ordre d'ajout des dates"""
+        import numpy as np
+
+        if not self.dates:
+            return np.zeros((0, 0), dtype=np.int64)
+        matrix = np.load(self.measure_file(measure), mmap_mode='r')
+        return matrix[:len(self.dates), :self.sku_count]
+
+    def filled_rows(self, measure):
+        """Indices (triés par date) des lignes renseignées pour une mesure"""
+        return [self.date_index[date_str] for date_str in sorted(self.filled[measure])]
+
+    def series(self, measure, sku_code):
+        """Historique d'un SKU pour une mesure : (dates triées, valeurs)"""
+        rows = self.filled_rows(measure)
+        return [self.dates[row] for row in rows], self.view(measure)[rows, sku_code]
+
+
+def cube_enabled(config=None):
+    return (config or load_config()).get('cube', {}).get('enabled', False)
+
+
+def open_cube(config=None):
+    config = config or load_config()
+    return DemandCube(config.get('cube', {}).get('path', 'data/processed/cube'))
+
+
+def rebuild(cube, config, dictionary):
+    """Reconstruit le cube depuis les fichiers agrégés, net demand et stocks existants"""
+    import pandas as pd
+
+    paths = config['paths']
+    for agg_file in stage_files(paths['processed_aggregated'], 'aggregated_orders'):
+        date_str = file_date(agg_file)
+        df = read_stage_file(agg_file, columns=['sku', 'total_quantity'])
+        cube.update(date_str, 'ordered_quantity', dictionary.encode('sku', df['sku']), df['total_quantity'])
+
+    if delta_enabled(config):
+        # Baselines + deltas : états reconstruits dans l'ordre des dates (un delta lu par date)
+        snapshots = StockSnapshots(config)
+        for date_str in snapshots.dates:
+            stock = snapshots.by_sku(date_str)
+            if stock is None:
+                continue
+            codes = dictionary.encode('sku', stock['sku'])
+            cube.update(date_str, 'available_stock', codes, stock['available_stock'])
+            cube.update(date_str, 'reserved_stock', codes, stock['reserved_stock'])
+    else:
+        for date_folder in sorted(d for d in raw_input_path(config, 'raw_stock').iterdir() if d.is_dir()):
+            csv_files = data_files(date_folder)
+            if not csv_files:
+                continue
+            df = pd.concat([pd.read_csv(f, usecols=['sku', 'available_quantity', 'reserved_quantity'])
+                            for f in csv_files], ignore_index=True)
+            stock = df.groupby('sku').sum().reset_index()
+            codes = dictionary.encode('sku', stock['sku'])
+            cube.update(date_folder.name, 'available_stock', codes, stock['available_quantity'])
+            cube.update(date_folder.name, 'reserved_stock', codes, stock['reserved_quantity'])
+
+    for demand_file in stage_files(paths['processed_net_demand'], 'net_demand'):
+        date_str = file_date(demand_file)
+        df = read_stage_file(demand_file)
+        if len(df) == 0:
+            cube.update(date_str, 'order_quantity', [], [])
+            continue
+        cube.update(date_str, 'order_quantity', dictionary.encode('sku', df['sku']), df['order_quantity'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rebuild', action='store_true',
+                        help="Reconstruit le cube depuis les fichiers CSV existants")
+    args = parser.parse_args(argv)
+
+    from id_dictionary import load_id_dictionary
+
+    config = load_config()
+    cube = open_cube(config)
+
+    print("=== Cube SKU × date ===\n")
+
+    if args.rebuild:
+        dictionary = load_id_dictionary(config)
+        rebuild(cube, config, dictionary)
+        if dictionary.added:
+            dictionary.save()
+
+    print(f"   • Dates: {len(cube.dates)} (capacité {cube.date_capacity})")
+    print(f"   • SKUs: {cube.sku_count} (capacité {cube.sku_capacity})")
+    for measure in MEASURES:
+        print(f"   • {measure}: {len(cube.filled[measure])} dates renseignées")
+    print(f"📁 Répertoire: {cube.path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,299 @@
+"""
+Moteur SQL embarqué (DuckDB) pour les requêtes de scripts/sql sans cluster Trino
+Les tables hive.* sont des vues sur les fichiers locaux de data/ et postgresql.public.*
+est lu depuis un snapshot CSV local ; même interface que TrinoClient (query, execute,
+execute_script), utilisable comme moteur de référence face aux étapes pandas
+"""
+
+import argparse
+import re
+import sys
+from pathlib import Path
+
+from file_codecs import data_files
+from pipeline_config import load_config, postgres_params, raw_input_path
+from stock_snapshots import StockSnapshots, delta_enabled, materialize_snapshots
+from trino_client import split_statements
+
+# Nom qualifié Trino (catalogue.schéma.table, table éventuellement entre guillemets)
+QUALIFIED_NAME = re.compile(r'\b(hive|postgresql)\.(\w+)\.("?)(\w+)\3', re.IGNORECASE)
+
+# UNNEST Trino avec alias de colonnes -> sous-requête latérale DuckDB (structs dépliés)
+TRINO_UNNEST = re.compile(r'CROSS\s+JOIN\s+UNNEST\s*\(([^()]+)\)\s+AS\s+(\w+)\s*\(([^()]*)\)', re.IGNORECASE)
+
+# Tables et vues journalières de test_single_day.sql (orders_2026_01_14, v_stock_2026_01_14...)
+DAILY_VIEW = re.compile(r'(?:v_)?(orders|stock)_(\d{4})_(\d{2})_(\d{2})$')
+
+# DDL et écritures Hive / PostgreSQL : les tables locales sont des vues en lecture seule
+CATALOG_WRITE = re.compile(r'^\s*(CREATE\s+SCHEMA|CREATE\s+TABLE|DROP\s+TABLE|INSERT\s+INTO|DELETE\s+FROM)\b',
+                           re.IGNORECASE)
+CREATE_OR_DROP_VIEW = re.compile(r'^\s*(?:CREATE|DROP)\s+VIEW\s+(?:IF\s+EXISTS\s+)?(\w+)', re.IGNORECASE)
+
+# Colonne date déduite du dossier <YYYY-MM-DD>/ de chaque fichier
+FOLDER_DATE = r"CAST(regexp_extract(filename, '(\d{4}-\d{2}-\d{2})[/\\][^/\\]*$', 1) AS DATE)"
+
+SNAPSHOT_TABLES = ('products', 'suppliers')
+
+
+def local_name(catalog, schema, table):
+    return f"{catalog}_{schema}_{table}".lower()
+
+
+class DuckDBEngine:
+
+    def __init__(self, raw_orders, raw_stock, snapshots, database=':memory:'):
+        import duckdb
+
+        self.raw_orders = Path(raw_orders)
+        self.raw_stock = Path(raw_stock)
+        # table postgresql.public.<table> -> fichier CSV du snapshot
+        self.snapshots = {table: Path(path) for table, path in snapshots.items()}
+        self.conn = duckdb.connect(database)
+        # Division entière sur les entiers, comme Trino (arrondi au pack_size)
+        self.conn.execute('SET integer_division = true')
+        self.registered = set()
+
+    @classmethod
+    def from_config(cls, config=None):
+        config = config or load_config()
+        settings = config.get('duckdb', {})
+        # Format delta : hive.default.raw_stock lit l'état complet reconstruit de chaque date
+        stock_root = raw_input_path(config, 'raw_stock')
+        if delta_enabled(config):
+            stock_root = materialize_snapshots(StockSnapshots(config).dates, config)
+        return cls(
+            raw_input_path(config, 'raw_orders'),
+            stock_root,
+            {table: settings.get(f"{table}_snapshot", f"data/reference/{table}.csv") for table in SNAPSHOT_TABLES},
+            settings.get('database', ':memory:'),
+        )
+
+    def read_csv(self, directory, view):
+        """Expression read_csv sur tous les fichiers <directory>/<date>/*.csv[.gz|.zst]"""
+        files = [str(f) for d in sorted(p for p in directory.iterdir() if p.is_dir()) for f in data_files(d)] \
+            if directory.exists() else []
+        if not files:
+            raise RuntimeError(f"Aucun fichier CSV dans {directory} pour {view}")
+        return f"read_csv({files!r}, filename = true, union_by_name = true)"
+
+    def daily_view_sql(self, kind, date_str):
+        if kind == 'orders':
+            return f"""
+                SELECT order_id, order_date, store_id, customer_id, sku, product_name, quantity
+                FROM hive_default_raw_order_lines WHERE order_date = DATE '{date_str}'"""
+        return f"""
+            SELECT warehouse_code, sku, product_name, available_quantity, reserved_quantity, snapshot_date
+            FROM hive_default_raw_stock WHERE snapshot_date = DATE '{date_str}'"""
+
+    def view_sql(self, name):
+        """Définition locale d'une table du catalogue, None si elle n'est pas fournie
+
+        Les colonnes déclarées dans les DDL Hive mais absentes des fichiers locaux sont
+        NULL, comme à la lecture par la SerDe Hive.
+        """
+        if name == 'hive_default_raw_order_lines':
+            return f"""
+                SELECT order_id, store_id, {FOLDER_DATE} AS order_date, CAST(order_time AS VARCHAR) AS order_time,
+                       CAST(NULL AS VARCHAR) AS customer_id, sku, product_name, CAST(quantity AS INTEGER) AS quantity
+                FROM {self.read_csv(self.raw_orders, name)}"""
+        if name == 'hive_default_raw_stock':
+            return f"""
+                SELECT CAST(NULL AS VARCHAR) AS warehouse_id, warehouse_code, CAST(NULL AS INTEGER) AS product_id,
+                       sku, product_name, CAST(available_quantity AS INTEGER) AS available_quantity,
+                       CAST(reserved_quantity AS INTEGER) AS reserved_quantity, {FOLDER_DATE} AS snapshot_date
+                FROM {self.read_csv(self.raw_stock, name)}"""
+        if name == 'hive_procurement_orders':
+            return """
+                SELECT order_id, store_id, CAST(order_date AS VARCHAR) AS order_date, order_time, customer_id,
+                       sku, product_name, quantity, CAST(order_date AS VARCHAR) AS dt
+                FROM hive_default_raw_order_lines"""
+        if name == 'hive_procurement_stock':
+            return """
+                SELECT warehouse_code, sku, product_name, available_quantity, reserved_quantity,
+                       CAST(snapshot_date AS VARCHAR) AS snapshot_date, CAST(snapshot_date AS VARCHAR) AS dt
+                FROM hive_default_raw_stock"""
+        if name == 'hive_default_raw_orders':
+            return """
+                SELECT order_id, store_id, customer_id, CAST(NULL AS DECIMAL(10,2)) AS total_amount,
+                       list(struct_pack(product_id := CAST(NULL AS INTEGER), sku := sku, product_name := product_name,
+                                        quantity := quantity, unit_price := CAST(NULL AS DECIMAL(10,2)),
+                                        subtotal := CAST(NULL AS DECIMAL(10,2)))) AS items,
+                       order_date
+                FROM hive_default_raw_order_lines
+                GROUP BY order_id, store_id, customer_id, order_date"""
+        if name == 'hive_default_orders_daily':
+            # Même agrégat que l'INSERT de materialize_orders_daily.py
+            return """
+                SELECT sku, product_name, SUM(quantity) AS daily_quantity,
+                       CAST(NULL AS DECIMAL(38,2)) AS daily_sales,
+                       COUNT(DISTINCT order_id) AS num_orders, COUNT(DISTINCT store_id) AS num_stores, order_date
+                FROM hive_default_raw_order_lines
+                GROUP BY sku, product_name, order_date"""
+
+        match = DAILY_VIEW.search(name)
+        if name.startswith('hive_default_') and match:
+            kind, year, month, day = match.groups()
+            return self.daily_view_sql(kind, f"{year}-{month}-{day}")
+
+        for table, path in self.snapshots.items():
+            if name == local_name('postgresql', 'public', table):
+                if not path.exists():
+                    raise RuntimeError(f"Snapshot {path} absent pour postgresql.public.{table} "
+                                       f"(python scripts/duckdb_engine.py --export-snapshot)")
+                return f"SELECT * FROM read_csv('{path}')"
+        return None
+
+    def ensure(self, name):
+        """Crée à la demande la vue locale d'une table (et ses dépendances)"""
+        if name in self.registered:
+            return True
+        sql = self.view_sql(name)
+        if sql is None:
+            return False
+        for dependency in re.findall(r'\bhive_default_raw_(?:order_lines|stock)\b', sql):
+            if dependency != name:
+                self.ensure(dependency)
+        self.conn.execute(f"CREATE OR REPLACE VIEW {name} AS {sql}")
+        self.registered.add(name)
+        return True
+
+    def translate(self, sql):
+        """Réécrit une instruction Trino en SQL DuckDB sur le catalogue local"""
+        def resolve(match):
+            name = local_name(match.group(1), match.group(2), match.group(4))
+            self.ensure(name)
+            return name
+
+        sql = QUALIFIED_NAME.sub(resolve, sql)
+        return TRINO_UNNEST.sub(
+            lambda m: f"CROSS JOIN (SELECT UNNEST({m.group(1)}, recursive := true)) AS {m.group(2)}({m.group(3)})",
+            sql)
+
+    def skipped(self, sql):
+        """Vrai pour les instructions sans équivalent local (DDL/écritures Hive, vues fournies)"""
+        if CATALOG_WRITE.match(sql):
+            return True
+        view = CREATE_OR_DROP_VIEW.match(
+            QUALIFIED_NAME.sub(lambda m: local_name(m.group(1), m.group(2), m.group(4)), sql))
+        return bool(view and DAILY_VIEW.search(view.group(1)))
+
+    def query(self, sql):
+        """Exécute une requête et retourne (noms de colonnes, lignes)"""
+        import duckdb
+
+        try:
+            cursor = self.conn.execute(self.translate(sql.strip().rstrip(';')))
+        except duckdb.Error as e:
+            raise RuntimeError(f"Erreur DuckDB: {e}") from e
+        if cursor.description is None:
+            return [], []
+        return [c[0] for c in cursor.description], cursor.fetchall()
+
+    def execute(self, sql):
+        _, rows = self.query(sql)
+        return rows
+
+    def execute_script(self, path, **params):
+        """Exécute un fichier SQL instruction par instruction, retourne le résultat de la dernière
+
+        Les DDL Hive (tables externes) et les écritures sont ignorées : les tables
+        correspondantes sont déjà des vues sur data/.
+        """
+        result = ([], [])
+        for statement in split_statements(Path(path).read_text(encoding='utf-8'), **params):
+            if self.skipped(statement):
+                continue
+            result = self.query(statement)
+        return result
+
+
+def export_snapshot(config=None):
+    """Copie products et suppliers de PostgreSQL vers les snapshots CSV locaux"""
+    import pandas as pd
+    import psycopg2
+
+    config = config or load_config()
+    settings = config.get('duckdb', {})
+    conn = psycopg2.connect(**postgres_params(config))
+    try:
+        for table in SNAPSHOT_TABLES:
+            path = Path(settings.get(f"{table}_snapshot", f"data/reference/{table}.csv"))
+            path.parent.mkdir(parents=True, exist_ok=True)
+            df = pd.read_sql(f"SELECT * FROM {table} ORDER BY 1", conn)
+            df.to_csv(path, index=False)
+            print(f"   ✓ {table}: {len(df)} lignes -> {path}")
+    finally:
+        conn.close()
+
+
+def check_net_demand(engine, dates, config=None):
+    """Compare calculate_net_demand.sql (DuckDB) au net demand des étapes pandas ; retourne le nombre d'écarts"""
+    import pandas as pd
+
+    from file_codecs import file_date
+    from stage_files import read_stage_file, stage_files
+
+    config = config or load_config()
+    sql_file = Path(__file__).parent / 'sql' / 'calculate_net_demand.sql'
+    files = {file_date(f): f for f in stage_files(config['paths']['processed_net_demand'], 'net_demand')}
+    mismatches = 0
+    for date_str in dates:
+        if date_str not in files:
+            print(f"   ⚠ {date_str}: pas de fichier net_demand")
+            continue
+        columns, rows = engine.execute_script(sql_file, run_date=date_str)
+        expected = pd.DataFrame(rows, columns=columns)[['sku', 'net_demand', 'order_quantity']]
+        actual = read_stage_file(files[date_str], columns=['sku', 'net_demand', 'order_quantity'])
+        merged = expected.merge(actual, on='sku', how='outer', suffixes=('_sql', '_pandas'), indicator=True)
+        diff = merged[(merged['_merge'] != 'both')
+                      | (merged['net_demand_sql'] != merged['net_demand_pandas'])
+                      | (merged['order_quantity_sql'] != merged['order_quantity_pandas'])]
+        if len(diff):
+            mismatches += len(diff)
+            print(f"   ❌ {date_str}: {len(diff)} SKUs divergents")
+            print(diff.head(10).to_string(index=False))
+        else:
+            print(f"   ✓ {date_str}: {len(expected)} SKUs identiques")
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('sql_file', nargs='?', help="Fichier SQL à exécuter (scripts/sql/*.sql)")
+    parser.add_argument('--param', action='append', default=[], metavar='NOM=VALEUR',
+                        help="Paramètre {nom} du script (ex: run_date=2026-01-08)")
+    parser.add_argument('--export-snapshot', action='store_true',
+                        help="Exporte products et suppliers de PostgreSQL vers les snapshots locaux")
+    parser.add_argument('--check-net-demand', nargs='+', metavar='DATE',
+                        help="Compare le net demand SQL au net demand calculé par pandas")
+    parser.add_argument('--limit', type=int, default=20, help="Lignes affichées du résultat")
+    args = parser.parse_args(argv)
+
+    config = load_config()
+
+    print("=== Moteur SQL embarqué (DuckDB) ===\n")
+
+    if args.export_snapshot:
+        export_snapshot(config)
+        if not args.sql_file and not args.check_net_demand:
+            return 0
+
+    engine = DuckDBEngine.from_config(config)
+
+    if args.check_net_demand:
+        return 1 if check_net_demand(engine, args.check_net_demand, config) else 0
+
+    if not args.sql_file:
+        parser.error("fichier SQL, --export-snapshot ou --check-net-demand requis")
+
+    import pandas as pd
+
+    params = dict(param.split('=', 1) for param in args.param)
+    columns, rows = engine.execute_script(args.sql_file, **params)
+    print(pd.DataFrame(rows, columns=columns).head(args.limit).to_string(index=False))
+    print(f"\n✓ {len(rows)} lignes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,18 +1,19 @@
 import os
 import json
 import subprocess
+import sys
 from datetime import datetime
 
-ARCHIVE_DATE = datetime.now().strftime("%Y-%m-%d")
+from records import PipelineException
 
 EXCEPTIONS_FILE = "/app/logs/exceptions_pipeline.json"
 
-exceptions = {
-    "date": ARCHIVE_DATE,
-    "timestamp": datetime.now().isoformat(),
-    "errors": [],
-    "warnings": []
-}
+REQUIRED_FILES = [
+    "net_demand.json",
+    "supplier_a_orders.json",
+    "supplier_b_orders.json",
+    "supplier_c_orders.json"
+]
 
 # ===================== HELPERS =====================
 def hdfs_ls(path):
@@ -32,96 +33,79 @@ def hdfs_ls(path):
 def local_exists(path):
     return os.path.exists(path) and len(os.listdir(path)) > 0
 
-# ===================== CHECK 1 : LOCAL ARCHIVE =====================
-LOCAL_ARCHIVE = f"/app/output/archives/{ARCHIVE_DATE}"
-
-if not os.path.exists(LOCAL_ARCHIVE):
-    exceptions["errors"].append({
-        "type": "LOCAL_ARCHIVE_MISSING",
-        "message": f"Archive locale absente : {LOCAL_ARCHIVE}"
-    })
-elif not local_exists(LOCAL_ARCHIVE):
-    exceptions["warnings"].append({
-        "type": "LOCAL_ARCHIVE_EMPTY",
-        "message": f"Archive locale vide : {LOCAL_ARCHIVE}"
-    })
-
-# ===================== CHECK 2 : SHARED VOLUME =====================
-SHARED_ARCHIVE = f"/shared/archive/{ARCHIVE_DATE}"
-
-if not os.path.exists(SHARED_ARCHIVE):
-    exceptions["errors"].append({
-        "type": "SHARED_ARCHIVE_MISSING",
-        "message": f"Archive volume partagé absente : {SHARED_ARCHIVE}"
-    })
-elif not local_exists(SHARED_ARCHIVE):
-    exceptions["warnings"].append({
-        "type": "SHARED_ARCHIVE_EMPTY",
-        "message": f"Archive volume partagé vide : {SHARED_ARCHIVE}"
-    })
-
-# ===================== CHECK 3 : HDFS RAW =====================
-RAW_HDFS = f"/raw/orders/{ARCHIVE_DATE}"
-raw_files = hdfs_ls(RAW_HDFS)
-
-if not raw_files:
-    exceptions["warnings"].append({
-        "type": "HDFS_RAW_EMPTY",
-        "message": f"Aucun fichier RAW détecté dans {RAW_HDFS}"
-    })
-
-# ===================== CHECK 4 : HDFS PROCESSED =====================
-PROCESSED_HDFS = f"/processed/net_demand/{ARCHIVE_DATE}"
-processed_files = hdfs_ls(PROCESSED_HDFS)
-
-if not processed_files:
-    exceptions["errors"].append({
-        "type": "HDFS_PROCESSED_MISSING",
-        "message": f"Données PROCESSED absentes dans {PROCESSED_HDFS}"
-    })
-
-# ===================== CHECK 5 : HDFS OUTPUT =====================
-OUTPUT_HDFS = f"/output/supplier_orders/{ARCHIVE_DATE}"
-output_files = hdfs_ls(OUTPUT_HDFS)
-
-if not output_files:
-    exceptions["errors"].append({
-        "type": "HDFS_OUTPUT_MISSING",
-        "message": f"Aucun fichier OUTPUT détecté dans {OUTPUT_HDFS}"
-    })
-
-# ===================== CHECK 6 : FICHIERS CRITIQUES =====================
-required_files = [
-    "net_demand.json",
-    "supplier_a_orders.json",
-    "supplier_b_orders.json",
-    "supplier_c_orders.json"
-]
-
-if os.path.exists(LOCAL_ARCHIVE):
-    existing_files = os.listdir(LOCAL_ARCHIVE)
-    for file in required_files:
-        if file not in existing_files:
-            exceptions["errors"].append({
-                "type": "MISSING_FILE",
-                "message": f"Fichier critique manquant : {file}"
-            })
-
-# ===================== SAVE REPORT =====================
-os.makedirs("/app/logs", exist_ok=True)
-
-with open(EXCEPTIONS_FILE, "w") as f:
-    json.dump(exceptions, f, indent=4, ensure_ascii=False)
-
-# ===================== CONSOLE OUTPUT =====================
-if exceptions["errors"]:
-    print("❌ EXCEPTIONS CRITIQUES DÉTECTÉES")
-    print(f"   Voir : {EXCEPTIONS_FILE}")
-    exit(1)
-
-if exceptions["warnings"]:
-    print("⚠️ WARNINGS DÉTECTÉS")
-    print(f"   Voir : {EXCEPTIONS_FILE}")
-
-print("✅ Aucune exception critique détectée")
-exit(0)
+def check_archive(exceptions, path, label, type_prefix):
+    if not os.path.exists(path):
+        exceptions.append(PipelineException(f"{type_prefix}_MISSING", f"{label} absente : {path}", "ERROR"))
+    elif not local_exists(path):
+        exceptions.append(PipelineException(f"{type_prefix}_EMPTY", f"{label} vide : {path}", "WARNING"))
+
+def exceptions_report(archive_date, exceptions):
+    """Rapport JSON : erreurs et avertissements séparés (type, sévérité, message)"""
+    return {
+        "date": archive_date,
+        "timestamp": datetime.now().isoformat(),
+        "errors": [e.to_dict() for e in exceptions if e.severity == "ERROR"],
+        "warnings": [e.to_dict() for e in exceptions if e.severity == "WARNING"]
+    }
+
+def collect_exceptions(archive_date):
+    exceptions = []
+
+    # ===================== CHECK 1 : LOCAL ARCHIVE =====================
+    local_archive = f"/app/output/archives/{archive_date}"
+    check_archive(exceptions, local_archive, "Archive locale", "LOCAL_ARCHIVE")
+
+    # ===================== CHECK 2 : SHARED VOLUME =====================
+    shared_archive = f"/shared/archive/{archive_date}"
+    check_archive(exceptions, shared_archive, "Archive volume partagé", "SHARED_ARCHIVE")
+
+    # ===================== CHECK 3 : HDFS RAW =====================
+    raw_hdfs = f"/raw/orders/{archive_date}"
+    if not hdfs_ls(raw_hdfs):
+        exceptions.append(PipelineException("HDFS_RAW_EMPTY", f"Aucun fichier RAW détecté dans {raw_hdfs}", "WARNING"))
+
+    # ===================== CHECK 4 : HDFS PROCESSED =====================
+    processed_hdfs = f"/processed/net_demand/{archive_date}"
+    if not hdfs_ls(processed_hdfs):
+        exceptions.append(PipelineException("HDFS_PROCESSED_MISSING",
+                                            f"Données PROCESSED absentes dans {processed_hdfs}", "ERROR"))
+
+    # ===================== CHECK 5 : HDFS OUTPUT =====================
+    output_hdfs = f"/output/supplier_orders/{archive_date}"
+    if not hdfs_ls(output_hdfs):
+        exceptions.append(PipelineException("HDFS_OUTPUT_MISSING",
+                                            f"Aucun fichier OUTPUT détecté dans {output_hdfs}", "ERROR"))
+
+    # ===================== CHECK 6 : FICHIERS CRITIQUES =====================
+    if os.path.exists(local_archive):
+        existing_files = os.listdir(local_archive)
+        for file in REQUIRED_FILES:
+            if file not in existing_files:
+                exceptions.append(PipelineException("MISSING_FILE", f"Fichier critique manquant : {file}", "ERROR"))
+
+    return exceptions_report(archive_date, exceptions)
+
+def main():
+    exceptions = collect_exceptions(datetime.now().strftime("%Y-%m-%d"))
+
+    # ===================== SAVE REPORT =====================
+    os.makedirs("/app/logs", exist_ok=True)
+
+    with open(EXCEPTIONS_FILE, "w") as f:
+        json.dump(exceptions, f, indent=4, ensure_ascii=False)
+
+    # ===================== CONSOLE OUTPUT =====================
+    if exceptions["errors"]:
+        print("❌ EXCEPTIONS CRITIQUES DÉTECTÉES")
+        print(f"   Voir : {EXCEPTIONS_FILE}")
+        return 1
+
+    if exceptions["warnings"]:
+        print("⚠️ WARNINGS DÉTECTÉS")
+        print(f"   Voir : {EXCEPTIONS_FILE}")
+
+    print("✅ Aucune exception critique détectée")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+"""
+Compression des fichiers de données (gzip, zstd)
+Le codec est porté par l'extension (.csv.gz, .json.zst) : pandas, Hive/Trino et
+hdfs dfs -put les reconnaissent sans configuration côté lecteur
+"""
+
+import io
+import json
+import os
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+
+from pipeline_config import load_config
+
+# Codec -> suffixe ajouté au nom de fichier
+CODECS = {'none': '', 'gzip': '.gz', 'zstd': '.zst'}
+
+DEFAULT_LEVELS = {'gzip': 6, 'zstd': 3}
+
+
+def compression_settings(config=None):
+    """Section compression de la configuration, avec codec et niveau par défaut"""
+    settings = dict((config or load_config()).get('compression', {}))
+    codec = settings.setdefault('codec', 'none')
+    if codec not in CODECS:
+        raise ValueError(f"Codec de compression inconnu: {codec} (attendu: {', '.join(CODECS)})")
+    settings.setdefault('level', DEFAULT_LEVELS.get(codec))
+    settings.setdefault('json_indent', 2)
+    return settings
+
+
+def codec_from_path(path):
+    suffix = Path(path).suffix
+    for codec, codec_suffix in CODECS.items():
+        if codec_suffix and suffix == codec_suffix:
+            return codec
+    return 'none'
+
+
+def with_codec(path, codec):
+    """Chemin du fichier une fois compressé : data.csv -> data.csv.gz"""
+    return Path(f"{path}{CODECS[codec]}")
+
+
+def base_name(path):
+    """Nom sans suffixe de codec ni extension : net_demand_2026-01-08.csv.gz -> net_demand_2026-01-08"""
+    path = Path(path)
+    if codec_from_path(path) != 'none':
+        path = path.with_suffix('')
+    return path.stem
+
+
+def file_date(path):
+    """Date portée par le nom des fichiers <prefixe>_<YYYY-MM-DD>.<ext>[.codec]"""
+    return base_name(path).split('_')[-1]
+
+
+def data_files(directory, pattern='*.csv'):
+    """Fichiers correspondant au motif, compressés ou non, triés par nom"""
+    directory = Path(directory)
+    files = []
+    for codec_suffix in CODECS.values():
+        files.extend(directory.glob(pattern + codec_suffix))
+    return sorted(files)
+
+
+def pandas_compression(codec, level=None):
+    """Argument compression de DataFrame.to_csv (mtime gzip fixé : octets reproductibles)"""
+    if codec == 'gzip':
+        return {'method': 'gzip', 'compresslevel': level or DEFAULT_LEVELS['gzip'], 'mtime': 0}
+    if codec == 'zstd':
+        return {'method': 'zstd', 'level': level or DEFAULT_LEVELS['zstd']}
+    return None
+
+
+def open_text(path, mode='r', codec=None, level=None):
+    """Ouvre un fichier texte, compressé selon codec (déduit de l'extension par défaut)"""
+    codec = codec or codec_from_path(path)
+    if codec == 'gzip':
+        import gzip
+
+        raw = gzip.GzipFile(path, mode=mode[0] + 'b', mtime=0,
+                            compresslevel=level or DEFAULT_LEVELS['gzip'])
+        return io.TextIOWrapper(raw, encoding='utf-8')
+    if codec == 'zstd':
+        import zstandard
+
+        if mode.startswith('w'):
+            return zstandard.open(path, 'wt', encoding='utf-8',
+                                  cctx=zstandard.ZstdCompressor(level=level or DEFAULT_LEVELS['zstd']))
+        return zstandard.open(path, 'rt', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def remove_other_variants(path):
+    """Supprime les versions du même fichier écrites avec un autre codec (évite les doublons)"""
+    base = Path(path)
+    if codec_from_path(base) != 'none':
+        base = base.with_suffix('')
+    for codec in CODECS:
+        variant = with_codec(base, codec)
+        if variant != Path(path) and variant.exists():
+            os.remove(variant)
+
+
+@contextmanager
+def atomic_output(path):
+    """Chemin temporaire renommé en path à la sortie du bloc
+
+    Un lecteur (ou une reprise après interruption) ne voit jamais de fichier partiel :
+    soit l'ancienne version, soit la nouvelle complète. Le nom temporaire (.<nom>.tmp)
+    n'est pas reconnu par data_files.
+    """
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def publish_directory(staging, target):
+    """Remplace target par le répertoire staging (renommages, sans état intermédiaire partiel visible)"""
+    target = Path(target)
+    previous = target.with_name(f".{target.name}.previous")
+    shutil.rmtree(previous, ignore_errors=True)
+    if target.exists():
+        os.replace(target, previous)
+    os.replace(staging, target)
+    shutil.rmtree(previous, ignore_errors=True)
+
+
+def write_csv(df, path, settings):
+    """Écrit un DataFrame en CSV selon le codec configuré, retourne le chemin réel"""
+    path = with_codec(path, settings['codec'])
+    with atomic_output(path) as tmp_path:
+        df.to_csv(tmp_path, index=False, compression=pandas_compression(settings['codec'], settings['level']))
+    remove_other_variants(path)
+    return path
+
+
+def write_json(obj, path, settings):
+    """Écrit un objet JSON selon le codec et l'indentation configurés, retourne le chemin réel"""
+    path = with_codec(path, settings['codec'])
+    with atomic_output(path) as tmp_path:
+        with open_text(tmp_path, 'w', settings['codec'], settings['level']) as f:
+            json.dump(obj, f, ensure_ascii=False, indent=settings['json_indent'])
+    remove_other_variants(path)
+    return path
+
+
+def write_jsonl(objects, path, settings):
+    """Écrit des objets en JSON Lines (un par ligne, sans tout matérialiser), retourne le chemin réel"""
+    path = with_codec(path, settings['codec'])
+    with atomic_output(path) as tmp_path:
+        with open_text(tmp_path, 'w', settings['codec'], settings['level']) as f:
+            for obj in objects:
+                f.write(json.dumps(obj, ensure_ascii=False))
+                f.write('\n')
+    remove_other_variants(path)
+    return path
+
+
+def read_json(path):
+    with open_text(path) as f:
+        return json.load(f)
@@ -1,169 +1,298 @@
 """
 Génération du rapport d'exceptions et anomalies
+Les exceptions sont écrites en JSON Lines dès leur détection (exceptions_<date>.jsonl,
+lisible pendant la génération) ; exception_report_<date>.json ne contient que les compteurs
 """
 
-import pandas as pd
+import argparse
 import json
-import yaml
-import psycopg2
+import math
+import sys
+from collections import deque
 from datetime import datetime
 from pathlib import Path
 
-def generate_exception_report():
+from demand_cube import cube_enabled, open_cube
+from file_codecs import atomic_output, data_files, file_date
+from pipeline_config import load_config, postgres_params
+from records import PipelineException
+from stage_files import read_stage_file, stage_files
+from stock_snapshots import StockSnapshots
+
+
+def abnormal_demand_from_cube(cube, dictionary):
+    """Demandes anormales calculées sur la mesure order_quantity du cube (dates × SKUs)
+
+    Retourne (seuil, itérateur de (date, sku, quantité)) ; seuil vaut None sans historique.
+    """
+    import numpy as np
+
+    rows = cube.filled_rows('order_quantity')
+    history = cube.view('order_quantity')[rows]
+    quantities = history[history > 0]
+    if len(quantities) == 0:
+        return None, iter(())
+
+    threshold = quantities.mean() + 3 * quantities.std(ddof=1)
+    date_idx, sku_codes = np.nonzero(history > threshold)
+    skus = dictionary.decode('sku', sku_codes)
+    return threshold, ((cube.dates[rows[d]], sku, int(history[d, c]))
+                       for d, c, sku in zip(date_idx, sku_codes, skus))
+
+
+class ExceptionStream:
+    """Exceptions écrites une par ligne (JSON Lines) au fil de la détection
+
+    Le fichier est vidé à chaque ligne : tail -f suit le rapport pendant sa génération.
+    Seuls les compteurs et les dernières exceptions (affichage final) restent en mémoire.
+    """
+
+    def __init__(self, path, keep_last=5):
+        self.path = Path(path)
+        self.file = open(self.path, 'w', encoding='utf-8', buffering=1)
+        self.total = 0
+        self.by_severity = {'ERROR': 0, 'WARNING': 0}
+        self.by_type = {}
+        self.last = deque(maxlen=keep_last)
+
+    def add(self, exception):
+        self.file.write(json.dumps(exception.to_dict(), ensure_ascii=False) + '\n')
+        self.total += 1
+        self.by_severity[exception.severity] = self.by_severity.get(exception.severity, 0) + 1
+        self.by_type[exception.type] = self.by_type.get(exception.type, 0) + 1
+        self.last.append(exception)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def order_quantity_threshold(demand_files):
+    """Seuil moyenne + 3 écarts-types des quantités commandées, en une passe (sommes cumulées)
+
+    None avec moins de deux quantités (écart-type indéfini).
+    """
+    count = total = total_sq = 0
+    for demand_file in demand_files:
+        quantities = read_stage_file(demand_file, columns=['order_quantity'])['order_quantity'].to_numpy()
+        count += len(quantities)
+        total += int(quantities.sum())
+        total_sq += int((quantities.astype('int64') ** 2).sum())
+    if count < 2:
+        return None
+    mean = total / count
+    return mean + 3 * math.sqrt(max(total_sq - total * total / count, 0) / (count - 1))
+
+
+def generate_exception_report(dates=None):
+    """Rapport des dates de l'exécution (dossiers de commandes brutes présents si dates est None)"""
+    config = load_config()
+
     print("=== Génération du Rapport d'Exceptions ===\n")
     
-    exceptions = []
     date_str = datetime.now().strftime('%Y-%m-%d')
+    if dates is None:
+        orders_path = Path(config['paths']['raw_orders'])
+        dates = sorted(d.name for d in orders_path.iterdir() if d.is_dir()) if orders_path.exists() else []
+    output_dir = Path(config['paths']['logs_exceptions'])
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with ExceptionStream(output_dir / f'exceptions_{date_str}.jsonl') as exceptions:
+        detect_exceptions(config, exceptions, date_str, sorted(dates))
+    return write_summary(exceptions, output_dir, date_str)
+
+
+def detect_exceptions(config, exceptions, date_str, dates):
+    """Contrôles du pipeline, chaque exception transmise au flux dès sa détection
+
+    Dossiers de commandes et résumés de validation limités aux dates de l'exécution.
+    """
+    import pandas as pd
     
     # 1. Vérifier fichiers manquants
     print("1. Vérification des fichiers manquants...")
-    orders_path = Path('data/raw/orders')
-    expected_stores = 5
+    orders_path = Path(config['paths']['raw_orders'])
+    expected_stores = config['data_generation']['num_stores']
     
-    for date_folder in sorted(orders_path.iterdir()):
+    for date_folder in (orders_path / d for d in dates):
         if date_folder.is_dir():
-            csv_files = list(date_folder.glob('*.csv'))
+            csv_files = data_files(date_folder)
             if len(csv_files) < expected_stores:
-                exceptions.append({
-                    'date': date_folder.name,
-                    'type': 'MISSING_FILES',
-                    'severity': 'WARNING',
-                    'message': f'Only {len(csv_files)}/{expected_stores} store files found'
-                })
+                exceptions.add(PipelineException(
+                    date=date_folder.name,
+                    type='MISSING_FILES',
+                    severity='WARNING',
+                    message=f'Only {len(csv_files)}/{expected_stores} store files found'
+                ))
                 print(f"   ⚠️  {date_folder.name}: {len(csv_files)}/{expected_stores} fichiers")
     
     # 2. Détecter demandes anormales
     print("\n2. Détection des demandes anormales...")
-    net_demand_path = Path('data/processed/net_demand')
-    
-    all_quantities = []
-    for demand_file in sorted(net_demand_path.glob('*.csv')):
-        df = pd.read_csv(demand_file)
-        if len(df) > 0:
-            all_quantities.extend(df['order_quantity'].tolist())
-    
-    if len(all_quantities) > 0:
-        mean_qty = pd.Series(all_quantities).mean()
-        std_qty = pd.Series(all_quantities).std()
-        threshold = mean_qty + 3 * std_qty
-        
-        for demand_file in sorted(net_demand_path.glob('*.csv')):
-            df = pd.read_csv(demand_file)
-            if len(df) > 0:
-                anomalies = df[df['order_quantity'] > threshold]
-                for _, row in anomalies.iterrows():
-                    exceptions.append({
-                        'date': demand_file.stem.split('_')[-1],
-                        'type': 'ABNORMAL_DEMAND',
-                        'severity': 'WARNING',
-                        'sku': row['sku'],
-                        'quantity': int(row['order_quantity']),
-                        'message': f"Abnormal order quantity: {int(row['order_quantity'])} units (threshold: {int(threshold)})"
-                    })
-                    print(f"   ⚠️  {row['sku']}: {int(row['order_quantity'])} unités (seuil: {int(threshold)})")
+    net_demand_path = Path(config['paths']['processed_net_demand'])
+    
+    cube = open_cube(config) if cube_enabled(config) else None
+    if cube is not None and cube.filled['order_quantity']:
+        from id_dictionary import load_id_dictionary
+
+        threshold, anomalies = abnormal_demand_from_cube(cube, load_id_dictionary(config))
+        for anomaly_date, sku, quantity in anomalies:
+            exceptions.add(PipelineException(
+                date=anomaly_date,
+                type='ABNORMAL_DEMAND',
+                severity='WARNING',
+                sku=sku,
+                quantity=quantity,
+                message=f"Abnormal order quantity: {quantity} units (threshold: {int(threshold)})"
+            ))
+            print(f"   ⚠️  {sku}: {quantity} unités (seuil: {int(threshold)})")
+        # Historique déjà couvert par le cube : pas de relecture des CSV
+        net_demand_path = None
+
+    # Sans cube : seuil calculé en une passe, anomalies émises fichier par fichier à la seconde
+    demand_files = stage_files(net_demand_path, 'net_demand') if net_demand_path is not None else []
+    threshold = order_quantity_threshold(demand_files)
+    
+    if threshold is not None:
+        for demand_file in demand_files:
+            df = read_stage_file(demand_file, columns=['sku', 'order_quantity'])
+            anomalies = df[df['order_quantity'] > threshold]
+            for sku, quantity in zip(anomalies['sku'], anomalies['order_quantity'].astype('int64').tolist()):
+                exceptions.add(PipelineException(
+                    date=file_date(demand_file),
+                    type='ABNORMAL_DEMAND',
+                    severity='WARNING',
+                    sku=sku,
+                    quantity=quantity,
+                    message=f"Abnormal order quantity: {quantity} units (threshold: {int(threshold)})"
+                ))
+                print(f"   ⚠️  {sku}: {quantity} unités (seuil: {int(threshold)})")
     
     # 3. Vérifier mapping fournisseurs
     print("\n3. Vérification des mappings fournisseurs...")
     try:
-        conn = psycopg2.connect(
-            host='procurement_postgres',
-            database='procurement_db',
-            user='postgres',
-            password='postgres'
-        )
+        import psycopg2
+
+        conn = psycopg2.connect(**postgres_params(config))
         
         products_df = pd.read_sql('SELECT sku, supplier_id FROM products WHERE supplier_id IS NULL', conn)
         conn.close()
         
         if len(products_df) > 0:
-            exceptions.append({
-                'date': date_str,
-                'type': 'MISSING_SUPPLIER_MAPPING',
-                'severity': 'ERROR',
-                'count': len(products_df),
-                'message': f'{len(products_df)} products without supplier mapping'
-            })
+            exceptions.add(PipelineException(
+                date=date_str,
+                type='MISSING_SUPPLIER_MAPPING',
+                severity='ERROR',
+                count=len(products_df),
+                message=f'{len(products_df)} products without supplier mapping'
+            ))
             print(f"   ❌ {len(products_df)} produits sans fournisseur")
         else:
-            print(f"   ✓ Tous les produits ont un fournisseur")
+            print("   ✓ Tous les produits ont un fournisseur")
     except Exception as e:
         print(f"   ⚠️  Erreur connexion PostgreSQL: {e}")
     
     # 4. Vérifier cohérence stock vs commandes
     print("\n4. Vérification cohérence stock/commandes...")
-    stock_path = Path('data/raw/stock')
+    # Jours de delta (stock_snapshots.format: delta) : snapshot présent s'il est reconstructible
+    snapshots = StockSnapshots(config)
     
-    for date_folder in sorted(orders_path.iterdir()):
+    for date_folder in (orders_path / d for d in dates):
         if date_folder.is_dir():
             date_name = date_folder.name
-            corresponding_stock = stock_path / date_name
             
-            if not corresponding_stock.exists():
-                exceptions.append({
-                    'date': date_name,
-                    'type': 'MISSING_STOCK_SNAPSHOT',
-                    'severity': 'ERROR',
-                    'message': f'Stock snapshot missing for {date_name}'
-                })
+            if not snapshots.has_date(date_name):
+                exceptions.add(PipelineException(
+                    date=date_name,
+                    type='MISSING_STOCK_SNAPSHOT',
+                    severity='ERROR',
+                    message=f'Stock snapshot missing for {date_name}'
+                ))
                 print(f"   ❌ Snapshot stock manquant: {date_name}")
     
-    # Générer le rapport
-    print("\n5. Génération du rapport final...")
-    output_dir = Path('data/logs/exceptions')
-    output_dir.mkdir(parents=True, exist_ok=True)
+    # 5. Lignes écartées par la validation des données brutes
+    print("\n5. Lignes mises en quarantaine...")
+    quarantine_path = Path(config.get('validation', {}).get('quarantine_path', 'data/quarantine'))
     
+    for summary_file in (quarantine_path / f"validation_{d}.json" for d in dates):
+        if not summary_file.exists():
+            continue
+        summary = json.loads(summary_file.read_text(encoding='utf-8'))
+        for dataset, counts in summary['datasets'].items():
+            if counts['invalid_rows']:
+                reasons = ', '.join(f"{code}: {n}" for code, n in counts['reasons'].items())
+                exceptions.add(PipelineException(
+                    date=summary['date'],
+                    type='QUARANTINED_ROWS',
+                    severity='WARNING',
+                    count=counts['invalid_rows'],
+                    message=f"{counts['invalid_rows']}/{counts['rows']} {dataset} rows failed validation ({reasons})"
+                ))
+                print(f"   ⚠️  {summary['date']} {dataset}: {counts['invalid_rows']} lignes ({reasons})")
+
+
+def write_summary(exceptions, output_dir, date_str):
+    """Écrit le résumé (compteurs et chemin du JSON Lines) puis l'affiche"""
+    print("\n6. Génération du rapport final...")
     report = {
         'generated_at': datetime.now().isoformat(),
         'pipeline_date': date_str,
-        'total_exceptions': len(exceptions),
-        'exceptions_by_severity': {
-            'ERROR': len([e for e in exceptions if e['severity'] == 'ERROR']),
-            'WARNING': len([e for e in exceptions if e['severity'] == 'WARNING'])
-        },
-        'exceptions_by_type': {},
-        'exceptions': exceptions
+        'total_exceptions': exceptions.total,
+        'exceptions_by_severity': exceptions.by_severity,
+        'exceptions_by_type': exceptions.by_type,
+        'exceptions_file': str(exceptions.path),
     }
     
-    # Compter par type
-    for exc in exceptions:
-        exc_type = exc['type']
-        report['exceptions_by_type'][exc_type] = report['exceptions_by_type'].get(exc_type, 0) + 1
-    
     output_file = output_dir / f'exception_report_{date_str}.json'
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(report, f, indent=2, ensure_ascii=False)
+    with atomic_output(output_file) as tmp_path:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
     
     print(f"\n{'='*60}")
     print(f"✓ Rapport généré: {output_file}")
+    print(f"✓ Exceptions (JSON Lines): {exceptions.path}")
     print(f"{'='*60}")
-    print(f"\n📊 RÉSUMÉ DES EXCEPTIONS")
+    print("\n📊 RÉSUMÉ DES EXCEPTIONS")
     print(f"{'='*60}")
-    print(f"Total exceptions détectées: {len(exceptions)}")
+    print(f"Total exceptions détectées: {exceptions.total}")
     print(f"  • Erreurs (ERROR): {report['exceptions_by_severity']['ERROR']}")
     print(f"  • Avertissements (WARNING): {report['exceptions_by_severity']['WARNING']}")
     
     if len(report['exceptions_by_type']) > 0:
-        print(f"\n📋 Par type:")
+        print("\n📋 Par type:")
         for exc_type, count in report['exceptions_by_type'].items():
             print(f"  • {exc_type}: {count}")
     
-    if len(exceptions) > 0:
-        print(f"\n⚠️  Dernières exceptions détectées:")
-        for exc in exceptions[-5:]:
-            severity_icon = "❌" if exc['severity'] == 'ERROR' else "⚠️"
-            print(f"  {severity_icon} [{exc['severity']}] {exc.get('type', 'UNKNOWN')}")
-            print(f"     {exc['message']}")
+    if exceptions.total > 0:
+        print("\n⚠️  Dernières exceptions détectées:")
+        for exc in exceptions.last:
+            severity_icon = "❌" if exc.severity == 'ERROR' else "⚠️"
+            print(f"  {severity_icon} [{exc.severity}] {exc.type or 'UNKNOWN'}")
+            print(f"     {exc.message}")
     else:
-        print(f"\n✅ Aucune exception détectée - Pipeline sain!")
+        print("\n✅ Aucune exception détectée - Pipeline sain!")
     
     print(f"\n{'='*60}")
     
     return report
 
-if __name__ == "__main__":
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--date', nargs='+', metavar='DATE',
+                        help="Dates de l'exécution (YYYY-MM-DD), dossiers de commandes brutes par défaut")
+    args = parser.parse_args(argv)
+
     try:
-        report = generate_exception_report()
+        generate_exception_report(args.date)
+        return 0
     except Exception as e:
         print(f"\n❌ ERREUR FATALE: {e}")
         import traceback
-        traceback.print_exc()
\ No newline at end of file
+        traceback.print_exc()
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -4,159 +4,174 @@ Génère: Orders (commandes clients) et Stock Snapshots
 Format: JSON et CSV pour simulation POS
 """
 
-import pandas as pd
-from faker import Faker
-import random
-import json
 import os
+import random
+import shutil
+import sys
 from datetime import datetime, timedelta
-import psycopg2
-import yaml
-
-# Initialisation
-fake = Faker('fr_FR')
-Faker.seed(42)
-random.seed(42)
-
-# Chargement de la configuration
-config_path = os.path.join(os.path.dirname(__file__), '../../config/config.yaml')
-with open(config_path, 'r') as f:
-    config = yaml.safe_load(f)
-
-db_config = config['database']['postgresql']
-data_gen_config = config['data_generation']
-paths_config = config['paths']
-
-# Connexion à PostgreSQL pour récupérer les données master
-conn = psycopg2.connect(
-    host=db_config['host'],
-    port=db_config['port'],
-    database=db_config['database'],
-    user=db_config['user'],
-    password=db_config['password']
-)
-
-# Récupération des produits et entrepôts
-products_df = pd.read_sql("SELECT product_id, sku, product_name FROM products", conn)
-warehouses_df = pd.read_sql("SELECT warehouse_id, warehouse_code FROM warehouses", conn)
-conn.close()
-
-print("=== Génération des Données Opérationnelles ===\n")
-
-# Configuration
-num_stores = data_gen_config['num_stores']
-date_range_days = data_gen_config['date_range_days']
-base_date = datetime.now().date()
-
-# Création des dossiers si nécessaire
-os.makedirs('data/raw/orders', exist_ok=True)
-os.makedirs('data/raw/stock', exist_ok=True)
-
-# Génération pour chaque jour
-for day_offset in range(date_range_days):
-    current_date = base_date - timedelta(days=date_range_days - day_offset - 1)
-    date_str = current_date.strftime('%Y-%m-%d')
-    
-    print(f"Génération des données pour {date_str}...")
-    
-    # Création des dossiers par date
-    orders_dir = f'data/raw/orders/{date_str}'
-    stock_dir = f'data/raw/stock/{date_str}'
-    os.makedirs(orders_dir, exist_ok=True)
-    os.makedirs(stock_dir, exist_ok=True)
-    
-    # 1. GÉNÉRATION DES COMMANDES (ORDERS) PAR STORE/POS
-    print(f"  - Génération des commandes...")
-    for store_id in range(1, num_stores + 1):
-        orders = []
-        
-        # Nombre aléatoire de commandes par magasin (50-200)
-        num_orders = random.randint(50, 200)
-        
-        for order_id in range(1, num_orders + 1):
-            # Sélection aléatoire de 1-10 produits par commande
-            num_items = random.randint(1, 10)
-            selected_products = products_df.sample(n=num_items)
-            
-            order = {
-                'order_id': f'ORD-{date_str}-S{store_id:02d}-{order_id:04d}',
-                'store_id': f'STORE{store_id:02d}',
-                'order_date': date_str,
-                'order_time': f"{random.randint(8, 21)}:{random.randint(0, 59):02d}:{random.randint(0, 59):02d}",
-                'customer_id': fake.uuid4(),
-                'items': []
-            }
-            
-            for _, product in selected_products.iterrows():
-                item = {
-                    'sku': product['sku'],
-                    'product_name': product['product_name'],
-                    'quantity': random.randint(1, 5)
-                }
-                order['items'].append(item)
-            
-            orders.append(order)
-        
-        # Sauvegarde au format JSON
-        json_filename = f'{orders_dir}/orders_store_{store_id:02d}.json'
-        with open(json_filename, 'w', encoding='utf-8') as f:
-            json.dump(orders, f, ensure_ascii=False, indent=2)
-        
-        # Sauvegarde au format CSV (version aplatie)
-        csv_data = []
-        for order in orders:
-            for item in order['items']:
-                csv_data.append({
-                    'order_id': order['order_id'],
-                    'store_id': order['store_id'],
-                    'order_date': order['order_date'],
-                    'order_time': order['order_time'],
-                    'sku': item['sku'],
-                    'product_name': item['product_name'],
-                    'quantity': item['quantity']
-                })
-        
-        csv_filename = f'{orders_dir}/orders_store_{store_id:02d}.csv'
-        pd.DataFrame(csv_data).to_csv(csv_filename, index=False)
-    
-    print(f"    ✓ {num_stores} fichiers de commandes créés (JSON + CSV)")
-    
-    # 2. GÉNÉRATION DES STOCK SNAPSHOTS PAR WAREHOUSE
-    print(f"  - Génération des snapshots de stock...")
-    for _, warehouse in warehouses_df.iterrows():
-        stock_snapshot = []
-        
-        for _, product in products_df.iterrows():
-            # Stock disponible : entre 0 et 500
-            available = random.randint(0, 500)
-            # Stock réservé : entre 0 et 20% du disponible
-            reserved = random.randint(0, int(available * 0.2)) if available > 0 else 0
-            
-            stock_item = {
-                'warehouse_code': warehouse['warehouse_code'],
-                'sku': product['sku'],
-                'product_name': product['product_name'],
-                'available_quantity': available,
-                'reserved_quantity': reserved,
-                'snapshot_date': date_str,
-                'snapshot_time': '23:59:59'
-            }
-            stock_snapshot.append(stock_item)
-        
-        # Sauvegarde JSON
-        json_filename = f'{stock_dir}/stock_{warehouse["warehouse_code"]}.json'
-        with open(json_filename, 'w', encoding='utf-8') as f:
-            json.dump(stock_snapshot, f, ensure_ascii=False, indent=2)
-        
-        # Sauvegarde CSV
-        csv_filename = f'{stock_dir}/stock_{warehouse["warehouse_code"]}.csv'
-        pd.DataFrame(stock_snapshot).to_csv(csv_filename, index=False)
-    
-    print(f"    ✓ {len(warehouses_df)} fichiers de stock créés (JSON + CSV)")
-    print()
-
-print("=== Données opérationnelles générées avec succès ! ===")
-print(f"Période: {date_range_days} jours")
-print(f"Stores: {num_stores}")
-print(f"Warehouses: {len(warehouses_df)}")
-print(f"Produits: {len(products_df)}")
\ No newline at end of file
+
+from file_codecs import compression_settings, write_csv, write_json
+from pipeline_config import load_config, postgres_params
+from records import ORDER_CSV_COLUMNS, OrderLine, StockSnapshotRow, order_documents, to_frame, write_records_json
+from stock_snapshots import changed_rows, delta_columns, is_baseline_day, snapshot_settings
+
+
+def generate_store_orders(fake, products_df, date_str, store_id):
+    """Génère les commandes d'un magasin pour une date : une OrderLine par article, groupées par commande"""
+    lines = []
+    store = f'STORE{store_id:02d}'
+
+    # Nombre aléatoire de commandes par magasin (50-200)
+    num_orders = random.randint(50, 200)
+
+    for order_id in range(1, num_orders + 1):
+        # Sélection aléatoire de 1-10 produits par commande
+        num_items = random.randint(1, 10)
+        selected_products = products_df.sample(n=num_items)
+
+        order_ref = f'ORD-{date_str}-S{store_id:02d}-{order_id:04d}'
+        order_time = f"{random.randint(8, 21)}:{random.randint(0, 59):02d}:{random.randint(0, 59):02d}"
+        customer_id = fake.uuid4()
+
+        for sku, product_name in zip(selected_products['sku'], selected_products['product_name']):
+            lines.append(OrderLine(order_ref, store, date_str, order_time, customer_id, sku, product_name,
+                                   random.randint(1, 5)))
+    return lines
+
+
+def generate_stock_snapshot(products_df, warehouse_code, date_str, previous=None, change_rate=1.0):
+    """Génère le snapshot de stock d'un entrepôt pour une date
+
+    Avec previous (snapshot de la veille, même ordre de produits) et change_rate < 1, seule
+    cette fraction des SKUs reçoit de nouvelles quantités ; les autres reprennent celles de la veille.
+    """
+    stock_snapshot = []
+
+    for i, (sku, product_name) in enumerate(zip(products_df['sku'], products_df['product_name'])):
+        if previous is not None and change_rate < 1 and random.random() >= change_rate:
+            stock_snapshot.append(StockSnapshotRow(warehouse_code, sku, product_name, previous[i].available_quantity,
+                                                   previous[i].reserved_quantity, date_str))
+            continue
+        # Stock disponible : entre 0 et 500
+        available = random.randint(0, 500)
+        # Stock réservé : entre 0 et 20% du disponible
+        reserved = random.randint(0, int(available * 0.2)) if available > 0 else 0
+
+        stock_snapshot.append(StockSnapshotRow(warehouse_code, sku, product_name, available, reserved, date_str))
+    return stock_snapshot
+
+
+def main():
+    import pandas as pd
+    import psycopg2
+    from faker import Faker
+
+    # Initialisation
+    fake = Faker('fr_FR')
+    Faker.seed(42)
+    random.seed(42)
+
+    config = load_config()
+    data_gen_config = config['data_generation']
+    orders_root = config['paths']['raw_orders']
+    stock_root = config['paths']['raw_stock']
+    # Codec (none, gzip, zstd) et indentation JSON des fichiers écrits
+    codec_settings = compression_settings(config)
+    # Snapshots de stock complets chaque jour (full) ou baselines + deltas (delta)
+    snapshots = snapshot_settings(config)
+    delta_root = snapshots['delta_path']
+    change_rate = data_gen_config.get('stock_change_rate', 1.0)
+
+    # Connexion à PostgreSQL pour récupérer les données master
+    conn = psycopg2.connect(**postgres_params())
+
+    # Récupération des produits et entrepôts
+    products_df = pd.read_sql("SELECT product_id, sku, product_name FROM products", conn)
+    warehouses_df = pd.read_sql("SELECT warehouse_id, warehouse_code FROM warehouses", conn)
+    conn.close()
+
+    print("=== Génération des Données Opérationnelles ===\n")
+
+    # Configuration
+    num_stores = data_gen_config['num_stores']
+    date_range_days = data_gen_config['date_range_days']
+    base_date = datetime.now().date()
+
+    # Création des dossiers si nécessaire
+    os.makedirs(orders_root, exist_ok=True)
+    os.makedirs(stock_root, exist_ok=True)
+
+    # Génération pour chaque jour
+    previous_snapshots = {}
+    for day_offset in range(date_range_days):
+        current_date = base_date - timedelta(days=date_range_days - day_offset - 1)
+        date_str = current_date.strftime('%Y-%m-%d')
+
+        print(f"Génération des données pour {date_str}...")
+
+        # Création des dossiers par date
+        orders_dir = f'{orders_root}/{date_str}'
+        baseline = snapshots['format'] == 'full' or is_baseline_day(day_offset, snapshots)
+        stock_dir = f'{stock_root}/{date_str}' if baseline else f'{delta_root}/{date_str}'
+        # Une date n'est écrite que dans un format : l'autre version d'une génération précédente est retirée
+        stale_dir = f'{delta_root}/{date_str}' if baseline else f'{stock_root}/{date_str}'
+        if os.path.isdir(stale_dir):
+            shutil.rmtree(stale_dir)
+        os.makedirs(orders_dir, exist_ok=True)
+        os.makedirs(stock_dir, exist_ok=True)
+
+        # 1. GÉNÉRATION DES COMMANDES (ORDERS) PAR STORE/POS
+        print("  - Génération des commandes...")
+        for store_id in range(1, num_stores + 1):
+            lines = generate_store_orders(fake, products_df, date_str, store_id)
+
+            # Sauvegarde au format JSON (commandes et leurs items)
+            write_json(order_documents(lines), f'{orders_dir}/orders_store_{store_id:02d}.json', codec_settings)
+
+            # Sauvegarde au format CSV (version aplatie, une ligne par article)
+            write_csv(to_frame(lines, ORDER_CSV_COLUMNS), f'{orders_dir}/orders_store_{store_id:02d}.csv',
+                      codec_settings)
+
+        print(f"    ✓ {num_stores} fichiers de commandes créés (JSON + CSV)")
+
+        # 2. GÉNÉRATION DES STOCK SNAPSHOTS PAR WAREHOUSE
+        print("  - Génération des snapshots de stock...")
+        written_rows = 0
+        for _, warehouse in warehouses_df.iterrows():
+            warehouse_code = warehouse['warehouse_code']
+            previous = previous_snapshots.get(warehouse_code)
+            stock_snapshot = generate_stock_snapshot(products_df, warehouse_code, date_str, previous, change_rate)
+            previous_snapshots[warehouse_code] = stock_snapshot
+            if baseline:
+                written_rows += len(stock_snapshot)
+
+                # Sauvegarde JSON
+                write_records_json(stock_snapshot, f'{stock_dir}/stock_{warehouse_code}.json', codec_settings)
+
+                # Sauvegarde CSV
+                write_csv(to_frame(stock_snapshot, StockSnapshotRow.__slots__),
+                          f'{stock_dir}/stock_{warehouse_code}.csv', codec_settings)
+                continue
+
+            # Jour de delta : lignes modifiées depuis la veille, tombstones des lignes disparues
+            rows, tombstones = changed_rows(stock_snapshot, previous, date_str)
+            written_rows += len(rows) + len(tombstones)
+            columns = delta_columns(rows, tombstones)
+            write_json([dict(zip(columns, values)) for values in zip(*columns.values())],
+                       f'{stock_dir}/stock_{warehouse_code}.json', codec_settings)
+            write_csv(pd.DataFrame(columns), f'{stock_dir}/stock_{warehouse_code}.csv', codec_settings)
+
+        kind = 'snapshot complet' if baseline else 'delta'
+        print(f"    ✓ {len(warehouses_df)} fichiers de stock créés (JSON + CSV, {kind}: {written_rows} lignes)")
+        print()
+
+    print("=== Données opérationnelles générées avec succès ! ===")
+    print(f"Période: {date_range_days} jours")
+    print(f"Stores: {num_stores}")
+    print(f"Warehouses: {len(warehouses_df)}")
+    print(f"Produits: {len(products_df)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
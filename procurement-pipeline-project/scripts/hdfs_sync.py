@@ -0,0 +1,122 @@
+"""
+Synchronisation incrémentale vers HDFS
+Manifeste local des fichiers déjà transférés (taille, mtime, sha256) : seuls les fichiers
+nouveaux ou modifiés sont renvoyés, une reprise après échec ne coûte que ce qui manque
+"""
+
+import hashlib
+import json
+import os
+import subprocess
+from pathlib import Path
+
+from pipeline_config import load_config
+
+# Fichier vide écrit par scripts/compact_hdfs.py dans chaque partition compactée (part-*) ;
+# préfixe _ : ignoré par Hive et Trino, visible même sans manifeste (hdfs.sync désactivé)
+COMPACTED_MARKER = '_COMPACTED'
+
+
+def file_sha256(path, block_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def remote_sizes(hdfs_command, remote_dir):
+    """Tailles des fichiers d'un répertoire HDFS ({chemin: octets}), un seul appel -ls
+
+    hdfs_command : préfixe de la commande, ['hdfs', 'dfs'] ou ['hadoop', 'fs'].
+    """
+    result = subprocess.run([*hdfs_command, '-ls', remote_dir], capture_output=True, text=True)
+    if result.returncode != 0:
+        return {}
+    sizes = {}
+    for line in result.stdout.splitlines():
+        fields = line.split()
+        # permissions réplication propriétaire groupe taille date heure chemin
+        if len(fields) >= 8 and not fields[0].startswith('d'):
+            sizes[fields[-1]] = int(fields[4])
+    return sizes
+
+
+def remote_dirs(hdfs_command, remote_dir):
+    """Sous-répertoires d'un répertoire HDFS (chemins complets), un seul appel -ls"""
+    result = subprocess.run([*hdfs_command, '-ls', remote_dir], capture_output=True, text=True)
+    if result.returncode != 0:
+        return []
+    return sorted(fields[-1] for fields in map(str.split, result.stdout.splitlines())
+                  if len(fields) >= 8 and fields[0].startswith('d'))
+
+
+class UploadManifest:
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.entries = {}
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+
+    def is_current(self, local_file, remote_path, remote_size=None):
+        """Vrai si le fichier local est identique à la dernière version transférée
+
+        La taille et le mtime suffisent quand ils n'ont pas changé ; sinon le sha256
+        tranche (un fichier réécrit à l'identique n'est pas renvoyé). remote_size,
+        si fourni, doit aussi correspondre (fichier supprimé ou tronqué côté HDFS),
+        sauf pour un fichier fusionné par la compaction (absent sous son nom d'origine).
+        """
+        entry = self.entries.get(remote_path)
+        stat = os.stat(local_file)
+        if entry is None or entry['size'] != stat.st_size:
+            return False
+        if remote_size is not None and not entry.get('compacted') and remote_size != stat.st_size:
+            return False
+        if entry['mtime_ns'] == stat.st_mtime_ns:
+            return True
+        if entry['sha256'] != file_sha256(local_file):
+            return False
+        entry['mtime_ns'] = stat.st_mtime_ns
+        return True
+
+    def record(self, local_file, remote_path):
+        stat = os.stat(local_file)
+        self.entries[remote_path] = {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': file_sha256(local_file),
+        }
+
+    def mark_compacted(self, remote_dir):
+        """Marque les fichiers d'une partition comme fusionnés par scripts/compact_hdfs.py"""
+        prefix = remote_dir.rstrip('/') + '/'
+        for remote_path, entry in self.entries.items():
+            if remote_path.startswith(prefix):
+                entry['compacted'] = True
+
+    def is_compacted(self, remote_dir):
+        prefix = remote_dir.rstrip('/') + '/'
+        return any(entry.get('compacted') for remote_path, entry in self.entries.items()
+                   if remote_path.startswith(prefix))
+
+    def save(self):
+        """Écriture atomique du manifeste (fichier temporaire puis renommage)"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+def sync_config(config=None):
+    return (config or load_config())['hdfs'].get('sync', {})
+
+
+def load_upload_manifest(config=None):
+    """Manifeste des transferts HDFS, None si la synchronisation incrémentale est désactivée"""
+    settings = sync_config(config)
+    if not settings.get('enabled', False):
+        return None
+    return UploadManifest(settings.get('manifest_path', 'data/reference/hdfs_manifest.json'))
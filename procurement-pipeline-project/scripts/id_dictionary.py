@@ -0,0 +1,149 @@
+"""
+Dictionnaire persistant des identifiants (SKU, magasins, entrepôts)
+Associe chaque clé texte à un code entier dense (int32), stable d'une exécution à l'autre
+Construit depuis les master data PostgreSQL puis enrichi en ajout seul
+"""
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+from pipeline_config import load_config, postgres_params
+
+KINDS = ('sku', 'store_id', 'warehouse_code')
+
+
+class IdDictionary:
+
+    def __init__(self, keys=None, product_names=None, path=None):
+        self.keys = {kind: list((keys or {}).get(kind, [])) for kind in KINDS}
+        # product_names[code] : libellé du SKU de même code (décodé en sortie uniquement)
+        self.product_names = list(product_names or [None] * len(self.keys['sku']))
+        self.path = Path(path) if path else None
+        self.index = {kind: {key: code for code, key in enumerate(self.keys[kind])} for kind in KINDS}
+        self.added = 0
+
+    def size(self, kind):
+        return len(self.keys[kind])
+
+    def add(self, kind, key, product_name=None):
+        """Retourne le code d'une clé, en l'ajoutant à la fin si elle est inconnue"""
+        index = self.index[kind]
+        if key not in index:
+            index[key] = len(self.keys[kind])
+            self.keys[kind].append(key)
+            if kind == 'sku':
+                self.product_names.append(product_name)
+            self.added += 1
+        elif kind == 'sku' and product_name is not None and self.product_names[index[key]] is None:
+            self.product_names[index[key]] = product_name
+        return index[key]
+
+    def encode(self, kind, values):
+        """Encode des clés en codes int32 (-1 pour les valeurs manquantes)
+
+        Seules les catégories distinctes passent par le dictionnaire Python : lire la
+        colonne avec dtype='category' rend l'encodage proportionnel au nombre de clés.
+        """
+        import numpy as np
+        import pandas as pd
+
+        categorical = pd.Categorical(values)
+        mapping = np.array([self.add(kind, key) for key in categorical.categories], dtype=np.int32)
+        codes = mapping[categorical.codes] if len(mapping) else np.full(len(categorical), -1, dtype=np.int32)
+        codes[categorical.codes < 0] = -1
+        return codes
+
+    def decode(self, kind, codes):
+        """Retrouve les clés texte à partir des codes"""
+        import numpy as np
+
+        return np.asarray(self.keys[kind], dtype=object)[codes]
+
+    def decode_product_names(self, sku_codes):
+        import numpy as np
+
+        return np.asarray(self.product_names, dtype=object)[sku_codes]
+
+    def to_dict(self):
+        return {**self.keys, 'product_name': self.product_names}
+
+    def save(self, path=None):
+        """Écriture atomique du dictionnaire (fichier temporaire puis renommage)"""
+        path = Path(path or self.path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(path.suffix + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self.added = 0
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(keys=data, product_names=data.get('product_name'), path=path)
+
+    def extend_from_master_data(self, conn, num_stores):
+        """Ajoute les SKUs, entrepôts et magasins des master data (codes existants inchangés)"""
+        with conn.cursor() as cur:
+            cur.execute('SELECT sku, product_name FROM products ORDER BY product_id')
+            for sku, product_name in cur.fetchall():
+                self.add('sku', sku, product_name)
+            cur.execute('SELECT warehouse_code FROM warehouses ORDER BY warehouse_id')
+            for (warehouse_code,) in cur.fetchall():
+                self.add('warehouse_code', warehouse_code)
+        for store_id in range(1, num_stores + 1):
+            self.add('store_id', f'STORE{store_id:02d}')
+
+
+def refresh_from_master_data(dictionary, config):
+    import psycopg2
+
+    conn = psycopg2.connect(**postgres_params(config))
+    try:
+        dictionary.extend_from_master_data(conn, config['data_generation']['num_stores'])
+    finally:
+        conn.close()
+
+
+def load_id_dictionary(config=None):
+    """Charge le dictionnaire persistant, ou le construit depuis PostgreSQL au premier appel"""
+    config = config or load_config()
+    path = Path(config.get('dictionary', {}).get('path', 'data/reference/id_dictionary.json'))
+    if path.exists():
+        return IdDictionary.load(path)
+
+    dictionary = IdDictionary(path=path)
+    refresh_from_master_data(dictionary, config)
+    dictionary.save()
+    return dictionary
+
+
+def dictionary_enabled(config=None):
+    return (config or load_config()).get('dictionary', {}).get('enabled', False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--refresh', action='store_true',
+                        help="Ajoute les nouvelles entrées des master data au dictionnaire existant")
+    args = parser.parse_args(argv)
+
+    config = load_config()
+    dictionary = load_id_dictionary(config)
+    if args.refresh:
+        refresh_from_master_data(dictionary, config)
+        dictionary.save()
+
+    print("=== Dictionnaire des identifiants ===\n")
+    for kind in KINDS:
+        print(f"   • {kind}: {dictionary.size(kind)} codes")
+    print(f"📁 Fichier: {dictionary.path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
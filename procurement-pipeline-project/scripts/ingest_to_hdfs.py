@@ -3,24 +3,18 @@ Script d'ingestion des données vers HDFS
 Transfère les fichiers depuis le système local vers HDFS
 """
 
-import os
+import argparse
 import subprocess
+import sys
 from datetime import datetime, timedelta
-import yaml
+from pathlib import Path
 
-# Chargement de la configuration
-config_path = os.path.join(os.path.dirname(__file__), '../../config/config.yaml')
-with open(config_path, 'r') as f:
-    config = yaml.safe_load(f)
+from hdfs_sync import COMPACTED_MARKER, load_upload_manifest, remote_sizes, sync_config
+from pipeline_config import hdfs_uri, load_config, raw_input_path
+from profiling import add_profile_arguments, profile_entry_point
+from stock_snapshots import delta_enabled, materialize_snapshots
+from trino_client import TrinoClient
 
-hdfs_config = config['hdfs']
-paths_config = config['paths']
-data_gen_config = config['data_generation']
-
-# Configuration HDFS
-hdfs_base_path = hdfs_config['base_path']
-
-print("=== Ingestion des données vers HDFS ===\n")
 
 def run_hdfs_command(command):
     """Exécute une commande HDFS directement"""
@@ -35,93 +29,203 @@ def run_hdfs_command(command):
     except Exception as e:
         return False, "", str(e)
 
-# 1. Création de la structure de répertoires HDFS
-print("1. Création de la structure HDFS...")
-hdfs_dirs = [
-    f"{hdfs_base_path}/raw/orders",
-    f"{hdfs_base_path}/raw/stock",
-    f"{hdfs_base_path}/processed/aggregated_orders",
-    f"{hdfs_base_path}/processed/net_demand",
-    f"{hdfs_base_path}/output/supplier_orders",
-    f"{hdfs_base_path}/logs/exceptions"
-]
-
-for hdfs_dir in hdfs_dirs:
-    success, stdout, stderr = run_hdfs_command(f"hdfs dfs -mkdir -p {hdfs_dir}")
-    if success:
-        print(f"   ✓ {hdfs_dir}")
-    else:
-        print(f"   ✗ Erreur création {hdfs_dir}: {stderr}")
-
-# 2. Transfert des fichiers orders vers HDFS
-print("\n2. Transfert des fichiers de commandes vers HDFS...")
-base_date = datetime.now().date()
-date_range_days = data_gen_config['date_range_days']
-
-for day_offset in range(date_range_days):
-    current_date = base_date - timedelta(days=date_range_days - day_offset - 1)
-    date_str = current_date.strftime('%Y-%m-%d')
-    
-    local_orders_path = f"/app/data/raw/orders/{date_str}"
-    hdfs_orders_path = f"{hdfs_base_path}/raw/orders/"
-    
-    # Vérifier si le dossier local existe
-    if os.path.exists(local_orders_path):
-        # Copie vers HDFS
-        success, stdout, stderr = run_hdfs_command(
-            f"hdfs dfs -put -f {local_orders_path} {hdfs_orders_path}"
-        )
-        
+
+def register_partitions(trino_client, partitioned_tables, dataset, date_str, location):
+    """Enregistre le dossier <date>/ transféré comme partition des tables Hive du dataset"""
+    for table in partitioned_tables.get(dataset, []):
+        name = f"{table['schema']}.{table['table']}"
+        try:
+            trino_client.execute(
+                f"CALL system.register_partition("
+                f"schema_name => '{table['schema']}', "
+                f"table_name => '{table['table']}', "
+                f"partition_columns => ARRAY['{table['column']}'], "
+                f"partition_values => ARRAY['{date_str}'], "
+                f"location => '{location}')"
+            )
+            print(f"     ✓ Partition {date_str} enregistrée dans {name}")
+        except RuntimeError as e:
+            if 'already exists' in str(e):
+                print(f"     • Partition {date_str} déjà présente dans {name}")
+            else:
+                print(f"     ✗ Erreur enregistrement partition {name}: {e}")
+        except Exception as e:
+            print(f"     ✗ Trino indisponible, partition {name} non enregistrée: {e}")
+
+
+def is_compacted(remote_dir, manifest=None):
+    """Vrai si la partition a été compactée (part-*) : marqueur _COMPACTED ou manifeste"""
+    if manifest is not None and manifest.is_compacted(remote_dir):
+        return True
+    return run_hdfs_command(f"hdfs dfs -test -e {remote_dir}/{COMPACTED_MARKER}")[0]
+
+
+def changed_files(local_path, remote_dir, manifest, verify_remote=False):
+    """Fichiers d'un dossier local absents du manifeste ou modifiés depuis leur dernier transfert"""
+    remote = remote_sizes(['hdfs', 'dfs'], remote_dir) if verify_remote else None
+    return [
+        f for f in sorted(Path(local_path).iterdir())
+        if f.is_file() and not manifest.is_current(
+            f, f"{remote_dir}/{f.name}",
+            remote.get(f"{remote_dir}/{f.name}", -1) if remote is not None else None)
+    ]
+
+
+def ingest_dataset(dataset, label, dates, local_root, hdfs_base_path, config, trino_client, partitioned_tables,
+                   manifest=None, verify_remote=False, force=False):
+    """Transfère les dossiers <date>/ d'un dataset (orders ou stock) puis enregistre les partitions
+
+    local_root est le dossier local du dataset (config['paths'], ou sa copie validée) ; la
+    partition Hive est enregistrée à l'URI du namenode de config['hdfs'].
+
+    Avec un manifeste, seuls les fichiers nouveaux ou modifiés sont envoyés (un seul -put
+    par date) et le manifeste est sauvegardé après chaque date transférée ; force renvoie
+    tous les fichiers tout en mettant le manifeste à jour.
+    """
+    hdfs_dataset_path = f"{hdfs_base_path}/raw/{dataset}/"
+
+    for date_str in dates:
+        local_path = Path(local_root) / date_str
+        remote_dir = f"{hdfs_dataset_path}{date_str}"
+
+        # Vérifier si le dossier local existe
+        if not local_path.is_dir():
+            print(f"   ⚠ Dossier local introuvable: {local_path}")
+            continue
+
+        if manifest is not None:
+            if force:
+                to_upload = sorted(f for f in Path(local_path).iterdir() if f.is_file())
+            else:
+                to_upload = changed_files(local_path, remote_dir, manifest, verify_remote)
+            if not to_upload:
+                print(f"   • {label} du {date_str} déjà à jour")
+                continue
+            if is_compacted(remote_dir, manifest):
+                # Partition compactée (part-*) : remplacée entière pour ne pas dupliquer de lignes
+                run_hdfs_command(f"hdfs dfs -rm -r -f -skipTrash {remote_dir}")
+                to_upload = sorted(f for f in Path(local_path).iterdir() if f.is_file())
+
+            run_hdfs_command(f"hdfs dfs -mkdir -p {remote_dir}")
+            success, stdout, stderr = run_hdfs_command(
+                f"hdfs dfs -put -f {' '.join(str(f) for f in to_upload)} {remote_dir}/"
+            )
+            if success:
+                for f in to_upload:
+                    manifest.record(f, f"{remote_dir}/{f.name}")
+                manifest.save()
+        else:
+            # Partition compactée : remplacée entière, les originaux ajoutés à côté des part-*
+            # seraient comptés deux fois par Hive/Trino
+            if is_compacted(remote_dir):
+                run_hdfs_command(f"hdfs dfs -rm -r -f -skipTrash {remote_dir}")
+            # Copie vers HDFS
+            success, stdout, stderr = run_hdfs_command(
+                f"hdfs dfs -put -f {local_path} {hdfs_dataset_path}"
+            )
+
         if success:
-            print(f"   ✓ Commandes du {date_str} transférées")
+            print(f"   ✓ {label} du {date_str} transféré(es)")
+            register_partitions(trino_client, partitioned_tables, dataset, date_str,
+                                hdfs_uri(config, f"{hdfs_dataset_path}{date_str}"))
         else:
             print(f"   ✗ Erreur pour {date_str}: {stderr}")
+
+
+@profile_entry_point('ingest_to_hdfs')
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--date', nargs='+', metavar='DATE',
+                        help="Dates à transférer (YYYY-MM-DD), fenêtre date_range_days par défaut")
+    parser.add_argument('--full', action='store_true',
+                        help="Transfère tous les fichiers sans consulter le manifeste")
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+
+    config = load_config()
+    hdfs_config = config['hdfs']
+    data_gen_config = config['data_generation']
+
+    # Configuration HDFS
+    hdfs_base_path = hdfs_config['base_path']
+
+    # Tables Hive partitionnées par date, à mettre à jour après chaque transfert
+    trino_client = TrinoClient.from_config(config)
+    partitioned_tables = config['presto'].get('partitioned_tables', {})
+
+    # Manifeste des fichiers déjà transférés (--full pour tout renvoyer)
+    manifest = load_upload_manifest(config)
+    verify_remote = sync_config(config).get('verify_remote', False)
+
+    if args.date:
+        dates = args.date
     else:
-        print(f"   ⚠ Dossier local introuvable: {local_orders_path}")
-
-# 3. Transfert des fichiers stock vers HDFS
-print("\n3. Transfert des snapshots de stock vers HDFS...")
-for day_offset in range(date_range_days):
-    current_date = base_date - timedelta(days=date_range_days - day_offset - 1)
-    date_str = current_date.strftime('%Y-%m-%d')
-    
-    local_stock_path = f"/app/data/raw/stock/{date_str}"
-    hdfs_stock_path = f"{hdfs_base_path}/raw/stock/"
-    
-    # Vérifier si le dossier local existe
-    if os.path.exists(local_stock_path):
-        # Copie vers HDFS
-        success, stdout, stderr = run_hdfs_command(
-            f"hdfs dfs -put -f {local_stock_path} {hdfs_stock_path}"
-        )
-        
+        base_date = datetime.now().date()
+        date_range_days = data_gen_config['date_range_days']
+        dates = [
+            (base_date - timedelta(days=date_range_days - day_offset - 1)).strftime('%Y-%m-%d')
+            for day_offset in range(date_range_days)
+        ]
+
+    print("=== Ingestion des données vers HDFS ===\n")
+
+    # 1. Création de la structure de répertoires HDFS
+    print("1. Création de la structure HDFS...")
+    hdfs_dirs = [
+        f"{hdfs_base_path}/raw/orders",
+        f"{hdfs_base_path}/raw/stock",
+        f"{hdfs_base_path}/processed/aggregated_orders",
+        f"{hdfs_base_path}/processed/net_demand",
+        f"{hdfs_base_path}/output/supplier_orders",
+        f"{hdfs_base_path}/logs/exceptions"
+    ]
+
+    for hdfs_dir in hdfs_dirs:
+        success, stdout, stderr = run_hdfs_command(f"hdfs dfs -mkdir -p {hdfs_dir}")
         if success:
-            print(f"   ✓ Stock du {date_str} transféré")
+            print(f"   ✓ {hdfs_dir}")
         else:
-            print(f"   ✗ Erreur pour {date_str}: {stderr}")
+            print(f"   ✗ Erreur création {hdfs_dir}: {stderr}")
+
+    # 2. Transfert des fichiers orders vers HDFS
+    print("\n2. Transfert des fichiers de commandes vers HDFS...")
+    ingest_dataset('orders', "Commandes", dates, raw_input_path(config, 'raw_orders'), hdfs_base_path, config,
+                   trino_client, partitioned_tables, manifest, verify_remote, args.full)
+
+    # 3. Transfert des fichiers stock vers HDFS
+    print("\n3. Transfert des snapshots de stock vers HDFS...")
+    # Format delta : état complet reconstruit par date (baseline + deltas, tombstones appliquées)
+    stock_root = raw_input_path(config, 'raw_stock')
+    if delta_enabled(config):
+        stock_root = materialize_snapshots(dates, config)
+    ingest_dataset('stock', "Stock", dates, stock_root, hdfs_base_path, config,
+                   trino_client, partitioned_tables, manifest, verify_remote, args.full)
+
+    # 4. Vérification des fichiers dans HDFS
+    print("\n4. Vérification des fichiers dans HDFS...")
+    print("\n   Structure des commandes:")
+    success, stdout, stderr = run_hdfs_command(f"hdfs dfs -ls {hdfs_base_path}/raw/orders")
+    if success:
+        print(stdout)
+    else:
+        print(f"   Erreur: {stderr}")
+
+    print("\n   Structure des stocks:")
+    success, stdout, stderr = run_hdfs_command(f"hdfs dfs -ls {hdfs_base_path}/raw/stock")
+    if success:
+        print(stdout)
     else:
-        print(f"   ⚠ Dossier local introuvable: {local_stock_path}")
-
-# 4. Vérification des fichiers dans HDFS
-print("\n4. Vérification des fichiers dans HDFS...")
-print("\n   Structure des commandes:")
-success, stdout, stderr = run_hdfs_command(f"hdfs dfs -ls {hdfs_base_path}/raw/orders")
-if success:
-    print(stdout)
-else:
-    print(f"   Erreur: {stderr}")
-
-print("\n   Structure des stocks:")
-success, stdout, stderr = run_hdfs_command(f"hdfs dfs -ls {hdfs_base_path}/raw/stock")
-if success:
-    print(stdout)
-else:
-    print(f"   Erreur: {stderr}")
-
-# 5. Compter les fichiers transférés
-print("\n5. Statistiques de transfert:")
-success, stdout, stderr = run_hdfs_command(f"hdfs dfs -count {hdfs_base_path}/raw")
-if success:
-    print(stdout)
-
-print("\n=== Ingestion terminée ! ===")
\ No newline at end of file
+        print(f"   Erreur: {stderr}")
+
+    # 5. Compter les fichiers transférés
+    print("\n5. Statistiques de transfert:")
+    success, stdout, stderr = run_hdfs_command(f"hdfs dfs -count {hdfs_base_path}/raw")
+    if success:
+        print(stdout)
+
+    print("\n=== Ingestion terminée ! ===")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
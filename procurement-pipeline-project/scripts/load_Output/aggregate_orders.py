@@ -1,74 +1,331 @@
 """
 Script d'agrégation des commandes pour toutes les dates
-Calcule la demande totale par SKU pour chaque jour
+Calcule la demande totale par SKU pour chaque jour, et dans la même lecture les totaux
+par magasin × SKU et catégorie × SKU (aggregation.levels)
 """
 
-import pandas as pd
-import os
-from pathlib import Path
+import argparse
 import subprocess
-import yaml
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from demand_cube import cube_enabled, open_cube
+from file_codecs import compression_settings, data_files
+from id_dictionary import dictionary_enabled, load_id_dictionary
+from pipeline_config import load_config, raw_input_path
+from profiling import add_profile_arguments, profile_entry_point
+from run_checkpoints import add_resume_argument, load_checkpoints, pending_dates
+from stage_files import ARROW_SUFFIX, intermediate_settings, write_stage_file
 
-# Chargement configuration
-config_path = 'config/config.yaml'
-with open(config_path, 'r') as f:
-    config = yaml.safe_load(f)
+AGGREGATIONS = {'quantity': 'sum', 'product_name': 'first'}
 
-# Chemins
-orders_path = "data/raw/orders"
-output_path_local = "data/processed/aggregated_orders"
 output_path_hdfs = "/procurement/processed/aggregated_orders"
 
-os.makedirs(output_path_local, exist_ok=True)
+# Niveau -> (clé de config.paths, préfixe des fichiers et du répertoire HDFS)
+# sku est toujours produit (entrée du net demand) ; les autres selon aggregation.levels
+LEVELS = {
+    'sku': ('processed_aggregated', 'aggregated_orders'),
+    'store_sku': ('processed_store_aggregated', 'store_sku_orders'),
+    'category_sku': ('processed_category_aggregated', 'category_sku_orders'),
+}
+
+
+def empty_aggregation(keys=('sku',)):
+    """Résultat d'un jour sans commande : colonnes attendues, aucune ligne"""
+    import pandas as pd
+
+    return pd.DataFrame(columns=[*keys, *AGGREGATIONS])
+
+
+def aggregate_in_memory(csv_files, keys=('sku',)):
+    """Concatène tous les fichiers du jour puis agrège par keys (SKU, ou magasin × SKU)"""
+    import pandas as pd
+
+    if not csv_files:
+        return empty_aggregation(keys), 0
+    orders_df = pd.concat([pd.read_csv(f, usecols=[*keys, 'product_name', 'quantity']) for f in csv_files],
+                          ignore_index=True)
+    return orders_df.groupby(list(keys)).agg(AGGREGATIONS).reset_index(), len(orders_df)
+
+
+def aggregate_streaming(csv_files, chunksize, keys=('sku',)):
+    """Agrège fichier par fichier et bloc par bloc dans un accumulateur par keys
+
+    La mémoire est bornée par le nombre de clés distinctes et non par le nombre de lignes.
+    Les fichiers et les blocs sont lus dans le même ordre que le mode memory, ce qui
+    garantit le même 'first' pour product_name et donc un résultat identique.
+    """
+    import pandas as pd
+
+    accumulator = None
+    total_rows = 0
+    levels = list(range(len(keys)))
+    for csv_file in csv_files:
+        for chunk in pd.read_csv(csv_file, usecols=[*keys, 'product_name', 'quantity'], chunksize=chunksize):
+            total_rows += len(chunk)
+            partial = chunk.groupby(list(keys), sort=False).agg(AGGREGATIONS)
+            if accumulator is not None:
+                partial = pd.concat([accumulator, partial]).groupby(level=levels, sort=False).agg(AGGREGATIONS)
+            accumulator = partial
+    if accumulator is None:
+        return empty_aggregation(keys), total_rows
+    return accumulator.sort_index().reset_index(), total_rows
+
+
+def aggregate_encoded(csv_files, dictionary, chunksize=None, keys=('sku',)):
+    """Agrège sur les codes entiers du dictionnaire (bincount), libellés décodés en sortie
+
+    Seules les colonnes de keys et product_name (lues en category) et quantity sont chargées ;
+    l'accumulateur est une matrice magasins × SKUs indexée par codes (une seule ligne sans
+    store_id dans keys), donc bornée par la taille des master data. Un SKU sans libellé dans
+    le dictionnaire (absent des master data) reçoit le premier product_name lu dans les CSV.
+    """
+    import numpy as np
+    import pandas as pd
+
+    by_store = 'store_id' in keys
+    totals = np.zeros((dictionary.size('store_id') if by_store else 1, dictionary.size('sku')), dtype=np.int64)
+    seen = np.zeros(totals.shape, dtype=bool)
+    total_rows = 0
+    for csv_file in csv_files:
+        reader = pd.read_csv(csv_file, usecols=[*keys, 'product_name', 'quantity'],
+                             dtype={key: 'category' for key in (*keys, 'product_name')}, chunksize=chunksize)
+        for chunk in (reader if chunksize else [reader]):
+            total_rows += len(chunk)
+            codes = dictionary.encode('sku', chunk['sku'])
+            store_codes = dictionary.encode('store_id', chunk['store_id']) if by_store else np.zeros_like(codes)
+            valid = (codes >= 0) & (store_codes >= 0)
+            unnamed = valid & pd.isna(dictionary.decode_product_names(np.maximum(codes, 0)))
+            if unnamed.any():
+                first_names = chunk.loc[unnamed, ['sku', 'product_name']].dropna().drop_duplicates('sku')
+                for sku, product_name in first_names.itertuples(index=False):
+                    dictionary.add('sku', sku, product_name)
+            codes, store_codes = codes[valid], store_codes[valid]
+            shape = (dictionary.size('store_id') if by_store else 1, dictionary.size('sku'))
+            if shape != totals.shape:
+                growth = ((0, shape[0] - totals.shape[0]), (0, shape[1] - totals.shape[1]))
+                totals, seen = np.pad(totals, growth), np.pad(seen, growth)
+            cells = store_codes.astype(np.int64) * shape[1] + codes
+            totals += np.bincount(cells, weights=chunk['quantity'].to_numpy()[valid],
+                                  minlength=totals.size).round().astype(np.int64).reshape(shape)
+            seen.flat[cells] = True
+
+    store_codes, sku_codes = np.nonzero(seen)
+    aggregated = pd.DataFrame({
+        'sku': dictionary.decode('sku', sku_codes),
+        'quantity': totals[store_codes, sku_codes],
+        'product_name': dictionary.decode_product_names(sku_codes),
+    })
+    if by_store:
+        aggregated.insert(0, 'store_id', dictionary.decode('store_id', store_codes))
+    return aggregated.sort_values(list(keys), ignore_index=True), total_rows
+
+
+def verify_aggregation(csv_files, detail, keys=('sku',), compare_names=True):
+    """Compare un résultat streaming ou encodé au mode memory ; retourne la liste des écarts
+
+    Les libellés ne sont comparés que si compare_names (le mode encodé les prend du dictionnaire).
+    """
+    expected, _ = aggregate_in_memory(csv_files, keys)
+    columns = [*keys, 'quantity'] + (['product_name'] if compare_names else [])
+    merged = expected[columns].merge(detail[columns], on=list(keys), how='outer',
+                                     suffixes=('_memory', ''), indicator=True)
+    differs = merged['_merge'] != 'both'
+    for column in columns[len(keys):]:
+        memory, other = merged[column + '_memory'], merged[column]
+        differs |= ~(memory.eq(other) | (memory.isna() & other.isna()))
+    return merged[differs].drop(columns='_merge')
+
+
+def rollup_levels(detail, levels, categories=None):
+    """Niveaux d'agrégation dérivés du grain le plus fin (magasin × SKU ou SKU), sans relire les commandes
+
+    Retourne {niveau: DataFrame} avec la colonne total_quantity ; categories associe
+    sku -> category (products) pour le niveau category_sku.
+    """
+    if 'store_id' in detail.columns:
+        by_sku = detail.groupby('sku').agg(AGGREGATIONS).reset_index()
+    else:
+        by_sku = detail
+    results = {'sku': by_sku.rename(columns={'quantity': 'total_quantity'})}
+    if 'store_sku' in levels:
+        results['store_sku'] = detail.rename(columns={'quantity': 'total_quantity'})
+    if 'category_sku' in levels:
+        by_category = results['sku'].merge(categories, on='sku', how='left')
+        by_category['category'] = by_category['category'].fillna('UNKNOWN')
+        results['category_sku'] = by_category[['category', 'sku', 'total_quantity', 'product_name']] \
+            .sort_values(['category', 'sku'], ignore_index=True)
+    return results
+
 
-print("=== Agrégation des commandes pour toutes les dates ===\n")
+def aggregation_levels(aggregation_config):
+    """Niveaux produits : sku (toujours) puis ceux de aggregation.levels"""
+    levels = ['sku', *aggregation_config.get('levels', [])]
+    unknown = [level for level in levels if level not in LEVELS]
+    if unknown:
+        raise ValueError(f"Niveau d'agrégation inconnu: {', '.join(unknown)} (attendu: {', '.join(LEVELS)})")
+    return list(dict.fromkeys(levels))
 
-# Traiter toutes les dates
-date_folders = sorted([d for d in Path(orders_path).iterdir() if d.is_dir()])
 
-print(f"Nombre de dates à traiter: {len(date_folders)}\n")
+def load_categories(config):
+    """Catégorie de chaque SKU (master data products)"""
+    import pandas as pd
+    import psycopg2
+    from pipeline_config import postgres_params
 
-for date_folder in date_folders:
+    conn = psycopg2.connect(**postgres_params(config))
+    categories = pd.read_sql('SELECT sku, category FROM products', conn)
+    conn.close()
+    return categories
+
+
+def use_streaming(csv_files, aggregation_config):
+    """Choisit le mode d'agrégation : memory, streaming ou auto (selon la taille du jour)"""
+    mode = aggregation_config.get('mode', 'memory')
+    threshold_bytes = aggregation_config.get('streaming_threshold_mb', 512) * 1024 * 1024
+    return mode == 'streaming' or (
+        mode == 'auto' and sum(f.stat().st_size for f in csv_files) > threshold_bytes
+    )
+
+
+def aggregate_date(date_folder, output_path_local, aggregation_config, dictionary=None, cube=None,
+                   codec_settings=None, intermediate=None, level_outputs=None, categories=None, verify=False):
+    """Agrège les commandes d'un dossier <date>, écrit aggregated_orders_<date> et retourne les fichiers écrits
+
+    cube est un couple (DemandCube, IdDictionary) : la ligne ordered_quantity de la date
+    y est remplacée par les totaux agrégés. level_outputs associe chaque niveau
+    supplémentaire (store_sku, category_sku) à son répertoire : tous les niveaux sont
+    dérivés de la même lecture des commandes. verify relit le jour en mode memory et lève
+    ValueError si le résultat streaming ou encodé en diffère (rien n'est alors écrit).
+    """
+    level_outputs = level_outputs or {}
     date_str = date_folder.name
     print(f"📅 Traitement du {date_str}...")
-    
-    # Lire tous les CSV du jour
-    all_orders = []
-    csv_files = list(date_folder.glob("*.csv"))
-    
-    for csv_file in csv_files:
-        df = pd.read_csv(csv_file)
-        all_orders.append(df)
-    
-    # Concaténer
-    orders_df = pd.concat(all_orders, ignore_index=True)
-    print(f"   Total lignes: {len(orders_df)}")
-    
-    # Agrégation par SKU
-    aggregated = orders_df.groupby('sku').agg({
-        'quantity': 'sum',
-        'product_name': 'first'
-    }).reset_index()
-    
-    aggregated.columns = ['sku', 'total_quantity', 'product_name']
-    print(f"   SKUs distincts: {len(aggregated)}")
-    
-    # Sauvegarder localement
-    output_file_local = f"{output_path_local}/aggregated_orders_{date_str}.csv"
-    aggregated.to_csv(output_file_local, index=False)
-    print(f"   ✓ Sauvegardé: {output_file_local}")
-    
-    # Transférer vers HDFS
-    hdfs_command = f"docker exec procurement_namenode hdfs dfs -put -f /data/processed/aggregated_orders/aggregated_orders_{date_str}.csv {output_path_hdfs}/"
-    result = subprocess.run(hdfs_command, shell=True, capture_output=True)
-    
-    if result.returncode == 0:
-        print(f"   ✓ Transféré vers HDFS: {output_path_hdfs}/")
+
+    # Lire tous les CSV du jour (compressés ou non)
+    csv_files = data_files(date_folder)
+
+    # Agrégation au grain le plus fin demandé (magasin × SKU si store_sku, sinon SKU)
+    keys = ('store_id', 'sku') if 'store_sku' in level_outputs else ('sku',)
+    streaming = use_streaming(csv_files, aggregation_config)
+    chunksize = aggregation_config.get('chunksize', 200000) if streaming else None
+    if dictionary is not None:
+        detail, total_rows = aggregate_encoded(csv_files, dictionary, chunksize, keys)
+    elif streaming:
+        detail, total_rows = aggregate_streaming(csv_files, chunksize, keys)
     else:
-        print(f"   ⚠ Erreur transfert HDFS")
-    
+        detail, total_rows = aggregate_in_memory(csv_files, keys)
+    print(f"   Total lignes: {total_rows}{' (streaming)' if streaming else ''}")
+    if verify and (streaming or dictionary is not None):
+        mismatches = verify_aggregation(csv_files, detail, keys, compare_names=dictionary is None)
+        if len(mismatches):
+            raise ValueError(f"{date_str}: {len(mismatches)} écarts avec le mode memory\n{mismatches.head(20)}")
+        print("   ✓ Identique au mode memory")
+
+    results = rollup_levels(detail, level_outputs, categories)
+    aggregated = results['sku']
+    print(f"   SKUs distincts: {len(aggregated)}")
+
+    # Sauvegarder localement (Arrow pour les étapes suivantes et/ou export CSV)
+    output_dirs = {'sku': output_path_local, **level_outputs}
+    output_files = {}
+    for level, level_df in results.items():
+        prefix = LEVELS[level][1]
+        output_files[prefix] = write_stage_file(level_df, f"{output_dirs[level]}/{prefix}_{date_str}.csv",
+                                                intermediate or intermediate_settings(),
+                                                codec_settings or compression_settings())
+        for output_file in output_files[prefix]:
+            print(f"   ✓ Sauvegardé: {output_file}" + (f" ({len(level_df)} lignes)" if level != 'sku' else ''))
+
+    if cube is not None:
+        demand_cube, ids = cube
+        demand_cube.update(date_str, 'ordered_quantity', ids.encode('sku', aggregated['sku']), aggregated['total_quantity'])
+
+    # Transférer vers HDFS (export CSV uniquement, lisible par Hive)
+    for prefix, level_files in output_files.items():
+        hdfs_dir = output_path_hdfs if prefix == 'aggregated_orders' else f"/procurement/processed/{prefix}"
+        for output_file_local in [f for f in level_files if f.suffix != ARROW_SUFFIX]:
+            hdfs_command = f"docker exec procurement_namenode hdfs dfs -put -f /data/processed/{prefix}/{output_file_local.name} {hdfs_dir}/"
+            result = subprocess.run(hdfs_command, shell=True, capture_output=True)
+
+            if result.returncode == 0:
+                print(f"   ✓ Transféré vers HDFS: {hdfs_dir}/")
+            else:
+                print("   ⚠ Erreur transfert HDFS")
+
     print()
+    return [f for level_files in output_files.values() for f in level_files]
+
+
+@profile_entry_point('aggregate_orders')
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--date', nargs='+', metavar='DATE',
+                        help="Dates à traiter (YYYY-MM-DD), toutes par défaut")
+    parser.add_argument('--verify', action='store_true',
+                        help="Compare chaque jour agrégé en streaming ou encodé au mode memory")
+    add_resume_argument(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+
+    config = load_config()
+
+    # Chemins
+    orders_path = raw_input_path(config, 'raw_orders')
+    output_path_local = Path(config['paths']['processed_aggregated'])
+    output_path_local.mkdir(parents=True, exist_ok=True)
+
+    # Niveaux supplémentaires (magasin × SKU, catégorie × SKU) tirés de la même lecture
+    levels = aggregation_levels(config.get('aggregation', {}))
+    level_outputs = {level: Path(config['paths'][LEVELS[level][0]]) for level in levels if level != 'sku'}
+    for level_path in level_outputs.values():
+        level_path.mkdir(parents=True, exist_ok=True)
+    categories = load_categories(config) if 'category_sku' in levels else None
+
+    print("=== Agrégation des commandes pour toutes les dates ===\n")
+
+    # Traiter toutes les dates (ou celles demandées)
+    date_folders = sorted([d for d in orders_path.iterdir() if d.is_dir()])
+    if args.date:
+        date_folders = [d for d in date_folders if d.name in args.date]
+    checkpoints = load_checkpoints(config)
+    pending = set(pending_dates(checkpoints, 'aggregate_orders', [d.name for d in date_folders], args.resume))
+    date_folders = [d for d in date_folders if d.name in pending]
+
+    print(f"Nombre de dates à traiter: {len(date_folders)}\n")
+
+    # Identifiants encodés en int32 via le dictionnaire persistant
+    ids = load_id_dictionary(config) if dictionary_enabled(config) or cube_enabled(config) else None
+    dictionary = ids if dictionary_enabled(config) else None
+    cube = (open_cube(config), ids) if cube_enabled(config) else None
+
+    new_skus = 0
+    for date_folder in date_folders:
+        output_files = aggregate_date(date_folder, output_path_local, config.get('aggregation', {}), dictionary,
+                                      cube, compression_settings(config), intermediate_settings(config),
+                                      level_outputs, categories, args.verify)
+        if checkpoints is not None:
+            # Codes attribués pendant la date persistés avant le point de reprise (cube cohérent à la reprise)
+            if ids is not None and ids.added:
+                new_skus += ids.added
+                ids.save()
+            checkpoints.mark_done('aggregate_orders', date_folder.name, output_files)
+
+    if ids is not None and ids.added:
+        new_skus += ids.added
+        ids.save()
+    if new_skus:
+        print(f"⚠ {new_skus} SKUs inconnus des master data ajoutés au dictionnaire")
+
+    print(f"✅ Agrégation complète pour {len(date_folders)} dates")
+    print(f"📁 Fichiers locaux: {output_path_local}/")
+    for level_path in level_outputs.values():
+        print(f"📁 Fichiers locaux: {level_path}/")
+    print(f"📁 Fichiers HDFS: {output_path_hdfs}/")
+    return 0
+
 
-print(f"✅ Agrégation complète pour {len(date_folders)} dates")
-print(f"📁 Fichiers locaux: {output_path_local}/")
-print(f"📁 Fichiers HDFS: {output_path_hdfs}/")
\ No newline at end of file
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,108 +2,411 @@
 Script de calcul du net demand pour toutes les dates
 """
 
-import pandas as pd
-import psycopg2
-import yaml
+import argparse
+import sys
 from pathlib import Path
-import subprocess
-import os
 
-# Chargement configuration
-with open('config/config.yaml', 'r') as f:
-    config = yaml.safe_load(f)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
-print("=== Calcul du Net Demand pour toutes les dates ===\n")
+from demand_cube import cube_enabled, open_cube
+from file_codecs import compression_settings, data_files, file_date
+from id_dictionary import dictionary_enabled, load_id_dictionary
+from pipeline_config import load_config, postgres_params, raw_input_path
+from profiling import add_profile_arguments, profile_entry_point
+from run_checkpoints import add_resume_argument, load_checkpoints, pending_dates
+from sharding import add_shard_argument, filter_products, shard_checkpoints, shard_dir, shard_name
+from stage_files import intermediate_settings, read_stage_file, stage_files, write_stage_file
+from stock_snapshots import StockSnapshots, delta_enabled
 
-# Connexion PostgreSQL pour charger products une seule fois
-conn = psycopg2.connect(
-    host='procurement_postgres',
-    database='procurement_db',
-    user='postgres',
-    password='postgres'
-)
+# Stock agrégé par SKU pour une date, lu via l'index couvrant idx_stock_date_product
+STOCK_LEVELS_QUERY = """
+    SELECT p.sku,
+           SUM(s.available_quantity) AS available_stock,
+           SUM(s.reserved_quantity) AS reserved_stock
+    FROM stock_levels s
+    JOIN products p ON p.product_id = s.product_id
+    WHERE s.snapshot_date = %(snapshot_date)s
+    GROUP BY p.sku
+"""
 
-products_df = pd.read_sql('SELECT sku, supplier_id, pack_size, min_order_quantity as moq, safety_stock FROM products', conn)
-conn.close()
+# Règles d'approvisionnement, avec le délai fournisseur pour le mode planification
+PRODUCTS_QUERY = """
+    SELECT p.sku, p.supplier_id, p.pack_size, p.case_size,
+           p.min_order_quantity AS moq, p.safety_stock,
+           COALESCE(s.lead_time_days, 1) AS lead_time_days
+    FROM products p
+    LEFT JOIN suppliers s ON s.supplier_id = p.supplier_id
+"""
 
-print(f"✓ Produits chargés: {len(products_df)}\n")
+PLANNING_COLUMNS = ['total_quantity', 'product_name', 'available_stock', 'reserved_stock', 'supplier_id',
+                    'pack_size', 'case_size', 'moq', 'safety_stock', 'lead_time_days', 'horizon_demand',
+                    'net_demand', 'order_quantity']
 
-# Chemins
-agg_path = Path('data/processed/aggregated_orders')
-stock_path = Path('data/raw/stock')
-output_path_local = Path('data/processed/net_demand')
 output_path_hdfs = "/procurement/processed/net_demand"
 
-output_path_local.mkdir(parents=True, exist_ok=True)
-
-# Traiter chaque date
-agg_files = sorted(agg_path.glob('aggregated_orders_*.csv'))
-
-print(f"Nombre de dates à traiter: {len(agg_files)}\n")
-
-for agg_file in agg_files:
-    date_str = agg_file.stem.split('_')[-1]
-    print(f"📅 Traitement du {date_str}...")
-    
-    # 1. Lire agrégation
-    orders_agg = pd.read_csv(agg_file)
-    
-    # 2. Lire stocks correspondants
-    stock_date_path = stock_path / date_str
-    if not stock_date_path.exists():
-        print(f"   ⚠ Pas de stock pour {date_str}, ignoré")
-        continue
-    
+
+def load_products(conn):
+    """Charge les règles d'approvisionnement de tous les produits"""
+    import pandas as pd
+
+    return pd.read_sql(PRODUCTS_QUERY, conn)
+
+
+def read_stock_csv(stock_date_path, skus=None):
+    """Lit les snapshots CSV d'une date et agrège les stocks par SKU (limités à skus si fourni)"""
+    import pandas as pd
+
     all_stocks = []
-    for csv_file in stock_date_path.glob('*.csv'):
+    for csv_file in data_files(stock_date_path):
         df = pd.read_csv(csv_file)
+        if skus is not None:
+            df = df[df['sku'].isin(skus)]
         all_stocks.append(df)
-    
+
     stocks_df = pd.concat(all_stocks, ignore_index=True)
-    
+
     # Agréger stocks par SKU
     stocks_agg = stocks_df.groupby('sku').agg({
         'available_quantity': 'sum',
         'reserved_quantity': 'sum'
     }).reset_index()
-    
+
     stocks_agg.rename(columns={
         'available_quantity': 'available_stock',
         'reserved_quantity': 'reserved_stock'
     }, inplace=True)
-    
+    return stocks_agg
+
+
+def read_stock_csv_encoded(stock_date_path, dictionary):
+    """Variante de read_stock_csv qui agrège sur les codes SKU du dictionnaire (bincount)"""
+    import numpy as np
+    import pandas as pd
+
+    available = np.zeros(dictionary.size('sku'), dtype=np.int64)
+    reserved = np.zeros(dictionary.size('sku'), dtype=np.int64)
+    seen = np.zeros(dictionary.size('sku'), dtype=bool)
+    for csv_file in data_files(stock_date_path):
+        df = pd.read_csv(csv_file, usecols=['sku', 'available_quantity', 'reserved_quantity'],
+                         dtype={'sku': 'category'})
+        codes = dictionary.encode('sku', df['sku'])
+        valid = codes >= 0
+        codes = codes[valid]
+        size = dictionary.size('sku')
+        if size > len(available):
+            available, reserved, seen = (np.pad(a, (0, size - len(a))) for a in (available, reserved, seen))
+        available += np.bincount(codes, weights=df['available_quantity'].to_numpy()[valid], minlength=size).round().astype(np.int64)
+        reserved += np.bincount(codes, weights=df['reserved_quantity'].to_numpy()[valid], minlength=size).round().astype(np.int64)
+        seen[codes] = True
+
+    sku_codes = np.flatnonzero(seen).astype(np.int32)
+    return pd.DataFrame({
+        'sku_code': sku_codes,
+        'available_stock': available[sku_codes],
+        'reserved_stock': reserved[sku_codes],
+    })
+
+
+def compute_net_demand(orders_agg, stocks_agg, products_df, key='sku'):
+    """Joint commandes, stocks et produits puis calcule net demand et quantité à commander
+
+    key vaut 'sku' (chaînes) ou 'sku_code' (codes int32 du dictionnaire d'identifiants).
+    """
     # 3. Joindre
-    result = orders_agg.merge(stocks_agg, on='sku', how='left')
-    result = result.merge(products_df[['sku', 'supplier_id', 'pack_size', 'moq', 'safety_stock']], on='sku', how='left')
-    
+    result = orders_agg.merge(stocks_agg, on=key, how='left')
+    result = result.merge(products_df[[key, 'supplier_id', 'pack_size', 'moq', 'safety_stock']], on=key, how='left')
+
     # 4. Calculer net demand
     result['net_demand'] = result.apply(
-        lambda row: max(0, row['total_quantity'] + row['safety_stock'] - 
+        lambda row: max(0, row['total_quantity'] + row['safety_stock'] -
                         (row['available_stock'] - row['reserved_stock'])),
         axis=1
     )
-    
+
     # 5. Arrondir au pack_size
     result['order_quantity'] = (result['net_demand'] / result['pack_size']).apply(lambda x: int(x) if x > 0 else 0) * result['pack_size']
-    
+
     # Appliquer MOQ
     result['order_quantity'] = result.apply(
         lambda row: max(row['order_quantity'], row['moq']) if row['order_quantity'] > 0 else 0,
         axis=1
     )
-    
+
     # Filtrer SKUs à commander
-    to_order = result[result['order_quantity'] > 0].copy()
-    
-    print(f"   SKUs à commander: {len(to_order)}")
-    print(f"   Quantité totale: {to_order['order_quantity'].sum()}")
-    
-    # 6. Sauvegarder localement
-    output_file_local = output_path_local / f"net_demand_{date_str}.csv"
-    to_order.to_csv(output_file_local, index=False)
-    print(f"   ✓ Sauvegardé: {output_file_local}")
-    
-    print()
-
-print(f"\n✅ Net demand calculé pour {len(agg_files)} dates")
-print(f"📁 Fichiers locaux: {output_path_local}/")
\ No newline at end of file
+    return result[result['order_quantity'] > 0].copy()
+
+
+def compute_lead_time_demand(daily_orders, daily_stocks, products_df, key='sku', forecast_window_days=7):
+    """Net demand sur l'horizon de délai fournisseur, toutes dates et tous SKUs en une passe
+
+    daily_orders : colonnes date, key, total_quantity, product_name (agrégats journaliers)
+    daily_stocks : colonnes date, key, available_stock, reserved_stock
+
+    La demande de l'horizon d'un SKU à la date D est une prévision : moyenne journalière
+    des forecast_window_days derniers jours (D inclus, moins de jours en début
+    d'historique) multipliée par lead_time_days, arrondie à l'unité supérieure. La
+    moyenne est calculée par différence de sommes cumulées sur la matrice dates × SKUs,
+    complétée en calendrier continu (jour sans commande = 0). Règle d'arrondi unique :
+    la quantité est arrondie au multiple supérieur du lot (PPCM du pack et du carton),
+    MOQ compris.
+    """
+    import numpy as np
+    import pandas as pd
+
+    ordered = daily_orders.pivot_table(index='date', columns=key, values='total_quantity',
+                                       aggfunc='sum', fill_value=0).sort_index()
+    # Calendrier continu : une date absente compte comme un jour sans commande
+    calendar = pd.date_range(ordered.index.min(), ordered.index.max(), freq='D').strftime('%Y-%m-%d') \
+        if len(ordered) else ordered.index
+    ordered = ordered.reindex(calendar, fill_value=0)
+    dates, skus = ordered.index, ordered.columns
+    products = products_df.set_index(key).reindex(skus)
+
+    # Moyenne glissante : (cumul[t] - cumul[t - fenêtre]) / jours disponibles
+    window = max(int(forecast_window_days), 1)
+    cumulative = np.vstack([np.zeros((1, len(skus)), dtype=np.int64),
+                            ordered.to_numpy(dtype=np.int64).cumsum(axis=0)])
+    end = np.arange(1, len(dates) + 1)
+    start = np.maximum(end - window, 0)
+    daily_average = (cumulative[end] - cumulative[start]) / (end - start)[:, None]
+    lead_time = products['lead_time_days'].fillna(1).clip(lower=1).to_numpy(dtype=np.int64)
+    horizon_demand = np.ceil(np.round(daily_average * lead_time[None, :], 6)).astype(np.int64)
+
+    def stock_matrix(column):
+        return daily_stocks.pivot_table(index='date', columns=key, values=column, aggfunc='sum') \
+            .reindex(index=dates, columns=skus).fillna(0).to_numpy(dtype=np.int64)
+
+    available, reserved = stock_matrix('available_stock'), stock_matrix('reserved_stock')
+    safety_stock = products['safety_stock'].fillna(0).to_numpy(dtype=np.int64)
+    net_demand = np.maximum(horizon_demand + safety_stock - (available - reserved), 0)
+
+    pack_size = products['pack_size'].fillna(1).clip(lower=1).to_numpy(dtype=np.int64)
+    case_size = products['case_size'].fillna(1).clip(lower=1).to_numpy(dtype=np.int64)
+    moq = products['moq'].fillna(0).to_numpy(dtype=np.int64)
+    lot = np.lcm(pack_size, case_size)
+    order_quantity = np.where(net_demand > 0, np.maximum(net_demand, moq), 0)
+    order_quantity = -(-order_quantity // lot) * lot
+
+    # Retour au format long (une ligne par date et SKU à commander)
+    date_idx, sku_idx = np.nonzero(order_quantity > 0)
+    result = pd.DataFrame({
+        'date': dates[date_idx],
+        key: skus[sku_idx],
+        'total_quantity': ordered.to_numpy()[date_idx, sku_idx],
+        'available_stock': available[date_idx, sku_idx],
+        'reserved_stock': reserved[date_idx, sku_idx],
+        'horizon_demand': horizon_demand[date_idx, sku_idx],
+        'net_demand': net_demand[date_idx, sku_idx],
+        'order_quantity': order_quantity[date_idx, sku_idx],
+    })
+    for column in ('supplier_id', 'pack_size', 'case_size', 'moq', 'safety_stock', 'lead_time_days'):
+        result[column] = products[column].to_numpy()[sku_idx]
+    names = daily_orders.groupby(key)['product_name'].first()
+    result['product_name'] = names.reindex(result[key]).to_numpy()
+    return result[['date', key] + PLANNING_COLUMNS]
+
+
+@profile_entry_point('calculate_net_demand')
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--date', nargs='+', metavar='DATE',
+                        help="Dates à traiter (YYYY-MM-DD), toutes par défaut")
+    parser.add_argument('--plan', action='store_true',
+                        help="Mode planification : demande prévue sur l'horizon de délai de chaque fournisseur")
+    add_resume_argument(parser)
+    add_shard_argument(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+
+    import pandas as pd
+    import psycopg2
+
+    config = load_config()
+    planning = args.plan or config.get('net_demand', {}).get('mode', 'daily') == 'lead_time'
+
+    print("=== Calcul du Net Demand pour toutes les dates ===\n")
+
+    # Connexion PostgreSQL pour charger products une seule fois
+    conn = psycopg2.connect(**postgres_params(config))
+    products_df = load_products(conn)
+
+    # Source du stock : fichiers CSV bruts ou table stock_levels (pré-agrégée)
+    stock_source = config.get('net_demand', {}).get('stock_source', 'csv')
+    if stock_source != 'postgresql':
+        conn.close()
+
+    print(f"✓ Produits chargés: {len(products_df)}\n")
+
+    # Jointures sur les codes int32 du dictionnaire, SKU décodé uniquement en sortie
+    ids = load_id_dictionary(config) if dictionary_enabled(config) or cube_enabled(config) else None
+    dictionary = ids if dictionary_enabled(config) else None
+    # Worker d'un shard : cube et points de reprise globaux mis à jour par la fusion (scripts/sharding.py)
+    cube = open_cube(config) if cube_enabled(config) and args.shard is None else None
+    key = 'sku'
+    if dictionary is not None:
+        key = 'sku_code'
+        products_df['sku_code'] = dictionary.encode('sku', products_df.pop('sku'))
+
+    # Chemins
+    agg_path = Path(config['paths']['processed_aggregated'])
+    stock_path = raw_input_path(config, 'raw_stock')
+    output_path_local = Path(config['paths']['processed_net_demand'])
+
+    # Shard : seuls les SKUs des fournisseurs du shard sont lus, joints et écrits
+    shard_keys = None
+    if args.shard is not None:
+        products_df = filter_products(products_df, args.shard)
+        shard_keys = products_df[key]
+        output_path_local = shard_dir(args.shard, config)
+        print(f"🔀 {shard_name(args.shard)}: {len(products_df)} produits, "
+              f"{products_df['supplier_id'].nunique()} fournisseurs\n")
+
+    output_path_local.mkdir(parents=True, exist_ok=True)
+    codec_settings = compression_settings(config)
+    intermediate = intermediate_settings(config)
+    checkpoints = load_checkpoints(config) if args.shard is None else shard_checkpoints(args.shard, config)
+    if args.shard is not None:
+        # Sorties de shard lues uniquement par la fusion : pas d'export CSV
+        intermediate['csv_export'] = False
+
+    # Format delta : état du jour reconstruit depuis la dernière baseline (un delta lu par date)
+    snapshots = StockSnapshots(config) if stock_source != 'postgresql' and delta_enabled(config) else None
+
+    def in_shard(df):
+        return df if shard_keys is None else df[df[key].isin(shard_keys)].reset_index(drop=True)
+
+    def read_orders(agg_file):
+        if dictionary is not None:
+            orders_agg = read_stage_file(agg_file, dtype={'sku': 'category'})
+            orders_agg.insert(0, 'sku_code', dictionary.encode('sku', orders_agg.pop('sku')))
+            return in_shard(orders_agg)
+        return in_shard(read_stage_file(agg_file))
+
+    def read_stocks(date_str):
+        """Stock agrégé par SKU d'une date, None si aucun snapshot"""
+        if stock_source == 'postgresql':
+            stocks_agg = pd.read_sql(STOCK_LEVELS_QUERY, conn, params={'snapshot_date': date_str})
+            if len(stocks_agg) == 0:
+                print(f"   ⚠ Pas de stock pour {date_str} dans stock_levels, ignoré")
+                return None
+            if dictionary is not None:
+                stocks_agg.insert(0, 'sku_code', dictionary.encode('sku', stocks_agg.pop('sku')))
+            return in_shard(stocks_agg)
+
+        if snapshots is not None:
+            stocks_agg = snapshots.by_sku(date_str)
+            if stocks_agg is None:
+                print(f"   ⚠ Pas de stock pour {date_str}, ignoré")
+                return None
+            if dictionary is not None:
+                stocks_agg.insert(0, 'sku_code', dictionary.encode('sku', stocks_agg.pop('sku')))
+                stocks_agg = stocks_agg.sort_values('sku_code', ignore_index=True)
+            return in_shard(stocks_agg)
+
+        stock_date_path = stock_path / date_str
+        if not stock_date_path.exists():
+            print(f"   ⚠ Pas de stock pour {date_str}, ignoré")
+            return None
+        if dictionary is not None:
+            return in_shard(read_stock_csv_encoded(stock_date_path, dictionary))
+        return read_stock_csv(stock_date_path, shard_keys)
+
+    def save(date_str, stocks_agg, to_order):
+        if checkpoints is not None:
+            checkpoints.mark_started('calculate_net_demand', date_str)
+
+        # Cube SKU × date : stocks et quantités à commander de la date
+        if cube is not None:
+            stock_codes = stocks_agg[key] if dictionary is not None else ids.encode('sku', stocks_agg['sku'])
+            order_codes = to_order[key] if dictionary is not None else ids.encode('sku', to_order['sku'])
+            cube.update(date_str, 'available_stock', stock_codes, stocks_agg['available_stock'])
+            cube.update(date_str, 'reserved_stock', stock_codes, stocks_agg['reserved_stock'])
+            cube.update(date_str, 'order_quantity', order_codes, to_order['order_quantity'])
+
+        if dictionary is not None:
+            to_order.insert(0, 'sku', dictionary.decode('sku', to_order.pop('sku_code')))
+
+        print(f"   SKUs à commander: {len(to_order)}")
+        print(f"   Quantité totale: {to_order['order_quantity'].sum()}")
+
+        # 6. Sauvegarder localement
+        output_files = write_stage_file(to_order, output_path_local / f"net_demand_{date_str}.csv",
+                                        intermediate, codec_settings)
+        if args.shard is not None and cube_enabled(config):
+            # Stocks du shard : la fusion met à jour les mêmes mesures du cube que le mode non partitionné
+            shard_stocks = stocks_agg if dictionary is None else \
+                stocks_agg.assign(sku=dictionary.decode('sku', stocks_agg[key]))
+            output_files += write_stage_file(shard_stocks[['sku', 'available_stock', 'reserved_stock']],
+                                             output_path_local / f"stock_{date_str}.csv", intermediate, codec_settings)
+        for output_file_local in output_files:
+            print(f"   ✓ Sauvegardé: {output_file_local}")
+        if checkpoints is not None:
+            checkpoints.mark_done('calculate_net_demand', date_str, output_files)
+
+        print()
+
+    # Traiter chaque date
+    all_agg_files = stage_files(agg_path, 'aggregated_orders')
+    agg_files = all_agg_files
+    if args.date:
+        agg_files = [f for f in agg_files if file_date(f) in args.date]
+    # Reprise : l'historique des sommes glissantes reste lu sur toutes les dates (all_agg_files)
+    pending = set(pending_dates(checkpoints, 'calculate_net_demand', [file_date(f) for f in agg_files], args.resume))
+    agg_files = [f for f in agg_files if file_date(f) in pending]
+
+    print(f"Nombre de dates à traiter: {len(agg_files)}\n")
+
+    if planning and agg_files:
+        # Historique nécessaire aux sommes glissantes : toutes les dates jusqu'à la dernière demandée
+        last_date = file_date(agg_files[-1])
+        history_files = [f for f in all_agg_files if file_date(f) <= last_date]
+        daily_orders = pd.concat([read_orders(f).assign(date=file_date(f)) for f in history_files],
+                                 ignore_index=True)
+
+        stocks_by_date = {}
+        for agg_file in agg_files:
+            date_str = file_date(agg_file)
+            stocks_agg = read_stocks(date_str)
+            if stocks_agg is not None:
+                stocks_by_date[date_str] = stocks_agg
+        daily_stocks = pd.concat([df.assign(date=d) for d, df in stocks_by_date.items()], ignore_index=True) \
+            if stocks_by_date else pd.DataFrame(columns=['date', key, 'available_stock', 'reserved_stock'])
+
+        planned = compute_lead_time_demand(daily_orders, daily_stocks, products_df, key,
+                                           config.get('net_demand', {}).get('forecast_window_days', 7))
+        print(f"📐 Planification sur l'horizon fournisseur "
+              f"({products_df['lead_time_days'].min()}-{products_df['lead_time_days'].max()} jours)\n")
+
+        for date_str, stocks_agg in stocks_by_date.items():
+            print(f"📅 Traitement du {date_str}...")
+            to_order = planned[planned['date'] == date_str].drop(columns='date').reset_index(drop=True)
+            save(date_str, stocks_agg, to_order)
+    else:
+        for agg_file in agg_files:
+            date_str = file_date(agg_file)
+            print(f"📅 Traitement du {date_str}...")
+
+            # 1. Lire agrégation
+            orders_agg = read_orders(agg_file)
+
+            # 2. Lire stocks correspondants
+            stocks_agg = read_stocks(date_str)
+            if stocks_agg is None:
+                continue
+
+            save(date_str, stocks_agg, compute_net_demand(orders_agg, stocks_agg, products_df, key))
+
+    if stock_source == 'postgresql':
+        conn.close()
+
+    # Workers concurrents : le dictionnaire n'est enregistré que hors shard (codes décodés en sortie)
+    if ids is not None and ids.added and args.shard is None:
+        ids.save()
+
+    print(f"\n✅ Net demand calculé pour {len(agg_files)} dates")
+    print(f"📁 Fichiers locaux: {output_path_local}/")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
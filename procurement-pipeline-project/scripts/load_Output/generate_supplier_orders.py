@@ -3,93 +3,139 @@ Génération des commandes fournisseurs pour toutes les dates
 Lit tous les fichiers net_demand et génère les fichiers JSON par fournisseur
 """
 
-import pandas as pd
-import json
+import argparse
+import shutil
+import sys
 from pathlib import Path
 
-print("=== Génération des Commandes Fournisseurs pour toutes les dates ===\n")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
-# Chemins
-net_demand_path = Path('data/processed/net_demand')
-output_base = Path('data/output/supplier_orders')
+from file_codecs import compression_settings, file_date, write_json
+from pipeline_config import load_config
+from profiling import add_profile_arguments, profile_entry_point
+from records import SupplierOrder, SupplierOrderLine
+from run_checkpoints import add_resume_argument, load_checkpoints, pending_dates
+from sharding import add_shard_argument, shard_checkpoints, shard_dir, shard_name
+from stage_files import read_stage_file, stage_files
 
-# Lire tous les fichiers net_demand
-net_demand_files = sorted(net_demand_path.glob('net_demand_*.csv'))
 
-if len(net_demand_files) == 0:
-    print("❌ Aucun fichier net_demand trouvé")
-    exit(1)
+def build_order(supplier_id, group, date_str):
+    """Construit la commande d'un fournisseur à partir de ses lignes net_demand (colonnes lues en bloc)"""
+    lines = [SupplierOrderLine(*values) for values in zip(
+        group['sku'].tolist(),
+        group['product_name'].tolist(),
+        group['net_demand'].astype('int64').tolist(),
+        group['order_quantity'].astype('int64').tolist(),
+    )]
+    return SupplierOrder(int(supplier_id), date_str, lines)
 
-print(f"Nombre de dates à traiter: {len(net_demand_files)}\n")
 
-total_orders = 0
-total_suppliers = set()
-total_skus = 0
-total_quantity = 0
+@profile_entry_point('generate_supplier_orders')
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--date', nargs='+', metavar='DATE',
+                        help="Dates à traiter (YYYY-MM-DD), toutes par défaut")
+    add_resume_argument(parser)
+    add_shard_argument(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
 
-# Traiter chaque date
-for demand_file in net_demand_files:
-    date_str = demand_file.stem.split('_')[-1]
-    print(f"📅 Traitement du {date_str}...")
-    
-    # Lire net demand
-    demand_df = pd.read_csv(demand_file)
-    
-    if len(demand_df) == 0:
-        print(f"   ⚠ Aucune commande pour {date_str}")
+    config = load_config()
+
+    print("=== Génération des Commandes Fournisseurs pour toutes les dates ===\n")
+
+    # Chemins
+    net_demand_path = Path(config['paths']['processed_net_demand'])
+    output_base = Path(config['paths']['output_supplier_orders'])
+    if args.shard is not None:
+        # Net demand et commandes du shard dans son répertoire : publiées par la fusion (scripts/sharding.py)
+        net_demand_path = shard_dir(args.shard, config)
+        output_base = net_demand_path / 'supplier_orders'
+        print(f"🔀 {shard_name(args.shard)}\n")
+
+    # Lire tous les fichiers net_demand (Arrow mappé en mémoire ou CSV)
+    net_demand_files = stage_files(net_demand_path, 'net_demand')
+    if args.date:
+        net_demand_files = [f for f in net_demand_files if file_date(f) in args.date]
+    codec_settings = compression_settings(config)
+    checkpoints = load_checkpoints(config) if args.shard is None else shard_checkpoints(args.shard, config)
+
+    if len(net_demand_files) == 0:
+        print("❌ Aucun fichier net_demand trouvé")
+        return 1
+
+    pending = set(pending_dates(checkpoints, 'generate_supplier_orders',
+                                [file_date(f) for f in net_demand_files], args.resume))
+    net_demand_files = [f for f in net_demand_files if file_date(f) in pending]
+
+    print(f"Nombre de dates à traiter: {len(net_demand_files)}\n")
+
+    total_orders = 0
+    total_suppliers = set()
+    total_skus = 0
+    total_quantity = 0
+
+    # Traiter chaque date
+    for demand_file in net_demand_files:
+        date_str = file_date(demand_file)
+        print(f"📅 Traitement du {date_str}...")
+        if checkpoints is not None:
+            checkpoints.mark_started('generate_supplier_orders', date_str)
+
+        # Lire net demand
+        demand_df = read_stage_file(demand_file)
+
+        if len(demand_df) == 0:
+            print(f"   ⚠ Aucune commande pour {date_str}")
+            print()
+            if checkpoints is not None:
+                checkpoints.mark_done('generate_supplier_orders', date_str)
+            continue
+
+        # Créer répertoire de sortie (shard : vidé, la fusion publie tout le répertoire)
+        output_dir = output_base / date_str
+        if args.shard is not None:
+            shutil.rmtree(output_dir, ignore_errors=True)
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        # Grouper par fournisseur
+        suppliers = demand_df.groupby('supplier_id')
+
+        date_skus = len(demand_df)
+        date_quantity = demand_df['order_quantity'].sum()
+
+        order_files = []
+        for supplier_id, group in suppliers:
+            total_suppliers.add(supplier_id)
+
+            order = build_order(supplier_id, group, date_str)
+
+            order_files.append(write_json(order.to_dict(), output_dir / f"supplier_{int(supplier_id):03d}_order_{date_str}.json",
+                                          codec_settings))
+
+            total_orders += 1
+
+        if checkpoints is not None:
+            checkpoints.mark_done('generate_supplier_orders', date_str, order_files)
+
+        total_skus += date_skus
+        total_quantity += date_quantity
+
+        print(f"   ✓ {len(suppliers)} fournisseurs, {date_skus} SKUs, {int(date_quantity)} unités")
         print()
-        continue
-    
-    # Créer répertoire de sortie
-    output_dir = output_base / date_str
-    output_dir.mkdir(parents=True, exist_ok=True)
-    
-    # Grouper par fournisseur
-    suppliers = demand_df.groupby('supplier_id')
-    
-    date_skus = len(demand_df)
-    date_quantity = demand_df['order_quantity'].sum()
-    
-    for supplier_id, group in suppliers:
-        total_suppliers.add(supplier_id)
-        
-        items = []
-        for _, row in group.iterrows():
-            items.append({
-                'sku': row['sku'],
-                'product_name': row['product_name'],
-                'net_demand': int(row['net_demand']),
-                'order_quantity': int(row['order_quantity'])
-            })
-        
-        order = {
-            'supplier_id': int(supplier_id),
-            'order_date': date_str,
-            'order_reference': f"ORD-{date_str}-SUP{int(supplier_id):03d}",
-            'total_items': len(items),
-            'total_quantity': sum(i['order_quantity'] for i in items),
-            'items': items
-        }
-        
-        filename = output_dir / f"supplier_{int(supplier_id):03d}_order_{date_str}.json"
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(order, f, indent=2, ensure_ascii=False)
-        
-        total_orders += 1
-    
-    total_skus += date_skus
-    total_quantity += date_quantity
-    
-    print(f"   ✓ {len(suppliers)} fournisseurs, {date_skus} SKUs, {int(date_quantity)} unités")
-    print()
-
-print("\n" + "="*60)
-print("📊 RÉSUMÉ GLOBAL")
-print("="*60)
-print(f"✅ Dates traitées: {len(net_demand_files)}")
-print(f"✅ Fournisseurs distincts: {len(total_suppliers)}")
-print(f"✅ Total fichiers générés: {total_orders}")
-print(f"✅ Total SKUs commandés: {total_skus}")
-print(f"✅ Total unités commandées: {int(total_quantity)}")
-print(f"📁 Répertoire de sortie: {output_base}/")
-print("="*60)
\ No newline at end of file
+
+    print("\n" + "="*60)
+    print("📊 RÉSUMÉ GLOBAL")
+    print("="*60)
+    print(f"✅ Dates traitées: {len(net_demand_files)}")
+    print(f"✅ Fournisseurs distincts: {len(total_suppliers)}")
+    print(f"✅ Total fichiers générés: {total_orders}")
+    print(f"✅ Total SKUs commandés: {total_skus}")
+    print(f"✅ Total unités commandées: {int(total_quantity)}")
+    print(f"📁 Répertoire de sortie: {output_base}/")
+    print("="*60)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""
+Chargement des résultats dans PostgreSQL (tables net_demand et supplier_order_lines)
+Une partition par order_date, construite à part par COPY en masse puis échangée avec
+la partition existante : la date est remplacée en bloc, les lecteurs voient l'ancienne
+ou la nouvelle version
+"""
+
+import argparse
+import io
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from file_codecs import data_files, file_date, read_json
+from pipeline_config import load_config, postgres_params
+from profiling import add_profile_arguments, profile_entry_point
+from run_checkpoints import add_resume_argument, load_checkpoints, pending_dates
+from stage_files import read_stage_file, stage_files
+
+# Colonnes chargées (hors order_date) et clé primaire de chaque table
+TABLES = {
+    'net_demand': {
+        'columns': ['sku', 'product_name', 'supplier_id', 'total_quantity', 'horizon_demand',
+                    'available_stock', 'reserved_stock', 'safety_stock', 'pack_size', 'case_size',
+                    'moq', 'lead_time_days', 'net_demand', 'order_quantity'],
+        'primary_key': ['order_date', 'sku'],
+    },
+    'supplier_order_lines': {
+        'columns': ['supplier_id', 'order_reference', 'sku', 'product_name', 'net_demand', 'order_quantity'],
+        'primary_key': ['order_date', 'supplier_id', 'sku'],
+    },
+}
+
+# Index des tables parentes, recréés sur la partition chargée avant l'échange
+INDEXES = {'supplier_date': ['supplier_id', 'order_date'], 'sku_date': ['sku', 'order_date']}
+
+TEXT_COLUMNS = {'sku', 'product_name', 'order_reference'}
+
+
+def partition_name(table, date_str):
+    """Nom de la partition journalière d'une table de résultats"""
+    return f"{table}_{date_str.replace('-', '')}"
+
+
+def copy_rows(cur, table, df):
+    """COPY d'un DataFrame dans une table (colonnes de df, NULL pour les valeurs manquantes)"""
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    cur.copy_expert(f"COPY {table} ({', '.join(df.columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def swap_partition(conn, table, date_str, rows):
+    """Charge rows dans une nouvelle partition puis la substitue à celle de la date
+
+    La table de chargement reçoit la clé primaire, les index et une contrainte CHECK sur
+    la plage de dates avant l'ATTACH : PostgreSQL adopte ces index et ne reparcourt pas
+    les lignes. L'échange (DROP, RENAME, ATTACH) est validé en une seule transaction.
+    """
+    day = date.fromisoformat(date_str)
+    next_day = day + timedelta(days=1)
+    partition = partition_name(table, date_str)
+    staging = f"{partition}_load"
+
+    with conn.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {staging}")
+        cur.execute(f"CREATE TABLE {staging} (LIKE {table} INCLUDING DEFAULTS)")
+        copy_rows(cur, staging, rows)
+        cur.execute(f"ALTER TABLE {staging} ADD CONSTRAINT {staging}_pkey "
+                    f"PRIMARY KEY ({', '.join(TABLES[table]['primary_key'])})")
+        for suffix, columns in INDEXES.items():
+            cur.execute(f"CREATE INDEX {staging}_{suffix} ON {staging} ({', '.join(columns)})")
+        cur.execute(f"ALTER TABLE {staging} ADD CONSTRAINT {staging}_bounds "
+                    f"CHECK (order_date >= '{day}' AND order_date < '{next_day}')")
+        cur.execute(f"ANALYZE {staging}")
+
+        # Échange : l'ancienne partition disparaît au COMMIT, pas de fenêtre sans données
+        cur.execute(f"DROP TABLE IF EXISTS {partition}")
+        cur.execute(f"ALTER TABLE {staging} RENAME TO {partition}")
+        cur.execute(f"ALTER TABLE {table} ATTACH PARTITION {partition} "
+                    f"FOR VALUES FROM ('{day}') TO ('{next_day}')")
+        cur.execute(f"ALTER TABLE {partition} DROP CONSTRAINT {staging}_bounds")
+        for suffix in ['pkey', *INDEXES]:
+            cur.execute(f"ALTER INDEX {staging}_{suffix} RENAME TO {partition}_{suffix}")
+    conn.commit()
+    return len(rows)
+
+
+def prepare_rows(df, table, date_str):
+    """Colonnes de la table présentes dans df, entiers nullables (NULL plutôt que NaN / 12.0)"""
+    import pandas as pd
+
+    columns = [c for c in TABLES[table]['columns'] if c in df.columns]
+    rows = df[columns].copy()
+    for column in columns:
+        if column not in TEXT_COLUMNS:
+            rows[column] = pd.to_numeric(rows[column]).round().astype('Int64')
+    rows.insert(0, 'order_date', date_str)
+    return rows
+
+
+def read_supplier_order_lines(order_files):
+    """Articles des commandes fournisseurs JSON d'une date, une ligne par (fournisseur, SKU)"""
+    import pandas as pd
+
+    lines = []
+    for order_file in order_files:
+        order = read_json(order_file)
+        for item in order['items']:
+            lines.append({'supplier_id': order['supplier_id'],
+                          'order_reference': order['order_reference'], **item})
+    return pd.DataFrame(lines, columns=TABLES['supplier_order_lines']['columns'])
+
+
+@profile_entry_point('load_results_to_postgres')
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--date', nargs='+', metavar='DATE',
+                        help="Dates à charger (YYYY-MM-DD), toutes par défaut")
+    parser.add_argument('--table', nargs='+', choices=list(TABLES), default=list(TABLES),
+                        help="Tables à charger (toutes par défaut)")
+    add_resume_argument(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+
+    import psycopg2
+
+    config = load_config()
+
+    print("=== Chargement des résultats dans PostgreSQL ===\n")
+
+    net_demand_files = {file_date(f): f for f in stage_files(config['paths']['processed_net_demand'], 'net_demand')}
+    orders_path = Path(config['paths']['output_supplier_orders'])
+    order_dirs = {d.name: d for d in orders_path.iterdir() if d.is_dir()} if orders_path.exists() else {}
+
+    dates = sorted(set(net_demand_files) | set(order_dirs))
+    if args.date:
+        dates = [d for d in dates if d in args.date]
+    checkpoints = load_checkpoints(config)
+    dates = pending_dates(checkpoints, 'load_results_to_postgres', dates, args.resume)
+
+    print(f"Nombre de dates à charger: {len(dates)}\n")
+
+    conn = psycopg2.connect(**postgres_params(config))
+    for date_str in dates:
+        sources = []
+        if 'net_demand' in args.table and date_str in net_demand_files:
+            demand_df = read_stage_file(net_demand_files[date_str])
+            loaded = swap_partition(conn, 'net_demand', date_str, prepare_rows(demand_df, 'net_demand', date_str))
+            print(f"   ✓ {date_str}: {loaded} lignes dans {partition_name('net_demand', date_str)}")
+            sources.append(net_demand_files[date_str])
+
+        if 'supplier_order_lines' in args.table and date_str in order_dirs:
+            order_files = data_files(order_dirs[date_str], 'supplier_*_order_*.json')
+            lines_df = read_supplier_order_lines(order_files)
+            loaded = swap_partition(conn, 'supplier_order_lines', date_str,
+                                    prepare_rows(lines_df, 'supplier_order_lines', date_str))
+            print(f"   ✓ {date_str}: {loaded} lignes dans {partition_name('supplier_order_lines', date_str)}")
+            sources.extend(order_files)
+
+        # Point de reprise sur les fichiers chargés : un fichier réécrit depuis invalide la date
+        if checkpoints is not None and set(args.table) == set(TABLES):
+            checkpoints.mark_done('load_results_to_postgres', date_str, sources)
+    conn.close()
+
+    print(f"\n✅ Résultats chargés pour {len(dates)} dates")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""
+Chargement des snapshots de stock dans PostgreSQL (table stock_levels)
+Une partition par snapshot_date, alimentée par COPY en masse
+Migration d'une base existante (stock_levels non partitionnée) :
+database/migrations/001_partition_stock_levels.sql
+"""
+
+import argparse
+import io
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from file_codecs import data_files
+from pipeline_config import load_config, postgres_params, raw_input_path
+from profiling import add_profile_arguments, profile_entry_point
+from stock_snapshots import StockSnapshots, delta_enabled
+
+
+def partition_name(date_str):
+    """Nom de la partition journalière de stock_levels"""
+    return f"stock_levels_{date_str.replace('-', '')}"
+
+
+def ensure_partition(cur, date_str):
+    """Crée la partition du jour si elle n'existe pas encore"""
+    day = date.fromisoformat(date_str)
+    cur.execute(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(date_str)} "
+        f"PARTITION OF stock_levels "
+        f"FOR VALUES FROM ('{day}') TO ('{day + timedelta(days=1)}')"
+    )
+
+
+def load_snapshot(conn, date_str, stocks_df, products_df, warehouses_df):
+    """Remplace le contenu de la partition du jour par le snapshot donné"""
+    rows = (
+        stocks_df
+        .merge(warehouses_df, on='warehouse_code', how='inner')
+        .merge(products_df, on='sku', how='inner')
+    )
+    rows = rows[['warehouse_id', 'product_id', 'available_quantity',
+                 'reserved_quantity']].assign(snapshot_date=date_str)
+
+    buffer = io.StringIO()
+    rows.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+
+    table = partition_name(date_str)
+    with conn.cursor() as cur:
+        ensure_partition(cur, date_str)
+        # Idempotent : on vide la partition avant de la recharger. TRUNCATE dans la même
+        # transaction autorise COPY FREEZE : lignes déjà visibles pour l'index-only scan
+        # sans VACUUM ; ANALYZE (une fois par partition) met à jour les statistiques
+        cur.execute(f"TRUNCATE {table}")
+        cur.copy_expert(
+            f"COPY {table} (warehouse_id, product_id, available_quantity, "
+            f"reserved_quantity, snapshot_date) FROM STDIN WITH (FORMAT csv, FREEZE)",
+            buffer
+        )
+        cur.execute(f"ANALYZE {table}")
+    conn.commit()
+
+    return len(rows)
+
+
+@profile_entry_point('load_stock_levels')
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--date', nargs='+', metavar='DATE',
+                        help="Dates à charger (YYYY-MM-DD), toutes par défaut")
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+
+    import pandas as pd
+    import psycopg2
+
+    config = load_config()
+
+    print("=== Chargement des stocks dans PostgreSQL (stock_levels) ===\n")
+
+    params = postgres_params(config)
+    conn = psycopg2.connect(**params)
+    products_df = pd.read_sql('SELECT product_id, sku FROM products', conn)
+    warehouses_df = pd.read_sql('SELECT warehouse_id, warehouse_code FROM warehouses', conn)
+    conn.close()
+
+    stock_path = raw_input_path(config, 'raw_stock')
+    # Format delta : chaque partition reçoit l'état complet du jour (baseline + deltas)
+    snapshots = StockSnapshots(config) if delta_enabled(config) else None
+    dates = snapshots.dates if snapshots is not None else sorted(d.name for d in stock_path.iterdir() if d.is_dir())
+    if args.date:
+        dates = [d for d in dates if d in args.date]
+
+    print(f"Nombre de dates à charger: {len(dates)}\n")
+
+    for date_str in dates:
+        if snapshots is not None:
+            stocks_df = snapshots.state(date_str)
+        else:
+            csv_files = data_files(stock_path / date_str)
+            stocks_df = pd.concat(
+                (pd.read_csv(f, usecols=['warehouse_code', 'sku', 'available_quantity',
+                                         'reserved_quantity'])
+                 for f in csv_files),
+                ignore_index=True
+            ) if csv_files else None
+        if stocks_df is None:
+            print(f"   ⚠ Aucun snapshot pour {date_str}, ignoré")
+            continue
+
+        # Une connexion par date : pas de session ouverte pendant la lecture des snapshots
+        conn = psycopg2.connect(**params)
+        try:
+            loaded = load_snapshot(conn, date_str, stocks_df, products_df, warehouses_df)
+        finally:
+            conn.close()
+        print(f"   ✓ {date_str}: {loaded} lignes chargées dans {partition_name(date_str)}")
+
+    print(f"\n✅ Stocks chargés pour {len(dates)} dates")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
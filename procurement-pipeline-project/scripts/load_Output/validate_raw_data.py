@@ -0,0 +1,367 @@
+"""
+Validation des commandes et stocks bruts avant l'agrégation
+Chaque jour est lu une seule fois (pyarrow, valeurs en texte) et contrôlé contre les master data
+(products, warehouses) par masques numpy ; les lignes invalides sont copiées avec leurs codes
+motif dans un fichier de quarantaine. Les fichiers bruts ne sont jamais modifiés : avec l'action
+quarantine, une copie validée du jour (CSV et JSON sans les lignes invalides) est publiée sous
+validated_path/<jeu>/<date>/ et lue par les étapes suivantes ; report laisse les étapes sur data/raw
+"""
+
+import argparse
+import csv
+import json
+import os
+import shutil
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from file_codecs import (atomic_output, base_name, codec_from_path, compression_settings, data_files,
+                         open_text, publish_directory, read_json, write_csv, write_json)
+from pipeline_config import load_config, postgres_params
+from profiling import add_profile_arguments, profile_entry_point
+from run_checkpoints import add_resume_argument, load_checkpoints, pending_dates
+from stock_snapshots import DELETED, delta_enabled, snapshot_settings
+
+# quarantine : copie validée sans les lignes invalides ; report : étapes sur les fichiers bruts
+ACTIONS = ('quarantine', 'report')
+
+
+def validation_settings(config=None):
+    settings = dict((config or load_config()).get('validation', {}))
+    settings.setdefault('enabled', True)
+    action = settings.setdefault('action', 'report')
+    if action not in ACTIONS:
+        raise ValueError(f"Action de validation inconnue: {action} (attendu: {', '.join(ACTIONS)})")
+    settings.setdefault('quarantine_path', 'data/quarantine')
+    settings.setdefault('validated_path', 'data/validated')
+    return settings
+
+
+def read_file(csv_file):
+    """Table pyarrow d'un fichier, toutes les valeurs lues comme texte (réécriture à l'identique)
+
+    Codec déduit de l'extension ; l'en-tête est lu d'abord pour typer chaque colonne en texte.
+    """
+    import pyarrow as pa
+    import pyarrow.csv as pv
+
+    with open_text(csv_file) as f:
+        columns = next(csv.reader(f))
+    convert = pv.ConvertOptions(column_types={c: pa.string() for c in columns})
+    return pv.read_csv(csv_file, convert_options=convert)
+
+
+def non_negative_integer(values):
+    """Vrai pour les entiers positifs ou nuls écrits en texte (vide, décimal ou non numérique exclus)
+
+    Conversion directe en int64 (cas courant : colonne entièrement numérique), expression
+    régulière seulement si elle échoue. Retourne aussi les valeurs (0 pour les lignes invalides).
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    try:
+        numbers = pc.cast(values, pa.int64()).to_numpy()
+        return numbers >= 0, numbers
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        valid = pc.match_substring_regex(values, r'^[0-9]{1,15}(\.0*)?$')
+    numbers = pc.cast(pc.if_else(valid, values, '0'), pa.float64())
+    return valid.to_numpy(), numbers.to_numpy()
+
+
+def is_known(values, known):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    return pc.is_in(values, value_set=pa.array(known.astype(str), pa.string())).to_numpy()
+
+
+def differs(values, expected):
+    import pyarrow.compute as pc
+
+    return pc.not_equal(values, expected).to_numpy()
+
+
+def dense_codes(values):
+    """Codes entiers 0..n-1 (ordre de première apparition) d'une colonne texte, et n"""
+    encoded = values.combine_chunks().dictionary_encode()
+    return encoded.indices.to_numpy(zero_copy_only=False).astype('int64'), len(encoded.dictionary)
+
+
+def duplicated(codes, other_codes, other_count):
+    """Vrai pour les répétitions d'une paire de codes (première occurrence exclue)"""
+    import pandas as pd
+
+    return pd.Series(codes * other_count + other_codes).duplicated().to_numpy()
+
+
+def first_file(codes, file_index):
+    """Fichier de la première occurrence du code de chaque ligne
+
+    Les codes étant numérotés par ordre de première apparition et les fichiers lus dans
+    l'ordre, un code apparaît pour la première fois dans le premier fichier dont le plus
+    grand code vu jusque-là l'atteint.
+    """
+    import numpy as np
+    import pandas as pd
+
+    files = int(file_index[-1]) + 1 if len(file_index) else 0
+    bounds = pd.Series(codes).groupby(file_index).max().reindex(range(files), fill_value=-1)
+    return np.searchsorted(np.maximum.accumulate(bounds.to_numpy()), codes, side='left')
+
+
+def order_checks(orders, file_index, date_str, known_skus):
+    """Masques des lignes invalides d'un jour de commandes, par code motif"""
+    valid_quantity, quantity = non_negative_integer(orders['quantity'])
+    order_codes, _ = dense_codes(orders['order_id'])
+    sku_codes, sku_count = dense_codes(orders['sku'])
+    return {
+        'INVALID_QUANTITY': ~valid_quantity | (quantity == 0),
+        'UNKNOWN_SKU': ~is_known(orders['sku'], known_skus),
+        'DATE_MISMATCH': differs(orders['order_date'], date_str),
+        # Un order_id appartient à un seul fichier magasin : les autres occurrences sont des doublons
+        'DUPLICATE_ORDER_ID': file_index != first_file(order_codes, file_index),
+        'DUPLICATE_LINE': duplicated(order_codes, sku_codes, sku_count),
+    }
+
+
+def stock_checks(stock, file_index, date_str, known_skus, known_warehouses):
+    """Masques des lignes invalides d'un jour de snapshots de stock, par code motif
+
+    Deltas : une tombstone (deleted = 1) peut viser un produit ou entrepôt retiré des master data.
+    """
+    import numpy as np
+
+    valid_available, available = non_negative_integer(stock['available_quantity'])
+    valid_reserved, reserved = non_negative_integer(stock['reserved_quantity'])
+    warehouse_codes, _ = dense_codes(stock['warehouse_code'])
+    sku_codes, sku_count = dense_codes(stock['sku'])
+    tombstone = ~differs(stock[DELETED], '1') if DELETED in stock.column_names else np.zeros(stock.num_rows, bool)
+    return {
+        'NEGATIVE_STOCK': ~valid_available | ~valid_reserved,
+        'RESERVED_EXCEEDS_AVAILABLE': reserved > available,
+        'UNKNOWN_SKU': ~is_known(stock['sku'], known_skus) & ~tombstone,
+        'UNKNOWN_WAREHOUSE': ~is_known(stock['warehouse_code'], known_warehouses) & ~tombstone,
+        'DATE_MISMATCH': differs(stock['snapshot_date'], date_str),
+        'DUPLICATE_LINE': duplicated(warehouse_codes, sku_codes, sku_count),
+    }
+
+
+def reason_codes(checks, invalid):
+    """Codes motif des lignes invalides, séparés par '|' (construits sur les seules lignes invalides)"""
+    import numpy as np
+
+    reasons = np.full(int(invalid.sum()), '', dtype=object)
+    for code, mask in checks.items():
+        hit = mask[invalid]
+        reasons[hit] = reasons[hit] + np.where(reasons[hit] == '', code, '|' + code)
+    return reasons
+
+
+def without_rows(documents, invalid, source):
+    """Documents JSON sans les lignes invalides du CSV du même nom (masque par position)
+
+    Commandes : un item par ligne CSV, dans l'ordre, une commande sans item restant est
+    retirée ; stocks : un enregistrement par ligne.
+    """
+    count = sum(len(document['items']) if 'items' in document else 1 for document in documents)
+    if count != len(invalid):
+        raise ValueError(f"{source}: {count} lignes JSON pour {len(invalid)} lignes CSV")
+    rows = iter(invalid.tolist())
+    kept = []
+    for document in documents:
+        if 'items' in document:
+            items = [item for item in document['items'] if not next(rows)]
+            if items:
+                kept.append(dict(document, items=items))
+        elif not next(rows):
+            kept.append(document)
+    return kept
+
+
+def link_or_copy(source, target):
+    """Lien physique (fichiers bruts jamais réécrits en place), copie si le lien est impossible"""
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+def publish_validated(day_folder, target, cleaned, codec_settings):
+    """Publie la copie validée d'un dossier <date>, retourne ses fichiers
+
+    cleaned : fichier CSV -> (table pyarrow, masque des lignes invalides) ; ces fichiers et leur
+    JSON sont réécrits sans les lignes invalides (même codec), les autres fichiers sont liés.
+    La copie est construite à côté puis substituée d'un bloc à la précédente.
+    """
+    import pyarrow as pa
+
+    staging = target.with_name(f".{target.name}.staging")
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+
+    rewritten = set()
+    for csv_file, (rows, invalid) in cleaned.items():
+        write_csv(rows.filter(pa.array(~invalid)).to_pandas(), staging / f"{base_name(csv_file)}.csv",
+                  dict(codec_settings, codec=codec_from_path(csv_file)))
+        rewritten.add(csv_file.name)
+        for json_file in data_files(day_folder, f"{base_name(csv_file)}.json"):
+            write_json(without_rows(read_json(json_file), invalid, json_file), staging / f"{base_name(json_file)}.json",
+                       dict(codec_settings, codec=codec_from_path(json_file)))
+            rewritten.add(json_file.name)
+
+    for source in sorted(day_folder.iterdir()):
+        if source.is_file() and not source.name.startswith('.') and source.name not in rewritten:
+            link_or_copy(source, staging / source.name)
+
+    publish_directory(staging, target)
+    return sorted(f for f in target.iterdir() if f.is_file())
+
+
+def validate_day(dataset, day_folder, checks_for, settings, codec_settings):
+    """Valide un dossier <date> ; retourne les compteurs du jour et les fichiers écrits
+
+    Seules les lignes invalides sont converties en DataFrame (quarantaine) ; en action
+    quarantine, les fichiers qui en contiennent sont réécrits sans elles dans la copie validée.
+    """
+    import numpy as np
+    import pandas as pd
+    import pyarrow as pa
+
+    csv_files = data_files(day_folder)
+    if not csv_files:
+        return None, []
+    tables = [read_file(f) for f in csv_files]
+    row_counts = [t.num_rows for t in tables]
+    table = pa.concat_tables(tables)
+    file_index = np.repeat(np.arange(len(csv_files)), row_counts)
+    checks = checks_for(table, file_index, day_folder.name)
+
+    invalid = np.logical_or.reduce(list(checks.values()))
+    counts = {
+        'rows': table.num_rows,
+        'invalid_rows': int(invalid.sum()),
+        'reasons': {code: int(mask.sum()) for code, mask in checks.items() if mask.any()},
+    }
+
+    quarantine_dir = Path(settings['quarantine_path']) / dataset
+    quarantine_name = f"quarantine_{dataset}_{day_folder.name}.csv"
+    # Quarantaine d'une validation précédente du même jour
+    for stale in data_files(quarantine_dir, quarantine_name):
+        stale.unlink()
+
+    outputs = []
+    cleaned = {}
+    if counts['invalid_rows']:
+        offsets = np.concatenate([[0], np.cumsum(row_counts)])
+        quarantined = []
+        for index in np.unique(file_index[invalid]):
+            csv_file = csv_files[index]
+            file_invalid = invalid[offsets[index]:offsets[index + 1]]
+            cleaned[csv_file] = (tables[index], file_invalid)
+            rows = tables[index].filter(pa.array(file_invalid)).to_pandas()
+            rows.insert(0, 'source_file', csv_file.name)
+            quarantined.append(rows)
+        quarantined = pd.concat(quarantined, ignore_index=True)
+        quarantined['reason'] = reason_codes(checks, invalid)
+        quarantine_dir.mkdir(parents=True, exist_ok=True)
+        counts['quarantine_file'] = str(write_csv(quarantined, quarantine_dir / quarantine_name, codec_settings))
+        outputs.append(counts['quarantine_file'])
+
+    if settings['action'] == 'quarantine':
+        target = Path(settings['validated_path']) / dataset / day_folder.name
+        outputs.extend(publish_validated(day_folder, target, cleaned, codec_settings))
+    return counts, outputs
+
+
+def write_summary(date_str, summary, settings):
+    """Compteurs du jour (lignes, lignes invalides, motifs) par jeu de données"""
+    path = Path(settings['quarantine_path']) / f"validation_{date_str}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with atomic_output(path) as tmp_path:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'date': date_str, 'action': settings['action'], 'datasets': summary}, f, indent=2)
+    return path
+
+
+@profile_entry_point('validate_raw_data')
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--date', nargs='+', metavar='DATE',
+                        help="Dates à valider (YYYY-MM-DD), toutes par défaut")
+    parser.add_argument('--action', choices=ACTIONS, help="Surcharge validation.action")
+    add_resume_argument(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+
+    import pandas as pd
+    import psycopg2
+
+    config = load_config()
+    settings = validation_settings(config)
+    if args.action:
+        settings['action'] = args.action
+    codec_settings = compression_settings(config)
+    checkpoints = load_checkpoints(config)
+
+    print("=== Validation des commandes et stocks bruts ===\n")
+
+    conn = psycopg2.connect(**postgres_params(config))
+    known_skus = pd.read_sql('SELECT sku FROM products', conn)['sku']
+    known_warehouses = pd.read_sql('SELECT warehouse_code FROM warehouses', conn)['warehouse_code']
+    conn.close()
+
+    datasets = {
+        'orders': (Path(config['paths']['raw_orders']),
+                   lambda orders, file_index, date_str: order_checks(orders, file_index, date_str, known_skus)),
+        'stock': (Path(config['paths']['raw_stock']),
+                  lambda stock, file_index, date_str: stock_checks(stock, file_index, date_str, known_skus,
+                                                                   known_warehouses)),
+    }
+    if delta_enabled(config):
+        # Deltas de stock : mêmes contrôles, une ligne écartée laisse l'état de la veille
+        datasets['stock_deltas'] = (Path(snapshot_settings(config)['delta_path']), datasets['stock'][1])
+    dates = sorted({d.name for root, _ in datasets.values() if root.exists() for d in root.iterdir() if d.is_dir()})
+    if args.date:
+        dates = [d for d in dates if d in args.date]
+    dates = pending_dates(checkpoints, 'validate_raw_data', dates, args.resume)
+
+    print(f"Nombre de dates à valider: {len(dates)} (action: {settings['action']})\n")
+
+    total_rows = total_invalid = 0
+    for date_str in dates:
+        if checkpoints is not None:
+            checkpoints.mark_started('validate_raw_data', date_str)
+        summary = {}
+        outputs = []
+        for dataset, (root, checks_for) in datasets.items():
+            if not (root / date_str).is_dir():
+                continue
+            counts, written = validate_day(dataset, root / date_str, checks_for, settings, codec_settings)
+            if counts is None:
+                continue
+            summary[dataset] = counts
+            outputs.extend(written)
+            total_rows += counts['rows']
+            total_invalid += counts['invalid_rows']
+            if counts['invalid_rows']:
+                reasons = ', '.join(f"{code}: {n}" for code, n in counts['reasons'].items())
+                print(f"   ⚠ {date_str} {dataset}: {counts['invalid_rows']}/{counts['rows']} lignes invalides ({reasons})")
+            else:
+                print(f"   ✓ {date_str} {dataset}: {counts['rows']} lignes valides")
+        outputs.append(write_summary(date_str, summary, settings))
+        if checkpoints is not None:
+            checkpoints.mark_done('validate_raw_data', date_str, outputs)
+
+    print(f"\n✅ {len(dates)} dates validées: {total_invalid}/{total_rows} lignes invalides")
+    if total_invalid:
+        print(f"📁 Quarantaine: {settings['quarantine_path']}/")
+    if settings['action'] == 'quarantine':
+        print(f"📁 Données validées: {settings['validated_path']}/")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
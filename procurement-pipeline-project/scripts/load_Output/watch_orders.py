@@ -0,0 +1,294 @@
+"""
+Service de micro-batchs sur les commandes brutes (mode quasi temps réel)
+Surveille data/raw/orders/<date>/ par scrutation, lit les fichiers nouveaux ou complétés,
+tient les totaux (date, SKU) en mémoire et rafraîchit le net demand des seuls SKUs touchés
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from file_codecs import codec_from_path, compression_settings, data_files, write_csv
+from pipeline_config import load_config, postgres_params
+from profiling import add_profile_arguments, profile_entry_point
+from stock_snapshots import StockSnapshots, delta_enabled
+
+
+class OrderStream:
+    """Totaux courants par (date, SKU) alimentés par lecture incrémentale des fichiers
+
+    Un CSV non compressé est lu à partir du dernier octet consommé (lignes complètes
+    uniquement) ; un fichier compressé est relu en entier quand sa taille ou son mtime
+    change. La contribution de chaque fichier est conservée pour pouvoir la retirer
+    quand un fichier est réécrit : inode différent (remplacement par os.replace, cas
+    d'atomic_output, quelle que soit la nouvelle taille) ou taille inférieure à l'offset lu.
+    """
+
+    def __init__(self, orders_path, checkpoint_path):
+        self.orders_path = Path(orders_path)
+        self.checkpoint_path = Path(checkpoint_path)
+        # chemin -> {offset, header, size, mtime_ns, ino, contributions {date: {sku: qty}}}
+        self.files = {}
+        self.totals = {}
+        self.product_names = {}
+        # SKUs dont la contribution a été retirée pendant le micro-batch en cours
+        self.removed = {}
+        # SKUs en attente du snapshot de stock de leur date (IntradaySignals.pending), repris au redémarrage
+        self.pending = {}
+        if self.checkpoint_path.exists():
+            with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            self.files = state['files']
+            self.product_names = state['product_names']
+            self.pending = {date_str: set(skus) for date_str, skus in state.get('pending', {}).items()}
+            for entry in self.files.values():
+                self._add(entry['contributions'], sign=1)
+
+    def _add(self, contributions, sign):
+        for date_str, skus in contributions.items():
+            date_totals = self.totals.setdefault(date_str, {})
+            for sku, quantity in skus.items():
+                date_totals[sku] = date_totals.get(sku, 0) + sign * quantity
+
+    def _read_new_rows(self, path, entry, stat):
+        """Nouvelles lignes complètes d'un fichier (DataFrame), None si rien de nouveau"""
+        import pandas as pd
+
+        if codec_from_path(path) != 'none':
+            if entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns:
+                return None
+            self._reset(entry)
+            return pd.read_csv(path, usecols=['sku', 'product_name', 'quantity'])
+
+        # Fichier remplacé (autre inode) ou tronqué : l'offset ne correspond plus au contenu
+        if entry.get('ino', stat.st_ino) != stat.st_ino or stat.st_size < entry['offset']:
+            self._reset(entry)
+        if stat.st_size == entry['offset']:
+            return None
+
+        with open(path, 'rb') as f:
+            f.seek(entry['offset'])
+            data = f.read(stat.st_size - entry['offset'])
+        # Ligne en cours d'écriture : lue au prochain passage
+        complete = data[:data.rfind(b'\n') + 1]
+        if not complete:
+            return None
+        if entry['offset'] == 0:
+            entry['header'] = complete[:complete.find(b'\n') + 1].decode('utf-8')
+            body = complete
+        else:
+            body = entry['header'].encode('utf-8') + complete
+        entry['offset'] += len(complete)
+        return pd.read_csv(io.BytesIO(body), usecols=['sku', 'product_name', 'quantity'])
+
+    def _reset(self, entry):
+        """Retire la contribution d'un fichier réécrit avant de le relire depuis le début"""
+        self._add(entry['contributions'], sign=-1)
+        for date_str, skus in entry['contributions'].items():
+            self.removed.setdefault(date_str, set()).update(skus)
+        entry.update(offset=0, header='', contributions={})
+
+    def poll(self):
+        """Lit un micro-batch ; retourne {date: ensemble des SKUs touchés}"""
+        affected, self.removed = {}, {}
+        for date_folder in sorted(d for d in self.orders_path.iterdir() if d.is_dir()):
+            date_str = date_folder.name
+            for path in data_files(date_folder):
+                stat = path.stat()
+                entry = self.files.setdefault(str(path), {'offset': 0, 'header': '', 'contributions': {}})
+                rows = self._read_new_rows(path, entry, stat)
+                entry.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns, ino=stat.st_ino)
+                if rows is None or len(rows) == 0:
+                    continue
+
+                batch = rows.groupby('sku').agg({'quantity': 'sum', 'product_name': 'first'})
+                contribution = entry['contributions'].setdefault(date_str, {})
+                for sku, quantity in batch['quantity'].items():
+                    contribution[sku] = contribution.get(sku, 0) + int(quantity)
+                self._add({date_str: batch['quantity'].astype(int).to_dict()}, sign=1)
+                for sku, name in batch['product_name'].items():
+                    self.product_names.setdefault(sku, name)
+                affected.setdefault(date_str, set()).update(batch.index)
+        for date_str, skus in self.removed.items():
+            affected.setdefault(date_str, set()).update(skus)
+        return affected
+
+    def orders_agg(self, date_str, skus):
+        """Agrégat au format aggregated_orders (sku, total_quantity, product_name) pour des SKUs"""
+        import pandas as pd
+
+        date_totals = self.totals.get(date_str, {})
+        skus = sorted(skus)
+        return pd.DataFrame({
+            'sku': skus,
+            'total_quantity': [date_totals.get(sku, 0) for sku in skus],
+            'product_name': [self.product_names.get(sku) for sku in skus],
+        })
+
+    def checkpoint(self):
+        """Écriture atomique de l'état (offsets et contributions par fichier)"""
+        self.checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.checkpoint_path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'files': self.files, 'product_names': self.product_names,
+                       'pending': {date_str: sorted(skus) for date_str, skus in self.pending.items()}},
+                      f, ensure_ascii=False)
+        os.replace(tmp_path, self.checkpoint_path)
+
+
+class IntradaySignals:
+    """Net demand intrajournalier par date, mis à jour SKU par SKU"""
+
+    def __init__(self, products_df, stock_path, output_path, codec_settings, snapshots=None, pending=None):
+        self.products_df = products_df
+        self.stock_path = Path(stock_path)
+        # StockSnapshots en format delta (état reconstruit), None : snapshots complets lus directement
+        self.snapshots = snapshots
+        self.output_path = Path(output_path)
+        self.codec_settings = codec_settings
+        self.stocks = {}
+        self.signals = {}
+        # SKUs touchés d'une date sans snapshot de stock : recalculés dès qu'il apparaît
+        self.pending = pending if pending is not None else {}
+
+    def stocks_for(self, date_str):
+        """Stock agrégé par SKU de la date, None si le snapshot n'est pas (encore) présent
+
+        Seuls les snapshots trouvés sont mis en cache : une date absente est recherchée à
+        nouveau au micro-batch suivant.
+        """
+        from load_Output.calculate_net_demand import read_stock_csv
+
+        if date_str in self.stocks:
+            return self.stocks[date_str]
+        if self.snapshots is not None:
+            stocks_agg = self.snapshots.by_sku(date_str)
+        else:
+            stock_date_path = self.stock_path / date_str
+            stocks_agg = read_stock_csv(stock_date_path) if data_files(stock_date_path) else None
+        if stocks_agg is not None:
+            self.stocks[date_str] = stocks_agg
+        return stocks_agg
+
+    def refresh(self, stream, affected):
+        """Recalcule le net demand des SKUs touchés (et des SKUs en attente de stock) et réécrit
+        le fichier de la date"""
+        import pandas as pd
+
+        from load_Output.calculate_net_demand import compute_net_demand
+
+        affected = {date_str: set(skus) for date_str, skus in affected.items()}
+        for date_str, skus in self.pending.items():
+            affected.setdefault(date_str, set()).update(skus)
+
+        refreshed = {}
+        for date_str, skus in sorted(affected.items()):
+            stocks_agg = self.stocks_for(date_str)
+            if stocks_agg is None:
+                waiting = self.pending.setdefault(date_str, set())
+                if not skus <= waiting:
+                    print(f"   ⚠ Pas de stock pour {date_str}, {len(skus)} SKUs en attente du snapshot")
+                waiting.update(skus)
+                continue
+            self.pending.pop(date_str, None)
+
+            to_order = compute_net_demand(stream.orders_agg(date_str, skus), stocks_agg, self.products_df)
+            current = self.signals.get(date_str)
+            if current is None:
+                # Reprise : repartir du fichier déjà écrit pour cette date
+                existing = data_files(self.output_path, f"net_demand_{date_str}.csv")
+                current = pd.read_csv(existing[0]) if existing else None
+            if current is not None:
+                current = current[~current['sku'].isin(skus)]
+                to_order = pd.concat([current, to_order], ignore_index=True)
+            to_order = to_order.sort_values('sku', ignore_index=True)
+            self.signals[date_str] = to_order
+
+            self.output_path.mkdir(parents=True, exist_ok=True)
+            write_csv(to_order, self.output_path / f"net_demand_{date_str}.csv", self.codec_settings)
+            refreshed[date_str] = int(to_order['sku'].isin(skus).sum())
+        return refreshed
+
+
+def load_products_snapshot(path=None, config=None):
+    """Règles produits depuis un fichier CSV local, ou depuis PostgreSQL par défaut"""
+    import pandas as pd
+
+    if path:
+        return pd.read_csv(path)
+
+    import psycopg2
+
+    from load_Output.calculate_net_demand import load_products
+
+    conn = psycopg2.connect(**postgres_params(config))
+    try:
+        return load_products(conn)
+    finally:
+        conn.close()
+
+
+@profile_entry_point('watch_orders')
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--once', action='store_true',
+                        help="Traite un seul micro-batch puis s'arrête")
+    parser.add_argument('--interval', type=float, help="Intervalle de scrutation en secondes")
+    parser.add_argument('--products', metavar='CSV',
+                        help="Snapshot CSV des produits (sku, supplier_id, pack_size, moq, safety_stock) "
+                             "à la place de PostgreSQL")
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+
+    config = load_config()
+    settings = config.get('streaming', {})
+    interval = args.interval or settings.get('poll_interval_s', 30)
+    checkpoint_interval = settings.get('checkpoint_interval_s', 300)
+
+    print("=== Micro-batchs des commandes (mode intrajournalier) ===\n")
+
+    stream = OrderStream(config['paths']['raw_orders'],
+                         settings.get('checkpoint_path', 'data/processed/intraday/checkpoint.json'))
+    products_df = load_products_snapshot(args.products, config)
+    signals = IntradaySignals(products_df, config['paths']['raw_stock'],
+                              settings.get('output_path', 'data/processed/intraday'),
+                              compression_settings(config),
+                              StockSnapshots(config) if delta_enabled(config) else None,
+                              stream.pending)
+    print(f"✓ Produits chargés: {len(products_df)}")
+    print(f"✓ Reprise: {len(stream.files)} fichiers déjà suivis\n")
+
+    last_checkpoint = time.monotonic()
+    try:
+        while True:
+            started = time.monotonic()
+            affected = stream.poll()
+            if affected or signals.pending:
+                refreshed = signals.refresh(stream, affected)
+                touched = sum(len(skus) for skus in affected.values())
+                if affected or refreshed:
+                    print(f"📦 {time.strftime('%H:%M:%S')} micro-batch: {touched} SKUs touchés, "
+                          f"{sum(refreshed.values())} à commander ({time.monotonic() - started:.2f}s)")
+
+            if args.once:
+                break
+            if time.monotonic() - last_checkpoint >= checkpoint_interval:
+                stream.checkpoint()
+                last_checkpoint = time.monotonic()
+            time.sleep(max(0.0, interval - (time.monotonic() - started)))
+    except KeyboardInterrupt:
+        print("\n⏹ Arrêt demandé")
+    finally:
+        stream.checkpoint()
+        print(f"✓ Checkpoint: {stream.checkpoint_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
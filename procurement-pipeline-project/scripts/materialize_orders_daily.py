@@ -0,0 +1,88 @@
+"""
+Matérialisation des agrégats quotidiens de commandes dans hive.default.orders_daily
+Mode incrémental : ajoute uniquement les partitions order_date manquantes
+Mode --refresh : recalcule les dates données (ou toutes les dates si aucune)
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+from pipeline_config import load_config
+from profiling import add_profile_arguments, profile_entry_point
+from trino_client import TrinoClient
+
+DDL_FILE = Path(__file__).parent / 'sql' / 'create_orders_daily.sql'
+
+INSERT_QUERY = """
+INSERT INTO hive.default.orders_daily
+SELECT
+    sku,
+    product_name,
+    SUM(quantity) as daily_quantity,
+    SUM(subtotal) as daily_sales,
+    COUNT(DISTINCT o.order_id) as num_orders,
+    COUNT(DISTINCT o.store_id) as num_stores,
+    o.order_date
+FROM hive.default.raw_orders o
+CROSS JOIN UNNEST(o.items) AS t(product_id, sku, product_name, quantity, unit_price, subtotal)
+WHERE o.order_date IN ({dates})
+GROUP BY sku, product_name, o.order_date
+"""
+
+
+def date_list(dates):
+    return ', '.join(f"DATE '{d}'" for d in dates)
+
+
+def materialized_dates(client):
+    """Dates déjà présentes comme partitions de orders_daily"""
+    rows = client.execute('SELECT order_date FROM hive.default."orders_daily$partitions"')
+    return {str(row[0]) for row in rows}
+
+
+def available_dates(orders_path):
+    """Dates disponibles dans les données brutes (un dossier par date)"""
+    return {d.name for d in Path(orders_path).iterdir() if d.is_dir()}
+
+
+@profile_entry_point('materialize_orders_daily')
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--refresh', nargs='*', metavar='DATE',
+                        help="Recalcule les dates données (toutes si aucune date)")
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+
+    config = load_config()
+
+    print("=== Matérialisation de hive.default.orders_daily ===\n")
+
+    client = TrinoClient.from_config(config)
+    client.execute_script(DDL_FILE)
+
+    existing = materialized_dates(client)
+    available = available_dates(config['paths']['raw_orders'])
+
+    if args.refresh is not None:
+        to_build = sorted(args.refresh or (available | existing))
+        to_drop = [d for d in to_build if d in existing]
+        if to_drop:
+            client.execute(f"DELETE FROM hive.default.orders_daily WHERE order_date IN ({date_list(to_drop)})")
+            print(f"   ✓ {len(to_drop)} partitions supprimées pour recalcul")
+    else:
+        to_build = sorted(available - existing)
+
+    if not to_build:
+        print("✅ Aucune nouvelle date à matérialiser")
+        return 0
+
+    print(f"Dates à matérialiser: {', '.join(to_build)}")
+    client.execute(INSERT_QUERY.format(dates=date_list(to_build)))
+
+    print(f"\n✅ {len(to_build)} partitions écrites dans hive.default.orders_daily")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""
+Configuration partagée du pipeline
+Chargée et validée une seule fois par processus depuis config/config.yaml
+(chemin surchargeable par la variable d'environnement PROCUREMENT_CONFIG)
+"""
+
+import os
+from functools import lru_cache
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_CONFIG_PATH = PROJECT_ROOT / 'config' / 'config.yaml'
+
+# Sections et clés obligatoires de config.yaml
+REQUIRED_KEYS = {
+    'database': ['postgresql'],
+    'hdfs': ['base_path'],
+    'presto': ['host', 'port'],
+    'paths': ['raw_orders', 'raw_stock', 'processed_aggregated', 'processed_net_demand',
+              'output_supplier_orders', 'logs_exceptions'],
+    'data_generation': ['num_products', 'num_suppliers', 'num_warehouses', 'num_stores',
+                        'date_range_days'],
+}
+
+
+class ConfigError(ValueError):
+    """Configuration absente ou incomplète"""
+
+
+def validate_config(config, config_path):
+    """Vérifie la présence des sections et clés obligatoires"""
+    if not isinstance(config, dict):
+        raise ConfigError(f"{config_path}: document YAML vide ou invalide")
+    missing = [
+        f"{section}.{key}"
+        for section, keys in REQUIRED_KEYS.items()
+        for key in keys
+        if key not in (config.get(section) or {})
+    ]
+    if missing:
+        raise ConfigError(f"{config_path}: clés manquantes: {', '.join(missing)}")
+
+
+@lru_cache(maxsize=None)
+def load_config(path=None):
+    """Charge la configuration (mise en cache : un seul chargement par processus)"""
+    import yaml
+
+    config_path = Path(path or os.getenv('PROCUREMENT_CONFIG', DEFAULT_CONFIG_PATH))
+    with open(config_path, 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    validate_config(config, config_path)
+    return config
+
+
+def postgres_params(config=None):
+    """Paramètres de connexion psycopg2 (surchargés par les variables POSTGRES_* du conteneur)"""
+    db_config = (config or load_config())['database']['postgresql']
+    return {
+        'host': os.getenv('POSTGRES_HOST', db_config['host']),
+        'port': os.getenv('POSTGRES_PORT', db_config['port']),
+        'database': os.getenv('POSTGRES_DB', db_config['database']),
+        'user': os.getenv('POSTGRES_USER', db_config['user']),
+        'password': os.getenv('POSTGRES_PASSWORD', db_config['password']),
+    }
+
+
+def hdfs_namenode(config=None):
+    """Hôte et port du namenode (config['hdfs'], surchargés par HDFS_NAMENODE / HDFS_PORT)
+
+    HDFS_NAMENODE accepte un hôte seul ou une URI complète (hdfs://namenode:9000).
+    """
+    from urllib.parse import urlparse
+
+    hdfs_config = (config or load_config())['hdfs']
+    host = os.getenv('HDFS_NAMENODE', hdfs_config.get('namenode', 'namenode'))
+    port = os.getenv('HDFS_PORT', hdfs_config.get('port', 9000))
+    if '://' in host:
+        uri = urlparse(host)
+        host, port = uri.hostname, uri.port or port
+    return host, int(port)
+
+
+def hdfs_uri(config=None, path=''):
+    """URI hdfs://hôte:port[/chemin] (emplacements des partitions Hive)"""
+    host, port = hdfs_namenode(config)
+    return f"hdfs://{host}:{port}{path}"
+
+
+# Clé de config['paths'] -> sous-dossier de la copie validée (validation.validated_path)
+VALIDATED_DATASETS = {'raw_orders': 'orders', 'raw_stock': 'stock'}
+
+
+def validated_root(config=None):
+    """Racine des copies validées des données brutes, None si les étapes lisent data/raw
+
+    Avec validation.action = quarantine, validate_raw_data publie sous
+    validated_path/<jeu>/<date>/ les fichiers du jour sans leurs lignes invalides ;
+    les fichiers bruts ne sont jamais modifiés.
+    """
+    settings = (config or load_config()).get('validation', {})
+    if not settings.get('enabled', True) or settings.get('action', 'report') != 'quarantine':
+        return None
+    return Path(settings.get('validated_path', 'data/validated'))
+
+
+def raw_input_path(config=None, key='raw_orders'):
+    """Dossier des commandes ou stocks bruts lu par les étapes (copie validée si quarantine)"""
+    config = config or load_config()
+    root = validated_root(config)
+    return Path(config['paths'][key]) if root is None else root / VALIDATED_DATASETS[key]
@@ -0,0 +1,96 @@
+"""
+Profilage des étapes du pipeline (--profile, --profile-memory)
+cProfile (fichier .prof lisible par pstats / snakeviz) et, en option, tracemalloc
+(top des allocations) ; sans option, aucun profileur n'est installé
+"""
+
+import functools
+import sys
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+PROFILE_FLAGS = ('--profile', '--profile-memory')
+
+DEFAULT_TOP = 15
+
+
+def add_profile_arguments(parser):
+    """Documente les options de profilage dans l'aide d'une étape"""
+    parser.add_argument('--profile', action='store_true',
+                        help="Profile l'étape (cProfile) et écrit un fichier .prof")
+    parser.add_argument('--profile-memory', action='store_true',
+                        help="Comme --profile, avec le top des allocations (tracemalloc)")
+
+
+def profile_dir(started_at=None, config=None):
+    """Répertoire des profils d'une exécution, à côté des rapports pipeline_report_*.json"""
+    from run_history import history_settings
+
+    started_at = started_at or datetime.now()
+    return Path(history_settings(config)['reports_dir']) / f"profile_{started_at.strftime('%Y%m%d_%H%M%S')}"
+
+
+def print_hotspots(stats, top):
+    """Fonctions les plus coûteuses en temps propre (tottime)"""
+    entries = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:top]
+    print(f"   {'tottime':>9} {'cumtime':>9} {'appels':>9}  fonction")
+    for (filename, line, function), (_, calls, tottime, cumtime, _) in entries:
+        print(f"   {tottime:>9.3f} {cumtime:>9.3f} {calls:>9}  {Path(filename).name}:{line}({function})")
+
+
+@contextmanager
+def profiled(name, output_dir, memory=False, top=DEFAULT_TOP):
+    """Profile le bloc : écrit <name>.prof (et <name>.alloc.txt) puis affiche les points chauds"""
+    import cProfile
+    import pstats
+    import tracemalloc
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    if memory:
+        tracemalloc.start()
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        prof_file = output_dir / f"{name}.prof"
+        profiler.dump_stats(prof_file)
+
+        print(f"\n🔬 Profil {name}: {prof_file}")
+        print_hotspots(pstats.Stats(profiler), top)
+
+        if memory:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            statistics = snapshot.statistics('lineno')[:top]
+            alloc_file = output_dir / f"{name}.alloc.txt"
+            with open(alloc_file, 'w', encoding='utf-8') as f:
+                f.write(f"Pic mémoire: {peak / (1024 * 1024):.1f} Mo\n")
+                for stat in statistics:
+                    f.write(f"{stat}\n")
+            print(f"   Pic mémoire: {peak / (1024 * 1024):.1f} Mo, top allocations: {alloc_file}")
+            for stat in statistics[:3]:
+                print(f"   {stat}")
+
+
+def profile_entry_point(name):
+    """Décore le main(argv) d'une étape : --profile / --profile-memory retirés de argv
+
+    Sans option, le décorateur se limite à parcourir argv avant d'appeler main.
+    """
+    def decorate(main):
+        @functools.wraps(main)
+        def wrapper(argv=None):
+            argv = list(sys.argv[1:] if argv is None else argv)
+            flags = [arg for arg in argv if arg in PROFILE_FLAGS]
+            if not flags:
+                return main(argv)
+            argv = [arg for arg in argv if arg not in PROFILE_FLAGS]
+            with profiled(name, profile_dir(), memory='--profile-memory' in flags):
+                return main(argv)
+        return wrapper
+    return decorate
@@ -0,0 +1,162 @@
+"""
+Modèle en mémoire des lignes de commande, snapshots de stock, commandes fournisseurs et exceptions
+Dataclasses à __slots__ (pas de __dict__ par instance) : les dictionnaires ne sont construits
+qu'à la sérialisation, et les exports tabulaires (CSV, Parquet) passent par des colonnes
+Comparatif mémoire dict / dataclass : python scripts/benchmark_records.py
+"""
+
+from dataclasses import dataclass, field
+
+from file_codecs import atomic_output, write_json, write_jsonl
+
+
+@dataclass(slots=True)
+class OrderLine:
+    """Article d'une commande client (une ligne des CSV orders_store_XX)"""
+    order_id: str
+    store_id: str
+    order_date: str
+    order_time: str
+    customer_id: str
+    sku: str
+    product_name: str
+    quantity: int
+
+
+# Colonnes des CSV de commandes (customer_id uniquement dans le JSON)
+ORDER_CSV_COLUMNS = ['order_id', 'store_id', 'order_date', 'order_time', 'sku', 'product_name', 'quantity']
+
+
+@dataclass(slots=True)
+class StockSnapshotRow:
+    warehouse_code: str
+    sku: str
+    product_name: str
+    available_quantity: int
+    reserved_quantity: int
+    snapshot_date: str
+    snapshot_time: str = '23:59:59'
+
+
+@dataclass(slots=True)
+class SupplierOrderLine:
+    sku: str
+    product_name: str
+    net_demand: int
+    order_quantity: int
+
+
+@dataclass(slots=True)
+class SupplierOrder:
+    supplier_id: int
+    order_date: str
+    lines: list = field(default_factory=list)
+
+    @property
+    def order_reference(self):
+        return f"ORD-{self.order_date}-SUP{self.supplier_id:03d}"
+
+    @property
+    def total_quantity(self):
+        return sum(line.order_quantity for line in self.lines)
+
+    def to_dict(self):
+        """Structure JSON des fichiers supplier_XXX_order_<date>.json"""
+        return {
+            'supplier_id': self.supplier_id,
+            'order_date': self.order_date,
+            'order_reference': self.order_reference,
+            'total_items': len(self.lines),
+            'total_quantity': self.total_quantity,
+            'items': [to_dict(line) for line in self.lines],
+        }
+
+
+@dataclass(slots=True)
+class PipelineException:
+    type: str
+    message: str
+    severity: str = 'WARNING'
+    date: str = None
+    sku: str = None
+    quantity: int = None
+    count: int = None
+
+    # Ordre des clés du rapport JSON, champs facultatifs omis lorsqu'ils sont vides
+    KEYS = ('date', 'type', 'severity', 'sku', 'quantity', 'count', 'message')
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self.KEYS if getattr(self, key) is not None}
+
+
+def to_dict(record):
+    """Dictionnaire d'un enregistrement (champs dans l'ordre de déclaration)"""
+    if hasattr(record, 'to_dict'):
+        return record.to_dict()
+    return {name: getattr(record, name) for name in record.__slots__}
+
+
+def to_columns(records, columns=None):
+    """Colonnes {champ: [valeurs]} d'enregistrements plats, sans dictionnaire par ligne"""
+    records = list(records)
+    if columns is None:
+        columns = type(records[0]).__slots__ if records else ()
+    return {name: [getattr(record, name) for record in records] for name in columns}
+
+
+def to_frame(records, columns=None):
+    """DataFrame d'enregistrements plats, construit colonne par colonne"""
+    import pandas as pd
+
+    return pd.DataFrame(to_columns(records, columns), columns=columns)
+
+
+def order_documents(lines):
+    """Commandes client au format JSON (une commande et ses items) à partir des lignes triées par commande"""
+    orders = []
+    for line in lines:
+        if not orders or orders[-1]['order_id'] != line.order_id:
+            orders.append({
+                'order_id': line.order_id,
+                'store_id': line.store_id,
+                'order_date': line.order_date,
+                'order_time': line.order_time,
+                'customer_id': line.customer_id,
+                'items': [],
+            })
+        orders[-1]['items'].append({'sku': line.sku, 'product_name': line.product_name, 'quantity': line.quantity})
+    return orders
+
+
+def supplier_order_columns(orders):
+    """Lignes des commandes fournisseurs à plat : colonnes de la commande répétées par article"""
+    columns = {name: [] for name in ('supplier_id', 'order_date', 'order_reference', *SupplierOrderLine.__slots__)}
+    for order in orders:
+        reference = order.order_reference
+        for line in order.lines:
+            columns['supplier_id'].append(order.supplier_id)
+            columns['order_date'].append(order.order_date)
+            columns['order_reference'].append(reference)
+            for name in SupplierOrderLine.__slots__:
+                columns[name].append(getattr(line, name))
+    return columns
+
+
+def write_records_json(records, path, settings):
+    """Tableau JSON (format des fichiers existants), retourne le chemin réel"""
+    return write_json([to_dict(record) for record in records], path, settings)
+
+
+def write_records_jsonl(records, path, settings):
+    """JSON Lines : un enregistrement par ligne, sérialisé au fil de l'eau"""
+    return write_jsonl((to_dict(record) for record in records), path, settings)
+
+
+def write_parquet(columns, path):
+    """Écrit des colonnes {nom: valeurs} en Parquet (pyarrow), retourne le chemin"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    with atomic_output(path) as tmp_path:
+        pq.write_table(pa.Table.from_pydict(columns), tmp_path)
+    return path
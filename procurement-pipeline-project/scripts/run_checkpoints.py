@@ -0,0 +1,93 @@
+"""
+Points de reprise du pipeline par (étape, date)
+Une date est marquée terminée une fois ses sorties écrites (renommage atomique) ; avec
+--resume, une étape ne retraite que les dates sans point de reprise valide
+"""
+
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+from pipeline_config import load_config
+
+# Étapes dans l'ordre du pipeline : refaire une date invalide les étapes suivantes
+STAGES = ('validate_raw_data', 'aggregate_orders', 'calculate_net_demand', 'generate_supplier_orders',
+          'load_results_to_postgres')
+
+
+class RunCheckpoints:
+
+    def __init__(self, path):
+        self.path = Path(path)
+        # étape -> {date: {completed_at, outputs {chemin: octets}}}
+        self.stages = {}
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.stages = json.load(f)
+
+    def is_done(self, stage, date_str):
+        """Vrai si la date est terminée pour l'étape et que ses sorties sont intactes
+
+        Une sortie supprimée ou de taille différente (réécrite depuis) annule le point de reprise.
+        """
+        entry = self.stages.get(stage, {}).get(date_str)
+        if entry is None:
+            return False
+        for output, size in entry['outputs'].items():
+            if not os.path.exists(output) or os.path.getsize(output) != size:
+                return False
+        return True
+
+    def mark_started(self, stage, date_str):
+        """Retire le point de reprise d'une date avant de la retraiter
+
+        Une exécution interrompue en cours de date laisse alors la date non terminée, au lieu
+        d'un point de reprise précédent valide pour des sorties partiellement réécrites.
+        """
+        if self.stages.get(stage, {}).pop(date_str, None) is not None:
+            self.save()
+
+    def mark_done(self, stage, date_str, outputs=()):
+        """Enregistre la date comme terminée et invalide les étapes suivantes pour cette date"""
+        self.stages.setdefault(stage, {})[date_str] = {
+            'completed_at': datetime.now().isoformat(),
+            'outputs': {str(output): os.path.getsize(output) for output in outputs},
+        }
+        if stage in STAGES:
+            for later in STAGES[STAGES.index(stage) + 1:]:
+                self.stages.get(later, {}).pop(date_str, None)
+        self.save()
+
+    def save(self):
+        """Écriture atomique et durable (fsync avant renommage)"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.stages, f, indent=1, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+
+def load_checkpoints(config=None):
+    """Points de reprise du pipeline, None s'ils sont désactivés"""
+    settings = (config or load_config()).get('checkpoints', {})
+    if not settings.get('enabled', False):
+        return None
+    return RunCheckpoints(settings.get('path', 'data/processed/checkpoints.json'))
+
+
+def add_resume_argument(parser):
+    parser.add_argument('--resume', action='store_true',
+                        help="Ignore les dates déjà terminées (points de reprise valides)")
+
+
+def pending_dates(checkpoints, stage, dates, resume):
+    """Dates restant à traiter pour une étape ; affiche le nombre de dates reprises"""
+    if not resume or checkpoints is None:
+        return list(dates)
+    pending = [d for d in dates if not checkpoints.is_done(stage, d)]
+    if len(pending) < len(dates):
+        print(f"⏩ Reprise: {len(dates) - len(pending)} dates déjà terminées ignorées")
+    return pending
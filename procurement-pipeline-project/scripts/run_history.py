@@ -0,0 +1,205 @@
+"""
+Historique des exécutions du pipeline (SQLite) et détection des régressions de performance
+Ingère les rapports logs/pipeline_report_*.json (durée, lignes et taille par étape) et
+compare la dernière exécution à la médiane des exécutions précédentes
+"""
+
+import argparse
+import json
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from statistics import median
+
+from pipeline_config import load_config
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    status TEXT,
+    duration_seconds REAL,
+    report_file TEXT
+);
+CREATE TABLE IF NOT EXISTS stage_runs (
+    run_id TEXT NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+    stage TEXT NOT NULL,
+    status TEXT,
+    duration_seconds REAL,
+    rows INTEGER,
+    bytes INTEGER,
+    files INTEGER,
+    PRIMARY KEY (run_id, stage)
+);
+"""
+
+
+def history_settings(config=None):
+    settings = dict((config or load_config()).get('history', {}))
+    settings.setdefault('path', 'logs/run_history.sqlite')
+    settings.setdefault('reports_dir', 'logs')
+    settings.setdefault('baseline_runs', 7)
+    settings.setdefault('threshold', 0.5)
+    return settings
+
+
+def connect(path):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA foreign_keys = ON')
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def stages_from_report(report):
+    """Étapes d'un rapport : liste 'stages' détaillée, ou dérivée des horodatages des anciens rapports
+
+    Dans les anciens rapports, pipeline_run est écrit en fin d'exécution et chaque étape
+    est horodatée à sa fin : la durée d'une étape est l'écart avec l'étape précédente, la
+    première partant du début estimé (pipeline_run - duration_seconds), bornée à 0. Sans
+    duration_seconds, la durée de la première étape est inconnue (None).
+    """
+    if 'stages' in report:
+        return report['stages']
+
+    previous = None
+    if report.get('duration_seconds') is not None:
+        previous = datetime.fromisoformat(report['pipeline_run']) - timedelta(seconds=report['duration_seconds'])
+    stages = []
+    for step in report.get('steps_executed', []):
+        timestamp = datetime.fromisoformat(step['timestamp'])
+        stages.append({
+            'stage': step['step'],
+            'status': step.get('status'),
+            'duration_seconds': max((timestamp - previous).total_seconds(), 0.0) if previous else None,
+        })
+        previous = timestamp
+    return stages
+
+
+def record_report(conn, report, report_file=None):
+    """Enregistre (ou remplace) une exécution et ses étapes ; retourne run_id"""
+    run_id = report['pipeline_run']
+    with conn:
+        conn.execute('DELETE FROM runs WHERE run_id = ?', (run_id,))
+        conn.execute('INSERT INTO runs VALUES (?, ?, ?, ?)',
+                     (run_id, report.get('status'), report.get('duration_seconds'),
+                      str(report_file) if report_file else None))
+        conn.executemany(
+            'INSERT INTO stage_runs VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [(run_id, s['stage'], s.get('status'), s.get('duration_seconds'),
+              s.get('rows'), s.get('bytes'), s.get('files'))
+             for s in stages_from_report(report)]
+        )
+    return run_id
+
+
+def ingest_reports(conn, reports_dir):
+    """Ingère les rapports pas encore présents dans l'historique ; retourne leur nombre"""
+    known = {row[0] for row in conn.execute('SELECT report_file FROM runs WHERE report_file IS NOT NULL')}
+    ingested = 0
+    for report_file in sorted(Path(reports_dir).glob('pipeline_report_*.json')):
+        if str(report_file) in known:
+            continue
+        with open(report_file, 'r', encoding='utf-8') as f:
+            record_report(conn, json.load(f), report_file)
+        ingested += 1
+    return ingested
+
+
+def seconds_per_unit(duration, rows):
+    """Temps par ligne quand le nombre de lignes est connu, durée brute sinon"""
+    if duration is None:
+        return None
+    return duration / rows if rows else duration
+
+
+def detect_regressions(conn, baseline_runs=7, threshold=0.5):
+    """Étapes de la dernière exécution dont le temps par ligne dépasse la médiane de référence
+
+    La référence est la médiane des baseline_runs exécutions précédentes réussies pour
+    l'étape ; threshold = 0.5 signale un temps par ligne supérieur de plus de 50 %.
+    Seules des valeurs de même nature sont comparées : temps par ligne avec temps par ligne,
+    durée brute (étape sans mesure de lignes) avec durée brute. Une étape en échec ou sans
+    ligne produite (reprise, aucune nouvelle sortie) n'est pas contrôlée.
+    """
+    latest = conn.execute('SELECT run_id FROM runs ORDER BY run_id DESC LIMIT 1').fetchone()
+    if latest is None:
+        return None, []
+    run_id = latest[0]
+
+    regressions = []
+    for stage, status, duration, rows in conn.execute(
+            'SELECT stage, status, duration_seconds, rows FROM stage_runs WHERE run_id = ?', (run_id,)).fetchall():
+        if status != 'SUCCESS' or duration is None or rows == 0:
+            continue
+        per_row = rows is not None
+        history = conn.execute(
+            f"""SELECT s.duration_seconds, s.rows FROM stage_runs s JOIN runs r ON r.run_id = s.run_id
+               WHERE s.stage = ? AND s.run_id < ? AND s.status = 'SUCCESS'
+                 AND s.duration_seconds IS NOT NULL AND {'s.rows > 0' if per_row else 's.rows IS NULL'}
+               ORDER BY s.run_id DESC LIMIT ?""",
+            (stage, run_id, baseline_runs)).fetchall()
+        if not history:
+            continue
+        current = seconds_per_unit(duration, rows)
+        baseline_values = [seconds_per_unit(d, r) for d, r in history]
+        baseline = median(baseline_values)
+        if baseline > 0 and current > baseline * (1 + threshold):
+            regressions.append({
+                'stage': stage,
+                'current': current,
+                'baseline': baseline,
+                'ratio': current / baseline,
+                'per_row': per_row,
+                'baseline_runs': len(baseline_values),
+            })
+    return run_id, regressions
+
+
+def print_regressions(run_id, regressions, threshold):
+    if run_id is None:
+        print("   • Historique vide")
+        return
+    if not regressions:
+        print(f"   ✓ Aucune régression pour {run_id} (seuil +{threshold:.0%})")
+        return
+    for r in regressions:
+        unit = 's/ligne' if r['per_row'] else 's'
+        print(f"   ⚠️  {r['stage']}: {r['current']:.6g} {unit} vs {r['baseline']:.6g} "
+              f"(x{r['ratio']:.2f}, médiane de {r['baseline_runs']} exécutions)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('command', choices=['ingest', 'check', 'list'], nargs='?', default='check',
+                        help="ingest : importe les rapports ; check : détecte les régressions ; "
+                             "list : dernières exécutions")
+    parser.add_argument('--baseline', type=int, help="Nombre d'exécutions de référence")
+    parser.add_argument('--threshold', type=float, help="Dégradation tolérée (0.5 = +50 %%)")
+    args = parser.parse_args(argv)
+
+    settings = history_settings()
+    baseline_runs = args.baseline or settings['baseline_runs']
+    threshold = args.threshold if args.threshold is not None else settings['threshold']
+    conn = connect(settings['path'])
+
+    print("=== Historique des exécutions du pipeline ===\n")
+    ingested = ingest_reports(conn, settings['reports_dir'])
+    print(f"✓ Rapports ingérés: {ingested}")
+
+    if args.command == 'list':
+        for run_id, status, duration in conn.execute(
+                'SELECT run_id, status, duration_seconds FROM runs ORDER BY run_id DESC LIMIT 20'):
+            print(f"   • {run_id}  {status}  {duration or 0:.2f}s")
+        return 0
+
+    if args.command == 'check':
+        run_id, regressions = detect_regressions(conn, baseline_runs, threshold)
+        print_regressions(run_id, regressions, threshold)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
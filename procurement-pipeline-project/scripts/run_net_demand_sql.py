@@ -0,0 +1,67 @@
+"""
+Calcul distribué du net demand via Trino (scripts/sql/calculate_net_demand.sql)
+Produit le même fichier net_demand_<date>.csv que load_Output/calculate_net_demand.py
+--engine duckdb : même requête exécutée localement sur data/ (scripts/duckdb_engine.py)
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+from file_codecs import compression_settings
+from pipeline_config import load_config
+from profiling import add_profile_arguments, profile_entry_point
+from stage_files import intermediate_settings, write_stage_file
+from trino_client import TrinoClient
+
+SQL_FILE = Path(__file__).parent / 'sql' / 'calculate_net_demand.sql'
+
+
+@profile_entry_point('run_net_demand_sql')
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--date', required=True, nargs='+', metavar='DATE',
+                        help="Date(s) à calculer (YYYY-MM-DD)")
+    parser.add_argument('--engine', choices=['trino', 'duckdb'],
+                        help="Moteur SQL (duckdb.engine de la configuration par défaut)")
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+
+    config = load_config()
+
+    engine = args.engine or config.get('duckdb', {}).get('engine', 'trino')
+    print(f"=== Calcul du Net Demand via {'DuckDB (local)' if engine == 'duckdb' else 'Trino'} ===\n")
+
+    if engine == 'duckdb':
+        from duckdb_engine import DuckDBEngine
+
+        client = DuckDBEngine.from_config(config)
+    else:
+        client = TrinoClient.from_config(config)
+    output_path_local = Path(config['paths']['processed_net_demand'])
+    output_path_local.mkdir(parents=True, exist_ok=True)
+    codec_settings = compression_settings(config)
+    intermediate = intermediate_settings(config)
+
+    import pandas as pd
+
+    for date_str in args.date:
+        print(f"📅 Traitement du {date_str}...")
+        columns, rows = client.execute_script(SQL_FILE, run_date=date_str)
+
+        # Même format intermédiaire que calculate_net_demand.py (Arrow et/ou CSV)
+        output_files = write_stage_file(pd.DataFrame(rows, columns=columns),
+                                        output_path_local / f"net_demand_{date_str}.csv",
+                                        intermediate, codec_settings)
+
+        print(f"   SKUs à commander: {len(rows)}")
+        for output_file_local in output_files:
+            print(f"   ✓ Sauvegardé: {output_file_local}")
+        print()
+
+    print(f"✅ Net demand calculé pour {len(args.date)} dates")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
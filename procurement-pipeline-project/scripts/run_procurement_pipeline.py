@@ -3,21 +3,45 @@ Orchestration du pipeline - Transfert HDFS corrigé
 Utilise webhdfs ou copy direct sans docker
 """
 
+import argparse
+import importlib
+import json
 import subprocess
 import sys
+import time
 from datetime import datetime
 from pathlib import Path
-import os
 
 class ProcurementPipeline:
     
-    def __init__(self):
+    # Sorties de chaque étape (clé de config.paths, préfixe ou motif) mesurées pour l'historique des exécutions
+    STAGE_OUTPUTS = {
+        'load_Output.aggregate_orders': ('processed_aggregated', 'aggregated_orders'),
+        'load_Output.calculate_net_demand': ('processed_net_demand', 'net_demand'),
+        'load_Output.generate_supplier_orders': ('output_supplier_orders', 'supplier_*_order_*.json'),
+    }
+    
+    def __init__(self, dates=None, full_transfer=False, profile=False, profile_memory=False, resume=False,
+                 shards=1):
         self.start_time = datetime.now()
         self.steps_completed = 0
         self.total_steps = 6
+        # Dates à traiter (toutes si None), transmises à chaque étape
+        self.dates = dates
+        # Transferts HDFS incrémentaux (manifeste) sauf si full_transfer
+        self.full_transfer = full_transfer
+        # Reprise : chaque étape ignore les dates déjà terminées (points de reprise par étape et date)
+        self.resume = resume
+        # Durée, lignes et octets produits par étape (rapport et historique des exécutions)
+        self.stage_reports = []
+        # Profilage par étape (cProfile, tracemalloc si profile_memory)
+        self.profile = profile or profile_memory
+        self.profile_memory = profile_memory
+        # Net demand et commandes fournisseurs répartis sur N workers locaux (shards par supplier_id)
+        self.shards = shards
         # Configuration HDFS
-        self.hdfs_host = os.getenv('HDFS_NAMENODE', 'namenode')
-        self.hdfs_port = os.getenv('HDFS_PORT', '9000')
+        from pipeline_config import hdfs_namenode
+        self.hdfs_host, self.hdfs_port = hdfs_namenode()
         
     def print_header(self):
         print(f"""
@@ -33,23 +57,131 @@ class ProcurementPipeline:
         print(f"  ÉTAPE {step_num}/{self.total_steps}: {description}")
         print(f"{'='*70}")
     
-    def run_python_script(self, script_path):
-        """Exécute un script Python"""
+    def stage_args(self):
+        """Arguments transmis au main() de chaque étape"""
+        args = ['--date', *self.dates] if self.dates else []
+        return args + ['--resume'] if self.resume else args
+    
+    def run_stage(self, module_name):
+        """Exécute le main() d'une étape dans le processus courant (ou ses workers si partitionnée)"""
         try:
-            result = subprocess.run(
-                [sys.executable, script_path],
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            print(result.stdout)
-            if result.stderr:
-                print(f"⚠️  Warnings: {result.stderr}")
-            return True
-        except subprocess.CalledProcessError as e:
-            print(f"❌ ERREUR: {e.stderr}")
+            from sharding import SHARDED_STAGES, run_sharded
+            
+            stage = module_name.split('.')[-1]
+            if self.shards > 1 and stage in SHARDED_STAGES:
+                return run_sharded(stage, self.shards, self.stage_args(), self.dates)
+            module = importlib.import_module(module_name)
+            return module.main(self.stage_args()) in (0, None)
+        except SystemExit as e:
+            return e.code in (0, None)
+        except Exception as e:
+            print(f"❌ ERREUR: {e}")
+            import traceback
+            traceback.print_exc()
             return False
     
+    def measure_stage(self, module_name, description):
+        """Exécute une étape en mesurant sa durée et le volume de ses sorties"""
+        started_at = datetime.now()
+        start = time.perf_counter()
+        if self.profile:
+            from profiling import profile_dir, profiled
+            
+            with profiled(module_name.split('.')[-1], profile_dir(self.start_time), memory=self.profile_memory):
+                success = self.run_stage(module_name)
+        else:
+            success = self.run_stage(module_name)
+        duration = time.perf_counter() - start
+        
+        # Une étape profilée est plus lente : exclue des références de l'historique
+        status = 'SUCCESS' if success else 'FAILED'
+        report = {
+            'stage': module_name,
+            'step': description,
+            'status': 'PROFILED' if success and self.profile else status,
+            'timestamp': started_at.isoformat(),
+            'duration_seconds': duration,
+        }
+        try:
+            if module_name in self.STAGE_OUTPUTS:
+                report.update(self.stage_output_metrics(module_name, started_at))
+        except Exception as e:
+            print(f"⚠️  Mesure des sorties impossible: {e}")
+        self.stage_reports.append(report)
+        return success
+    
+    def stage_output_metrics(self, module_name, started_at=None):
+        """Lignes, octets et fichiers produits par une étape (dates traitées uniquement)
+
+        Seuls les fichiers des dates demandées (self.dates) et écrits depuis started_at
+        (dates réellement traitées, hors reprise) sont comptés.
+        """
+        from file_codecs import data_files, file_date, read_json
+        from pipeline_config import load_config
+        from stage_files import stage_file_rows, stage_files
+        
+        path_key, pattern = self.STAGE_OUTPUTS[module_name]
+        output_dir = Path(load_config()['paths'][path_key])
+        if pattern.endswith('.json'):
+            # Commandes fournisseurs : un sous-dossier par date, une ligne par article commandé
+            files = [f for d in sorted(output_dir.iterdir()) if d.is_dir() for f in data_files(d, pattern)] \
+                if output_dir.exists() else []
+        else:
+            # Un fichier intermédiaire par date (Arrow, sinon CSV)
+            files = stage_files(output_dir, pattern)
+        if self.dates:
+            files = [f for f in files if file_date(f) in self.dates]
+        if started_at is not None:
+            # mtime arrondi à la seconde sur certains systèmes de fichiers
+            since = int(started_at.timestamp())
+            files = [f for f in files if f.stat().st_mtime >= since]
+        
+        rows = 0
+        for f in files:
+            if pattern.endswith('.json'):
+                rows += len(read_json(f).get('items', []))
+            else:
+                rows += stage_file_rows(f)
+        return {'rows': rows, 'bytes': sum(f.stat().st_size for f in files), 'files': len(files)}
+    
+    def record_run(self):
+        """Écrit le rapport d'exécution puis l'enregistre dans l'historique SQLite"""
+        from run_history import connect, detect_regressions, history_settings, print_regressions, record_report
+        
+        settings = history_settings()
+        end_time = datetime.now()
+        failed = [r for r in self.stage_reports if r['status'] == 'FAILED']
+        report = {
+            'pipeline_run': self.start_time.isoformat(),
+            'status': 'SUCCESS' if self.steps_completed == self.total_steps else 'FAILED',
+            'duration_seconds': (end_time - self.start_time).total_seconds(),
+            'dates': self.dates,
+            'steps_executed': [
+                {'step': r['step'], 'status': r['status'], 'timestamp': r['timestamp'],
+                 'message': f"{r.get('rows', 0)} lignes en {r['duration_seconds']:.2f}s"}
+                for r in self.stage_reports
+            ],
+            'errors': [f"{r['step']}: échec" for r in failed],
+            'stages': self.stage_reports,
+        }
+        
+        reports_dir = Path(settings['reports_dir'])
+        reports_dir.mkdir(parents=True, exist_ok=True)
+        report_file = reports_dir / f"pipeline_report_{self.start_time.strftime('%Y%m%d_%H%M%S')}.json"
+        with open(report_file, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        
+        conn = connect(settings['path'])
+        try:
+            record_report(conn, report, report_file)
+            print(f"\n🗂️  Exécution enregistrée: {report_file}")
+            if self.profile:
+                return
+            run_id, regressions = detect_regressions(conn, settings['baseline_runs'], settings['threshold'])
+            print_regressions(run_id, regressions, settings['threshold'])
+        finally:
+            conn.close()
+    
     def transfer_to_hdfs_subprocess(self, local_path, hdfs_path, description):
         """Transfère via subprocess en exécutant hadoop directement"""
         print(f"\n📤 Transfert vers HDFS: {description}")
@@ -70,11 +202,26 @@ class ProcurementPipeline:
             else:
                 print(f"   ✓ Répertoire créé: {hdfs_path}")
             
+            # Manifeste des fichiers déjà transférés : seuls les nouveaux ou modifiés partent
+            from hdfs_sync import load_upload_manifest, remote_sizes, sync_config
+
+            manifest = load_upload_manifest()
+            remote = None
+            if manifest is not None and sync_config().get('verify_remote', False):
+                remote = remote_sizes(['hadoop', 'fs'], hdfs_path)
+            skipped = 0
+            from stage_files import ARROW_SUFFIX
+            
             # 2. Transférer les fichiers
             if local_path.is_dir():
-                # Copier tous les fichiers du répertoire
+                # Copier tous les fichiers du répertoire (hors intermédiaires Arrow, illisibles par Hive)
                 for file in local_path.glob('*'):
-                    if file.is_file():
+                    if file.is_file() and file.suffix != ARROW_SUFFIX:
+                        remote_file = f"{hdfs_path}/{file.name}"
+                        if manifest is not None and not self.full_transfer and manifest.is_current(
+                                file, remote_file, remote.get(remote_file, -1) if remote is not None else None):
+                            skipped += 1
+                            continue
                         cmd_put = [
                             'hadoop', 'fs', '-put', '-f',
                             str(file), f"{hdfs_path}/"
@@ -82,8 +229,14 @@ class ProcurementPipeline:
                         result = subprocess.run(cmd_put, capture_output=True, text=True)
                         if result.returncode == 0:
                             print(f"   ✓ {file.name} transféré")
+                            if manifest is not None:
+                                manifest.record(file, remote_file)
                         else:
                             print(f"   ❌ Erreur transfert {file.name}: {result.stderr}")
+                if skipped:
+                    print(f"   • {skipped} fichier(s) inchangé(s) non retransféré(s)")
+                if manifest is not None:
+                    manifest.save()
             else:
                 # Copier un seul fichier
                 cmd_put = [
@@ -126,7 +279,12 @@ class ProcurementPipeline:
         
         # ÉTAPE 1: Agrégation des commandes
         self.print_step(1, "Agrégation des commandes clients")
-        if self.run_python_script("scripts/transformation/aggregate_orders.py"):
+        from pipeline_config import load_config
+        
+        # Lignes invalides mises en quarantaine avant l'agrégation
+        if load_config().get('validation', {}).get('enabled', True):
+            self.measure_stage("load_Output.validate_raw_data", "Validation des données brutes")
+        if self.measure_stage("load_Output.aggregate_orders", "Agrégation des commandes clients"):
             self.steps_completed += 1
             
             # Transfert vers HDFS
@@ -136,10 +294,20 @@ class ProcurementPipeline:
                 "Commandes agrégées"
             ):
                 self.verify_hdfs_content("/procurement/processed/aggregated_orders")
+            
+            # Niveaux magasin × SKU et catégorie × SKU (aggregation.levels)
+            from load_Output.aggregate_orders import LEVELS, aggregation_levels
+            
+            config = load_config()
+            for level in aggregation_levels(config.get('aggregation', {})):
+                path_key, prefix = LEVELS[level]
+                if level != 'sku':
+                    self.transfer_to_hdfs_subprocess(config['paths'][path_key], f"/procurement/processed/{prefix}",
+                                                     f"Commandes agrégées ({level})")
         
         # ÉTAPE 2: Calcul du net demand
         self.print_step(2, "Calcul du net demand")
-        if self.run_python_script("scripts/transformation/calculate_net_demand.py"):
+        if self.measure_stage("load_Output.calculate_net_demand", "Calcul du net demand"):
             self.steps_completed += 1
             
             # Transfert vers HDFS
@@ -152,7 +320,7 @@ class ProcurementPipeline:
         
         # ÉTAPE 3: Génération des commandes fournisseurs
         self.print_step(3, "Génération des commandes fournisseurs")
-        if self.run_python_script("scripts/transformation/generate_supplier_orders.py"):
+        if self.measure_stage("load_Output.generate_supplier_orders", "Génération des commandes fournisseurs"):
             self.steps_completed += 1
             
             # Transfert vers HDFS
@@ -162,6 +330,10 @@ class ProcurementPipeline:
                 "Commandes fournisseurs"
             ):
                 self.verify_hdfs_content("/procurement/output/supplier_orders")
+            
+            # Résultats chargés dans PostgreSQL (partitions par date) si activé
+            if load_config().get('postgres_sink', {}).get('enabled', False):
+                self.measure_stage("load_Output.load_results_to_postgres", "Chargement des résultats dans PostgreSQL")
         
         # ÉTAPE 4: Vérification finale HDFS
         self.print_step(4, "Vérification de l'architecture HDFS complète")
@@ -186,6 +358,12 @@ class ProcurementPipeline:
         
         # Résumé final
         self.print_final_summary()
+        
+        # Historique des exécutions et détection des régressions
+        try:
+            self.record_run()
+        except Exception as e:
+            print(f"⚠️  Historique des exécutions non mis à jour: {e}")
     
     def print_summary(self):
         """Affiche un résumé des fichiers générés"""
@@ -195,8 +373,10 @@ class ProcurementPipeline:
         demand_path = Path("data/processed/net_demand")
         orders_path = Path("data/output/supplier_orders")
         
-        agg_files = len(list(agg_path.glob("*.csv"))) if agg_path.exists() else 0
-        demand_files = len(list(demand_path.glob("*.csv"))) if demand_path.exists() else 0
+        from stage_files import stage_files
+
+        agg_files = len(stage_files(agg_path, 'aggregated_orders'))
+        demand_files = len(stage_files(demand_path, 'net_demand'))
         order_files = len(list(orders_path.glob("*.json"))) if orders_path.exists() else 0
         
         print(f"""
@@ -210,15 +390,28 @@ class ProcurementPipeline:
         """Affiche les statistiques finales"""
         
         net_demand_path = Path("data/processed/net_demand")
-        net_demand_files = sorted(net_demand_path.glob("*.csv")) if net_demand_path.exists() else []
+        from stage_files import read_stage_file, stage_files
+
+        net_demand_files = stage_files(net_demand_path, 'net_demand')
         
         total_skus = 0
         total_quantity = 0
+        dates_processed = len(net_demand_files)
         
         try:
-            import pandas as pd
+            from demand_cube import cube_enabled, open_cube
+
+            cube = open_cube() if cube_enabled() else None
+            if cube is not None and cube.filled['order_quantity']:
+                # Totaux lus sur le cube mappé en mémoire plutôt que CSV par CSV
+                history = cube.view('order_quantity')[cube.filled_rows('order_quantity')]
+                total_skus = int((history > 0).sum())
+                total_quantity = int(history.sum())
+                dates_processed = len(cube.filled['order_quantity'])
+                net_demand_files = []
+
             for f in net_demand_files:
-                df = pd.read_csv(f)
+                df = read_stage_file(f)
                 if len(df) > 0:
                     total_skus += len(df)
                     if 'order_quantity' in df.columns:
@@ -230,7 +423,7 @@ class ProcurementPipeline:
 📈 Statistiques du pipeline:
    • Total SKUs commandés: {total_skus}
    • Total unités commandées: {int(total_quantity)}
-   • Dates traitées: {len(net_demand_files)}
+   • Dates traitées: {dates_processed}
         """)
     
     def print_final_summary(self):
@@ -257,13 +450,35 @@ class ProcurementPipeline:
         else:
             print(f"\n⚠️  Pipeline complété avec {self.total_steps - self.steps_completed} erreur(s)\n")
 
-if __name__ == "__main__":
-    pipeline = ProcurementPipeline()
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--date', nargs='+', metavar='DATE',
+                        help="Dates à traiter (YYYY-MM-DD), toutes par défaut")
+    parser.add_argument('--full-transfer', action='store_true',
+                        help="Retransfère tous les fichiers vers HDFS sans consulter le manifeste")
+    parser.add_argument('--profile', action='store_true',
+                        help="Profile chaque étape (cProfile), fichiers .prof à côté du rapport d'exécution")
+    parser.add_argument('--profile-memory', action='store_true',
+                        help="Comme --profile, avec le top des allocations (tracemalloc)")
+    parser.add_argument('--resume', action='store_true',
+                        help="Reprend une exécution interrompue à la première date non terminée de chaque étape")
+    parser.add_argument('--shards', type=int,
+                        help="Net demand et commandes fournisseurs sur N workers locaux (défaut: sharding.shards)")
+    args = parser.parse_args(argv)
+
+    from sharding import sharding_settings
+    
+    pipeline = ProcurementPipeline(dates=args.date, full_transfer=args.full_transfer,
+                                   profile=args.profile, profile_memory=args.profile_memory,
+                                   resume=args.resume, shards=args.shards or sharding_settings()['shards'])
     try:
         pipeline.run()
-        sys.exit(0)
+        return 0
     except Exception as e:
         print(f"\n❌ ERREUR FATALE: {e}")
         import traceback
         traceback.print_exc()
-        sys.exit(1)
\ No newline at end of file
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
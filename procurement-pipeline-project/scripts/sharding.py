@@ -0,0 +1,297 @@
+"""
+Exécution partitionnée (shards) du net demand et des commandes fournisseurs
+Les SKUs sont répartis par hachage du supplier_id : chaque worker (processus local ou hôte
+partageant le système de fichiers) ne traite que les produits, commandes et stocks de son
+shard dans son répertoire (sharding.path/<shard>/), puis la fusion assemble les sorties,
+les publie dans les répertoires du pipeline et écrit un manifeste par date
+
+Workers locaux puis fusion :
+    python scripts/sharding.py calculate_net_demand --workers 4
+    python scripts/sharding.py generate_supplier_orders --workers 4
+Workers sur plusieurs hôtes (load_Output/<étape>.py --shard K/N sur chacun), puis :
+    python scripts/sharding.py calculate_net_demand --shards 4 --merge-only
+"""
+
+import argparse
+import json
+import shutil
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from file_codecs import atomic_output, compression_settings, file_date, publish_directory
+from pipeline_config import load_config
+from run_checkpoints import RunCheckpoints, load_checkpoints
+from stage_files import intermediate_settings, read_stage_file, stage_files, write_stage_file
+
+SHARDED_STAGES = ('calculate_net_demand', 'generate_supplier_orders')
+
+# Hachage multiplicatif de Knuth : supplier_id consécutifs répartis uniformément
+KNUTH_MULTIPLIER = 2654435761
+
+STAGE_SCRIPTS = Path(__file__).resolve().parent / 'load_Output'
+
+
+def sharding_settings(config=None):
+    settings = dict((config or load_config()).get('sharding', {}))
+    settings.setdefault('shards', 1)
+    settings.setdefault('path', 'data/processed/shards')
+    return settings
+
+
+def parse_shard(value):
+    """Argument --shard K/N (K de 0 à N-1) -> (K, N)"""
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Shard invalide: {value} (attendu: K/N)")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"Shard invalide: {value} (0 <= K < N)")
+    return index, count
+
+
+def add_shard_argument(parser):
+    parser.add_argument('--shard', type=parse_shard, metavar='K/N',
+                        help="Ne traite que les fournisseurs du shard K parmi N (voir scripts/sharding.py)")
+
+
+def shard_name(shard):
+    index, count = shard
+    return f"shard-{index:02d}-of-{count:02d}"
+
+
+def shard_dir(shard, config=None):
+    """Répertoire de travail d'un shard : sorties net demand et points de reprise du worker"""
+    return Path(sharding_settings(config)['path']) / shard_name(shard)
+
+
+def shard_checkpoints(shard, config=None):
+    """Points de reprise propres au worker (fichier distinct : pas d'écriture concurrente)"""
+    return RunCheckpoints(shard_dir(shard, config) / 'checkpoints.json')
+
+
+def supplier_shard(supplier_ids, count):
+    """Shard (0..count-1) de chaque supplier_id ; un fournisseur inconnu (NaN) va au shard 0"""
+    import numpy as np
+
+    ids = np.nan_to_num(np.asarray(supplier_ids, dtype=np.float64), nan=0).astype(np.uint64)
+    return ((ids * np.uint64(KNUTH_MULTIPLIER)) & np.uint64(0xFFFFFFFF)) * np.uint64(count) >> np.uint64(32)
+
+
+def filter_products(products_df, shard):
+    """Produits dont le fournisseur appartient au shard"""
+    index, count = shard
+    return products_df[supplier_shard(products_df['supplier_id'], count) == index].reset_index(drop=True)
+
+
+def worker_command(stage, shard, stage_args=()):
+    return [sys.executable, str(STAGE_SCRIPTS / f"{stage}.py"), '--shard', f"{shard[0]}/{shard[1]}", *stage_args]
+
+
+def run_workers(stage, count, stage_args=(), config=None):
+    """Lance les count workers d'une étape en parallèle (processus locaux), retourne les shards en échec
+
+    La sortie de chaque worker est écrite dans <shard>/<étape>.log puis réaffichée.
+    """
+    processes = []
+    for index in range(count):
+        shard = (index, count)
+        directory = shard_dir(shard, config)
+        directory.mkdir(parents=True, exist_ok=True)
+        log = open(directory / f"{stage}.log", 'w', encoding='utf-8')
+        processes.append((shard, log, subprocess.Popen(worker_command(stage, shard, stage_args),
+                                                       stdout=log, stderr=subprocess.STDOUT)))
+
+    failed = []
+    for shard, log, process in processes:
+        returncode = process.wait()
+        log.close()
+        print(f"--- {shard_name(shard)} ({'ok' if returncode == 0 else f'code {returncode}'}) ---")
+        print(Path(log.name).read_text(encoding='utf-8').rstrip())
+        if returncode != 0:
+            failed.append(shard)
+    return failed
+
+
+def completed_dates(stage, count, dates=None, config=None):
+    """Dates terminées par tous les shards ; lève ValueError si une date n'est terminée que par certains
+
+    Un worker retire le point de reprise d'une date avant de la retraiter (mark_started) :
+    une date interrompue en cours d'écriture n'est jamais comptée comme terminée.
+    """
+    done = {}
+    for index in range(count):
+        checkpoints = shard_checkpoints((index, count), config)
+        for date_str in checkpoints.stages.get(stage, {}):
+            if (not dates or date_str in dates) and checkpoints.is_done(stage, date_str):
+                done.setdefault(date_str, []).append(index)
+    incomplete = {d: sorted(set(range(count)) - set(shards)) for d, shards in done.items() if len(shards) < count}
+    if incomplete:
+        details = ', '.join(f"{d} (shards manquants: {missing})" for d, missing in sorted(incomplete.items()))
+        raise ValueError(f"Shards incomplets pour {details}")
+    return sorted(done)
+
+
+def write_manifest(stage, date_str, count, shard_outputs, totals, config=None):
+    """Manifeste de fusion d'une date : sorties et totaux de chaque shard"""
+    path = Path(sharding_settings(config)['path']) / f"manifest_{stage}_{date_str}.json"
+    manifest = {
+        'stage': stage,
+        'date': date_str,
+        'shards': count,
+        'merged_at': datetime.now().isoformat(),
+        'totals': totals,
+        'outputs': shard_outputs,
+    }
+    with atomic_output(path) as tmp_path:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+    return path
+
+
+def update_cube(date_str, count, merged, config):
+    """Mesures du cube de la date : stocks (fichiers stock_<date> des shards) et quantités à commander
+
+    Mêmes mises à jour que calculate_net_demand en mode non partitionné.
+    """
+    import pandas as pd
+
+    from demand_cube import open_cube
+    from id_dictionary import load_id_dictionary
+
+    ids = load_id_dictionary(config)
+    cube = open_cube(config)
+    stock_files = [{file_date(f): f for f in stage_files(shard_dir((index, count), config), 'stock')}.get(date_str)
+                   for index in range(count)]
+    if all(f is not None for f in stock_files):
+        stocks = pd.concat([read_stage_file(f) for f in stock_files], ignore_index=True)
+        stock_codes = ids.encode('sku', stocks['sku'])
+        cube.update(date_str, 'available_stock', stock_codes, stocks['available_stock'])
+        cube.update(date_str, 'reserved_stock', stock_codes, stocks['reserved_stock'])
+    else:
+        print(f"   ⚠ {date_str}: stocks des shards absents (cube activé après les workers), "
+              f"stocks du cube non mis à jour")
+    cube.update(date_str, 'order_quantity', ids.encode('sku', merged['sku']), merged['order_quantity'])
+    if ids.added:
+        ids.save()
+
+
+def merge_net_demand(count, dates=None, config=None):
+    """Concatène le net demand des shards en net_demand_<date> (ordre des SKUs du mode non partitionné)"""
+    import pandas as pd
+
+    config = config or load_config()
+    output_path_local = Path(config['paths']['processed_net_demand'])
+    output_path_local.mkdir(parents=True, exist_ok=True)
+    intermediate, codec_settings = intermediate_settings(config), compression_settings(config)
+    checkpoints = load_checkpoints(config)
+
+    merged_dates = completed_dates('calculate_net_demand', count, dates, config)
+    for date_str in merged_dates:
+        frames, shard_outputs = [], {}
+        for index in range(count):
+            shard = (index, count)
+            demand_file = {file_date(f): f for f in stage_files(shard_dir(shard, config), 'net_demand')}[date_str]
+            frames.append(read_stage_file(demand_file))
+            shard_outputs[shard_name(shard)] = {'file': str(demand_file), 'rows': len(frames[-1])}
+
+        # Les shards vides n'imposent pas leurs types (colonnes object) au résultat
+        non_empty = [df for df in frames if len(df) > 0] or frames[:1]
+        merged = pd.concat(non_empty, ignore_index=True).sort_values('sku', ignore_index=True)
+        output_files = write_stage_file(merged, output_path_local / f"net_demand_{date_str}.csv",
+                                        intermediate, codec_settings)
+        write_manifest('calculate_net_demand', date_str, count, shard_outputs,
+                       {'rows': len(merged), 'order_quantity': int(merged['order_quantity'].sum())}, config)
+        if checkpoints is not None:
+            checkpoints.mark_done('calculate_net_demand', date_str, output_files)
+
+        from demand_cube import cube_enabled
+
+        if cube_enabled(config):
+            update_cube(date_str, count, merged, config)
+
+        print(f"   ✓ {date_str}: {len(merged)} SKUs ({count} shards) -> {output_files[0]}")
+    return merged_dates
+
+
+def merge_supplier_orders(count, dates=None, config=None):
+    """Publie les commandes de tous les shards dans output_supplier_orders/<date>/ et enregistre le manifeste
+
+    Chaque worker écrit dans <shard>/supplier_orders/<date>/ ; les fournisseurs étant
+    disjoints entre shards, la fusion copie leurs fichiers dans un répertoire temporaire
+    puis le substitue à celui de la date : les lecteurs voient l'ancienne ou la nouvelle
+    sortie complète, jamais une partie des shards.
+    """
+    config = config or load_config()
+    checkpoints = load_checkpoints(config)
+    output_base = Path(config['paths']['output_supplier_orders'])
+    output_base.mkdir(parents=True, exist_ok=True)
+
+    merged_dates = completed_dates('generate_supplier_orders', count, dates, config)
+    for date_str in merged_dates:
+        staging = output_base / f".{date_str}.merging"
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir()
+        shard_outputs, order_files = {}, []
+        for index in range(count):
+            shard = (index, count)
+            outputs = sorted(shard_checkpoints(shard, config).stages['generate_supplier_orders'][date_str]['outputs'])
+            shard_outputs[shard_name(shard)] = {'files': outputs}
+            for output in outputs:
+                shutil.copy2(output, staging / Path(output).name)
+                order_files.append(output_base / date_str / Path(output).name)
+        publish_directory(staging, output_base / date_str)
+        write_manifest('generate_supplier_orders', date_str, count, shard_outputs,
+                       {'orders': len(order_files)}, config)
+        if checkpoints is not None:
+            checkpoints.mark_done('generate_supplier_orders', date_str, order_files)
+        print(f"   ✓ {date_str}: {len(order_files)} commandes fournisseurs ({count} shards)")
+    return merged_dates
+
+
+MERGES = {'calculate_net_demand': merge_net_demand, 'generate_supplier_orders': merge_supplier_orders}
+
+
+def run_sharded(stage, count, stage_args=(), dates=None, config=None):
+    """Workers locaux d'une étape puis fusion ; retourne True si tous les shards ont réussi"""
+    print(f"🔀 {stage}: {count} workers (shards par supplier_id)\n")
+    failed = run_workers(stage, count, stage_args, config)
+    if failed:
+        print(f"❌ Shards en échec: {', '.join(shard_name(s) for s in failed)}")
+        return False
+    print(f"\n=== Fusion des {count} shards ===")
+    MERGES[stage](count, dates, config)
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('stage', choices=SHARDED_STAGES)
+    parser.add_argument('--workers', type=int, help="Nombre de workers locaux (défaut: sharding.shards)")
+    parser.add_argument('--shards', type=int, help="Nombre de shards à fusionner avec --merge-only")
+    parser.add_argument('--merge-only', action='store_true',
+                        help="Fusionne les sorties de workers déjà exécutés (autres hôtes)")
+    parser.add_argument('--date', nargs='+', metavar='DATE',
+                        help="Dates à traiter (YYYY-MM-DD), toutes par défaut")
+    parser.add_argument('--resume', action='store_true',
+                        help="Chaque worker ignore les dates déjà terminées pour son shard")
+    args = parser.parse_args(argv)
+
+    config = load_config()
+    count = args.shards or args.workers or sharding_settings(config)['shards']
+
+    try:
+        if args.merge_only:
+            print(f"=== Fusion des {count} shards ({args.stage}) ===")
+            MERGES[args.stage](count, args.date, config)
+            return 0
+        stage_args = (['--date', *args.date] if args.date else []) + (['--resume'] if args.resume else [])
+        return 0 if run_sharded(args.stage, count, stage_args, args.date, config) else 1
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,28 +1,69 @@
--- Calcul du Net Demand selon la formule du projet
+-- Calcul du Net Demand selon la formule du projet, pour une date donnée ({run_date} = YYYY-MM-DD)
 -- net_demand = max(0, aggregated_orders + safety_stock - (available_stock - reserved_stock))
+-- order_quantity = net_demand arrondi au pack_size inférieur, puis au moins le MOQ
+--
+-- Commandes et stocks sont pré-agrégés par (date, sku) avant la jointure : pas de
+-- produit date × entrepôt, et le prédicat sur la colonne de partition limite la
+-- lecture à une seule partition de chaque table.
+-- Exécution : python scripts/run_net_demand_sql.py --date YYYY-MM-DD
 
-SELECT 
-    o.sku,
-    p.product_name,
-    p.supplier_id,
-    SUM(CAST(o.quantity AS INTEGER)) as total_orders,
-    MAX(CAST(s.available_quantity AS INTEGER)) as available_stock,
-    MAX(CAST(s.reserved_quantity AS INTEGER)) as reserved_stock,
-    p.safety_stock,
-    GREATEST(0, 
-        SUM(CAST(o.quantity AS INTEGER)) + 
-        p.safety_stock - 
-        (MAX(CAST(s.available_quantity AS INTEGER)) - MAX(CAST(s.reserved_quantity AS INTEGER)))
-    ) as net_demand
-FROM hive.procurement.orders o
-LEFT JOIN hive.procurement.stock s ON o.sku = s.sku
-LEFT JOIN postgresql.public.products p ON o.sku = p.sku
-WHERE p.sku IS NOT NULL
-GROUP BY o.sku, p.product_name, p.supplier_id, p.safety_stock
-HAVING GREATEST(0, 
-        SUM(CAST(o.quantity AS INTEGER)) + 
-        p.safety_stock - 
-        (MAX(CAST(s.available_quantity AS INTEGER)) - MAX(CAST(s.reserved_quantity AS INTEGER)))
-    ) > 0
-ORDER BY net_demand DESC
-LIMIT 20;
\ No newline at end of file
+WITH orders_agg AS (
+    SELECT
+        order_date,
+        sku,
+        SUM(daily_quantity) as total_quantity
+    FROM hive.default.orders_daily
+    WHERE order_date = DATE '{run_date}'
+    GROUP BY order_date, sku
+),
+stock_agg AS (
+    SELECT
+        snapshot_date,
+        sku,
+        SUM(available_quantity) as available_stock,
+        SUM(reserved_quantity) as reserved_stock
+    FROM hive.default.raw_stock
+    WHERE snapshot_date = DATE '{run_date}'
+    GROUP BY snapshot_date, sku
+),
+demand AS (
+    SELECT
+        o.sku,
+        o.total_quantity,
+        p.product_name,
+        s.available_stock,
+        s.reserved_stock,
+        p.supplier_id,
+        p.pack_size,
+        p.min_order_quantity as moq,
+        p.safety_stock,
+        GREATEST(0,
+            o.total_quantity +
+            p.safety_stock -
+            (s.available_stock - s.reserved_stock)
+        ) as net_demand
+    FROM orders_agg o
+    LEFT JOIN stock_agg s ON o.order_date = s.snapshot_date AND o.sku = s.sku
+    JOIN postgresql.public.products p ON o.sku = p.sku
+),
+rounded AS (
+    SELECT
+        d.*,
+        (d.net_demand / d.pack_size) * d.pack_size as pack_quantity
+    FROM demand d
+)
+SELECT
+    sku,
+    total_quantity,
+    product_name,
+    available_stock,
+    reserved_stock,
+    supplier_id,
+    pack_size,
+    moq,
+    safety_stock,
+    net_demand,
+    GREATEST(pack_quantity, moq) as order_quantity
+FROM rounded
+WHERE pack_quantity > 0
+ORDER BY supplier_id, net_demand DESC;
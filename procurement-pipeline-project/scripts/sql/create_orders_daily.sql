@@ -0,0 +1,20 @@
+-- Table matérialisée des agrégats quotidiens de commandes (Parquet, partitionnée par date)
+-- Alimentée de façon incrémentale par scripts/materialize_orders_daily.py :
+-- seules les nouvelles partitions order_date sont calculées depuis raw_orders
+-- Fichiers Parquet compressés en ZSTD (hive.compression-codec du catalogue hive)
+
+CREATE SCHEMA IF NOT EXISTS hive.default;
+
+CREATE TABLE IF NOT EXISTS hive.default.orders_daily (
+    sku VARCHAR,
+    product_name VARCHAR,
+    daily_quantity BIGINT,
+    daily_sales DECIMAL(38,2),
+    num_orders BIGINT,
+    num_stores BIGINT,
+    order_date DATE
+)
+WITH (
+    format = 'PARQUET',
+    partitioned_by = ARRAY['order_date']
+);
@@ -1,3 +1,7 @@
+-- Table externe partitionnée par date d'ingestion (dt = dossier <date>/ sous /procurement/raw/orders)
+-- Les partitions sont enregistrées par scripts/ingest_to_hdfs.py après chaque transfert
+-- Fichiers éventuellement compressés (.gz ou .zst selon compression.codec) : le codec
+-- est déduit de l'extension à la lecture, aucune propriété de table n'est nécessaire
 CREATE TABLE IF NOT EXISTS hive.procurement.orders (
     order_id VARCHAR,
     store_id VARCHAR,
@@ -6,9 +10,11 @@ CREATE TABLE IF NOT EXISTS hive.procurement.orders (
     customer_id VARCHAR,
     sku VARCHAR,
     product_name VARCHAR,
-    quantity INTEGER
+    quantity INTEGER,
+    dt VARCHAR
 )
 WITH (
     external_location = 'hdfs://namenode:9000/procurement/raw/orders',
-    format = 'JSON'
+    format = 'JSON',
+    partitioned_by = ARRAY['dt']
 );
\ No newline at end of file
@@ -1,3 +1,7 @@
+-- Table externe partitionnée par date d'ingestion (dt = dossier <date>/ sous /procurement/raw/orders)
+-- Les partitions sont enregistrées par scripts/ingest_to_hdfs.py après chaque transfert
+-- Fichiers éventuellement compressés (.gz ou .zst selon compression.codec) : le codec
+-- est déduit de l'extension à la lecture, aucune propriété de table n'est nécessaire
 CREATE TABLE IF NOT EXISTS hive.procurement.orders (
     order_id VARCHAR,
     store_id VARCHAR,
@@ -5,10 +9,12 @@ CREATE TABLE IF NOT EXISTS hive.procurement.orders (
     order_time VARCHAR,
     sku VARCHAR,
     product_name VARCHAR,
-    quantity VARCHAR
+    quantity VARCHAR,
+    dt VARCHAR
 )
 WITH (
     external_location = 'hdfs://namenode:9000/procurement/raw/orders',
     format = 'TEXTFILE',
-    textfile_field_separator = ','
+    textfile_field_separator = ',',
+    partitioned_by = ARRAY['dt']
 );
\ No newline at end of file
@@ -1,5 +1,9 @@
 -- Création de la table pour toutes les commandes
 -- UNNEST corrigé avec tous les alias de colonnes
+-- Partitionnée par order_date (un dossier <date>/ par jour) : les partitions sont
+-- enregistrées par scripts/ingest_to_hdfs.py, une requête sur un jour ne lit qu'un dossier
+-- Fichiers éventuellement compressés (.gz ou .zst selon compression.codec) : le codec
+-- est déduit de l'extension à la lecture, aucune propriété de table n'est nécessaire
 
 CREATE SCHEMA IF NOT EXISTS hive.default;
 
@@ -7,7 +11,6 @@ DROP TABLE IF EXISTS hive.default.raw_orders;
 
 CREATE TABLE hive.default.raw_orders (
     order_id VARCHAR,
-    order_date DATE,
     store_id VARCHAR,
     customer_id VARCHAR,
     total_amount DECIMAL(10,2),
@@ -18,11 +21,13 @@ CREATE TABLE hive.default.raw_orders (
         quantity INTEGER,
         unit_price DECIMAL(10,2),
         subtotal DECIMAL(10,2)
-    ))
+    )),
+    order_date DATE
 )
 WITH (
     format = 'JSON',
-    external_location = 'hdfs://namenode:9000/data/raw/orders/'
+    external_location = 'hdfs://namenode:9000/procurement/raw/orders/',
+    partitioned_by = ARRAY['order_date']
 );
 
 -- Vérification
@@ -48,20 +53,20 @@ FROM hive.default.raw_orders
 CROSS JOIN UNNEST(items) AS t(product_id, sku, product_name, quantity, unit_price, subtotal);
 
 -- Vue agrégée par SKU et date
+-- Lit la table matérialisée orders_daily (create_orders_daily.sql) au lieu de
+-- re-parser et ré-exploser tout le JSON brut à chaque requête
 DROP VIEW IF EXISTS hive.default.v_orders_daily;
 
 CREATE VIEW hive.default.v_orders_daily AS
 SELECT 
     sku,
     product_name,
-    o.order_date,
-    SUM(quantity) as daily_quantity,
-    SUM(subtotal) as daily_sales,
-    COUNT(DISTINCT o.order_id) as num_orders,
-    COUNT(DISTINCT o.store_id) as num_stores
-FROM hive.default.raw_orders o
-CROSS JOIN UNNEST(o.items) AS t(product_id, sku, product_name, quantity, unit_price, subtotal)
-GROUP BY sku, product_name, o.order_date;
+    order_date,
+    daily_quantity,
+    daily_sales,
+    num_orders,
+    num_stores
+FROM hive.default.orders_daily;
 
 -- Aperçu de la vue
 SELECT * FROM hive.default.v_orders_daily 
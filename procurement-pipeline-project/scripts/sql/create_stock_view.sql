@@ -1,5 +1,9 @@
 -- Création de la table pour tous les stocks
 -- Utilise le schéma default (déjà créé par le script orders)
+-- Partitionnée par snapshot_date (un dossier <date>/ par jour) : les partitions sont
+-- enregistrées par scripts/ingest_to_hdfs.py, une requête sur un jour ne lit qu'un dossier
+-- Fichiers éventuellement compressés (.gz ou .zst selon compression.codec) : le codec
+-- est déduit de l'extension à la lecture, aucune propriété de table n'est nécessaire
 
 DROP TABLE IF EXISTS hive.default.raw_stock;
 
@@ -14,7 +18,8 @@ CREATE TABLE hive.default.raw_stock (
 )
 WITH (
     format = 'JSON',
-    external_location = 'hdfs://namenode:9000/data/raw/stock/'
+    external_location = 'hdfs://namenode:9000/procurement/raw/stock/',
+    partitioned_by = ARRAY['snapshot_date']
 );
 
 -- Vérification
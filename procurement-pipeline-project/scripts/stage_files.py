@@ -0,0 +1,92 @@
+"""
+Fichiers intermédiaires entre les étapes (agrégation -> net demand -> commandes fournisseurs)
+Format arrow : Arrow IPC (Feather v2) non compressé, relu par memory-map sans parsing ni
+inférence de types ; le CSV reste disponible en export (HDFS, Hive/Trino)
+"""
+
+import os
+from pathlib import Path
+
+from file_codecs import CODECS, atomic_output, data_files, file_date, with_codec, write_csv
+from pipeline_config import load_config
+
+ARROW_SUFFIX = '.arrow'
+
+FORMATS = ('csv', 'arrow')
+
+
+def intermediate_settings(config=None):
+    """Section intermediate de la configuration (CSV seul par défaut)"""
+    settings = dict((config or load_config()).get('intermediate', {}))
+    fmt = settings.setdefault('format', 'csv')
+    if fmt not in FORMATS:
+        raise ValueError(f"Format intermédiaire inconnu: {fmt} (attendu: {', '.join(FORMATS)})")
+    settings.setdefault('csv_export', True)
+    return settings
+
+
+def stage_files(directory, prefix):
+    """Un fichier par date (<prefix>_<date>.arrow ou .csv[.gz|.zst]), Arrow préféré, trié par date"""
+    directory = Path(directory)
+    if not directory.exists():
+        return []
+    files = {file_date(f): f for f in data_files(directory, f"{prefix}_*.csv")}
+    files.update({file_date(f): f for f in directory.glob(f"{prefix}_*{ARROW_SUFFIX}")})
+    return [files[date_str] for date_str in sorted(files)]
+
+
+def read_stage_file(path, columns=None, dtype=None):
+    """DataFrame d'un fichier intermédiaire : Arrow mappé en mémoire (types conservés) ou CSV
+
+    Les colonnes numériques sans valeur nulle d'un fichier Arrow sont lues sans copie
+    (tableaux en lecture seule adossés au fichier mappé).
+    """
+    import pandas as pd
+
+    if Path(path).suffix == ARROW_SUFFIX:
+        from pyarrow import feather
+
+        df = feather.read_table(path, columns=columns, memory_map=True).to_pandas(split_blocks=True)
+        return df.astype(dtype) if dtype else df
+    return pd.read_csv(path, usecols=columns, dtype=dtype)
+
+
+def stage_file_rows(path):
+    """Nombre de lignes d'un fichier intermédiaire (métadonnées Arrow, sans lecture des données)"""
+    if Path(path).suffix == ARROW_SUFFIX:
+        from pyarrow import feather
+
+        return feather.read_table(path, memory_map=True).num_rows
+    from file_codecs import open_text
+
+    with open_text(path) as f:
+        return max(sum(1 for _ in f) - 1, 0)
+
+
+def write_stage_file(df, path, settings, codec_settings):
+    """Écrit la sortie d'une étape (path : nom .csv) selon le format intermédiaire
+
+    Retourne les chemins écrits : le fichier Arrow et/ou le CSV (export). Les variantes
+    qui ne sont plus produites sont supprimées pour ne pas masquer la nouvelle version.
+    """
+    path = Path(path)
+    arrow_path = path.with_suffix(ARROW_SUFFIX)
+    written = []
+    if settings['format'] == 'arrow':
+        import pyarrow as pa
+        from pyarrow import feather
+
+        with atomic_output(arrow_path) as tmp_path:
+            feather.write_feather(pa.Table.from_pandas(df, preserve_index=False), tmp_path,
+                                  compression='uncompressed')
+        written.append(arrow_path)
+    elif arrow_path.exists():
+        os.remove(arrow_path)
+
+    if settings['format'] == 'csv' or settings['csv_export']:
+        written.append(write_csv(df, path, codec_settings))
+    else:
+        for codec in CODECS:
+            if with_codec(path, codec).exists():
+                os.remove(with_codec(path, codec))
+    return written
@@ -0,0 +1,188 @@
+"""
+Snapshots de stock en baselines périodiques + deltas journaliers
+Format delta : snapshot complet (raw_stock/<date>/) tous les baseline_every_days jours,
+sinon seulement les lignes (entrepôt, SKU) modifiées depuis le jour précédent
+(delta_path/<date>/, mêmes colonnes plus deleted). L'état d'un jour = dernière baseline + deltas
+suivants ; une ligne deleted = 1 (tombstone) retire le couple (entrepôt, SKU) de l'état
+Pour Hive/Trino, materialize_snapshots écrit l'état complet de chaque date dans materialized_path
+"""
+
+from pathlib import Path
+
+from file_codecs import compression_settings, data_files, publish_directory, write_csv, write_json
+from pipeline_config import load_config, raw_input_path, validated_root
+from records import StockSnapshotRow, to_columns
+
+FORMATS = ('full', 'delta')
+
+KEYS = ['warehouse_code', 'sku']
+COLUMNS = KEYS + ['available_quantity', 'reserved_quantity']
+# Toutes les colonnes d'un snapshot (fichiers reconstruits par materialize_snapshots)
+SNAPSHOT_COLUMNS = list(StockSnapshotRow.__slots__)
+# Colonne des fichiers delta : 1 pour une ligne disparue depuis la veille (tombstone), sinon 0
+DELETED = 'deleted'
+
+
+def snapshot_settings(config=None):
+    settings = dict((config or load_config()).get('stock_snapshots', {}))
+    snapshot_format = settings.setdefault('format', 'full')
+    if snapshot_format not in FORMATS:
+        raise ValueError(f"Format de snapshot inconnu: {snapshot_format} (attendu: {', '.join(FORMATS)})")
+    settings.setdefault('baseline_every_days', 7)
+    settings.setdefault('delta_path', 'data/raw/stock_deltas')
+    settings.setdefault('materialized_path', 'data/processed/stock_snapshots')
+    return settings
+
+
+def delta_enabled(config=None):
+    return snapshot_settings(config)['format'] == 'delta'
+
+
+def is_baseline_day(day_index, settings):
+    """Baseline le premier jour puis tous les baseline_every_days jours"""
+    return day_index % max(int(settings['baseline_every_days']), 1) == 0
+
+
+def changed_rows(rows, previous, date_str):
+    """Lignes d'un delta : (lignes modifiées depuis la veille, tombstones)
+
+    previous : StockSnapshotRow de la veille. Une ligne (entrepôt, SKU) présente la veille et
+    absente du jour donne une tombstone datée du jour, quantités à zéro.
+    """
+    from dataclasses import replace
+
+    if previous is None:
+        return rows, []
+    before = {(row.warehouse_code, row.sku): (row.available_quantity, row.reserved_quantity) for row in previous}
+    current = {(row.warehouse_code, row.sku) for row in rows}
+    changed = [row for row in rows
+               if before.get((row.warehouse_code, row.sku)) != (row.available_quantity, row.reserved_quantity)]
+    tombstones = [replace(row, available_quantity=0, reserved_quantity=0, snapshot_date=date_str)
+                  for row in previous if (row.warehouse_code, row.sku) not in current]
+    return changed, tombstones
+
+
+def delta_columns(rows, tombstones):
+    """Colonnes {champ: valeurs} d'un fichier delta : lignes modifiées puis tombstones"""
+    columns = to_columns(rows + tombstones, SNAPSHOT_COLUMNS)
+    columns[DELETED] = [0] * len(rows) + [1] * len(tombstones)
+    return columns
+
+
+def read_snapshot_folder(folder, columns=COLUMNS):
+    """Lignes (entrepôt, SKU) de tous les fichiers d'un dossier <date>, indexées par KEYS
+
+    La colonne deleted, absente des baselines et des deltas antérieurs aux tombstones, vaut 0.
+    """
+    import pandas as pd
+
+    files = data_files(folder)
+    value_columns = [c for c in columns if c not in KEYS]
+    if not files:
+        return pd.DataFrame(columns=columns).set_index(KEYS)
+    df = pd.concat([pd.read_csv(f, usecols=lambda c: c in columns) for f in files], ignore_index=True)
+    return df.set_index(KEYS).reindex(columns=value_columns, fill_value=0)
+
+
+def folder_dates(root):
+    root = Path(root)
+    return {d.name for d in root.iterdir() if d.is_dir()} if root.exists() else set()
+
+
+class StockSnapshots:
+    """Reconstruit l'état du stock d'un jour quel que soit le format des fichiers
+
+    En format full, chaque date est une baseline. L'état du dernier jour reconstruit est
+    conservé : parcourir les dates dans l'ordre ne lit qu'un fichier delta par jour, et un
+    accès direct relit au plus une baseline et baseline_every_days - 1 deltas.
+    """
+
+    def __init__(self, config=None, columns=COLUMNS):
+        config = config or load_config()
+        # Colonnes conservées dans l'état (SNAPSHOT_COLUMNS pour des snapshots complets)
+        self.columns = list(columns)
+        self.stock_path = raw_input_path(config, 'raw_stock')
+        # Copie validée des deltas (validate_raw_data, action quarantine) sinon delta_path
+        root = validated_root(config)
+        self.delta_path = Path(snapshot_settings(config)['delta_path']) if root is None else root / 'stock_deltas'
+        self._date = None
+        self._state = None
+        self.refresh()
+
+    def refresh(self):
+        """Relit la liste des dates (processus longs : nouveaux dossiers arrivés depuis)"""
+        self.baselines = sorted(folder_dates(self.stock_path))
+        # Une date écrite dans les deux formats est lue comme baseline
+        self.deltas = sorted(folder_dates(self.delta_path) - set(self.baselines))
+        self.dates = sorted(self.baselines + self.deltas)
+
+    def baseline_for(self, date_str):
+        """Dernière baseline antérieure ou égale à date_str (None si aucune)"""
+        candidates = [b for b in self.baselines if b <= date_str]
+        return candidates[-1] if candidates else None
+
+    def has_date(self, date_str):
+        if date_str not in self.dates:
+            self.refresh()
+        return date_str in self.dates and self.baseline_for(date_str) is not None
+
+    def state(self, date_str):
+        """Quantités par (entrepôt, SKU) du jour, None si le jour n'est pas reconstructible"""
+        import pandas as pd
+
+        if not self.has_date(date_str):
+            return None
+
+        baseline = self.baseline_for(date_str)
+        if self._date is not None and baseline <= self._date <= date_str:
+            start, state = self._date, self._state
+        else:
+            start, state = baseline, read_snapshot_folder(self.stock_path / baseline, self.columns)
+
+        for delta_date in (d for d in self.deltas if start < d <= date_str):
+            delta = read_snapshot_folder(self.delta_path / delta_date, self.columns + [DELETED])
+            state = pd.concat([state, delta])
+            state = state[~state.index.duplicated(keep='last')]
+            # Tombstones : lignes disparues depuis la veille retirées de l'état
+            state = state[state[DELETED].fillna(0) == 0].drop(columns=DELETED)
+
+        self._date, self._state = date_str, state
+        return state.reset_index()
+
+    def by_sku(self, date_str):
+        """Stock agrégé par SKU du jour (colonnes de read_stock_csv), None si absent"""
+        state = self.state(date_str)
+        if state is None:
+            return None
+        stocks_agg = state.groupby('sku')[['available_quantity', 'reserved_quantity']].sum().reset_index()
+        return stocks_agg.rename(columns={'available_quantity': 'available_stock',
+                                          'reserved_quantity': 'reserved_stock'})
+
+
+def materialize_snapshots(dates, config=None):
+    """Écrit l'état complet du stock de chaque date sous materialized_path/<date>/, retourne la racine
+
+    Un fichier stock_<entrepôt> (CSV et JSON, même codec que les données brutes) par entrepôt,
+    snapshot_date égal à la date : les tables Hive/Trino partitionnées par date lisent ces
+    dossiers au lieu des baselines et deltas. Chaque dossier est publié d'un bloc.
+    """
+    import shutil
+
+    config = config or load_config()
+    codec_settings = compression_settings(config)
+    root = Path(snapshot_settings(config)['materialized_path'])
+    snapshots = StockSnapshots(config, SNAPSHOT_COLUMNS)
+    for date_str in sorted(dates):
+        state = snapshots.state(date_str)
+        if state is None:
+            continue
+        state['snapshot_date'] = date_str
+        target = root / date_str
+        staging = target.with_name(f".{target.name}.staging")
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir(parents=True)
+        for warehouse_code, rows in state[SNAPSHOT_COLUMNS].groupby('warehouse_code', sort=True):
+            write_json(rows.to_dict('records'), staging / f"stock_{warehouse_code}.json", codec_settings)
+            write_csv(rows, staging / f"stock_{warehouse_code}.csv", codec_settings)
+        publish_directory(staging, target)
+    return root
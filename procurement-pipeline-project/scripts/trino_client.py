@@ -0,0 +1,75 @@
+"""
+Client minimal pour l'API REST de Trino (/v1/statement)
+Utilisé par les jobs Python qui pilotent les tables Hive
+"""
+
+import os
+from pathlib import Path
+
+
+class TrinoClient:
+
+    def __init__(self, host, port, user='procurement', catalog='hive', schema='default'):
+        self.base_url = f"http://{host}:{port}"
+        self.headers = {
+            'X-Trino-User': user,
+            'X-Trino-Catalog': catalog,
+            'X-Trino-Schema': schema,
+        }
+
+    @classmethod
+    def from_config(cls, config):
+        """Construit le client depuis la section presto de config.yaml (surchargée par TRINO_HOST/TRINO_PORT)"""
+        presto_config = config['presto']
+        return cls(
+            host=os.getenv('TRINO_HOST', presto_config['host']),
+            port=os.getenv('TRINO_PORT', presto_config['port']),
+            catalog=presto_config.get('catalog', 'hive'),
+        )
+
+    def execute(self, sql):
+        """Exécute une requête et retourne toutes les lignes du résultat"""
+        _, rows = self.query(sql)
+        return rows
+
+    def query(self, sql):
+        """Exécute une requête et retourne (noms de colonnes, lignes)"""
+        import requests
+
+        response = requests.post(
+            f"{self.base_url}/v1/statement",
+            data=sql.strip().rstrip(';').encode('utf-8'),
+            headers=self.headers
+        )
+        response.raise_for_status()
+        payload = response.json()
+
+        columns, rows = [], []
+        while True:
+            if 'error' in payload:
+                raise RuntimeError(f"Erreur Trino: {payload['error'].get('message')}")
+            if not columns and 'columns' in payload:
+                columns = [c['name'] for c in payload['columns']]
+            rows.extend(payload.get('data', []))
+            next_uri = payload.get('nextUri')
+            if not next_uri:
+                return columns, rows
+            response = requests.get(next_uri, headers=self.headers)
+            response.raise_for_status()
+            payload = response.json()
+
+    def execute_script(self, path, **params):
+        """Exécute un fichier SQL instruction par instruction, retourne le résultat de la dernière"""
+        result = ([], [])
+        for statement in split_statements(Path(path).read_text(encoding='utf-8'), **params):
+            result = self.query(statement)
+        return result
+
+
+def split_statements(sql_text, **params):
+    """Découpe un script SQL en instructions (commentaires -- retirés, paramètres {nom} substitués)"""
+    lines = [line for line in sql_text.splitlines() if not line.strip().startswith('--')]
+    script = '\n'.join(lines)
+    if params:
+        script = script.format(**params)
+    return [statement.strip() for statement in script.split(';') if statement.strip()]